@@ -0,0 +1,26 @@
+-- indexes for the hot lookup paths, built online without blocking writes
+
+-- mood picture cache (routers/mood.py) and saved picture lookup (routers/picture.py)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "pictures_reference_id_created_at_idx"
+    ON "pictures" (reference_id, created_at DESC);
+
+-- pictures still waiting for a spot search (scripts/cache_spot.py)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "pictures_found_spot_null_created_at_idx"
+    ON "pictures" (created_at)
+    WHERE found_spot IS NULL;
+
+-- mood pictures of a mood message, latest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "mood_pictures_mood_message_id_created_at_idx"
+    ON "mood_pictures" (mood_message_id, created_at DESC);
+
+-- spot search cache: spot images found for a picture, then their spots
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "spot_images_reference_id_created_at_idx"
+    ON "spot_images" (reference_id, created_at DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "spots_spot_image_id_idx"
+    ON "spots" (spot_image_id);
+
+-- cached mood messages loaded and refreshed by every worker, covering so the heap is not read
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "mood_messages_cached_created_at_idx"
+    ON "mood_messages" (created_at, id) INCLUDE (content)
+    WHERE cached;
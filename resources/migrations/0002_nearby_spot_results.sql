@@ -0,0 +1,9 @@
+-- nearby spots found with google map around a place, served again until refreshed (routers/spot.py)
+
+CREATE TABLE IF NOT EXISTS "nearby_spot_results" (
+    place_id text NOT NULL,
+    radius integer NOT NULL,
+    fetched_at timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    spots jsonb NOT NULL,
+    PRIMARY KEY (place_id, radius)
+);
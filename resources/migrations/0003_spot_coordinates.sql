@@ -0,0 +1,11 @@
+-- coordinates of spots out of the geometry jsonb, so known spots near a place are found by index
+-- (routers/spot.py nearby), an expression index is built without rewriting or locking "spots",
+-- databases/queries.py known_spots_near uses the same expressions
+
+-- bounding box of a radius is a lat range scanned with lng checked in the index
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "spots_location_idx"
+    ON "spots" (
+        ((geometry #>> '{location,lat}')::double precision),
+        ((geometry #>> '{location,lng}')::double precision)
+    )
+    WHERE place_id IS NOT NULL;
@@ -0,0 +1,10 @@
+-- places text search results by normalized lens title (servers/utils/place_search.py),
+-- queries google found nothing for are kept too, with a shorter expiry
+
+CREATE TABLE IF NOT EXISTS "place_text_searches" (
+    query text PRIMARY KEY,
+    fetched_at timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expire_at timestamp with time zone NOT NULL,
+    result_n integer NOT NULL,
+    results jsonb NOT NULL
+);
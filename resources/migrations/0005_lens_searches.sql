@@ -0,0 +1,18 @@
+-- sha256 of picture bytes saved on s3, set on upload (utils/s3.py), null for older pictures
+ALTER TABLE "pictures" ADD COLUMN IF NOT EXISTS content_hash text;
+
+-- raw google lens visual matches of pictures as zlib compressed json (routers/spot.py),
+-- spot search retries and offline re-scoring read them instead of calling serpapi again
+CREATE TABLE IF NOT EXISTS "lens_searches" (
+    picture_id uuid PRIMARY KEY,
+    fetched_at timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    pic_url text NOT NULL,
+    content_hash text,
+    match_n integer NOT NULL,
+    raw_matches bytea NOT NULL
+);
+
+-- same picture bytes saved again under another picture
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "lens_searches_content_hash_idx"
+    ON "lens_searches" (content_hash)
+    WHERE content_hash IS NOT NULL;
@@ -0,0 +1,8 @@
+-- best ranked spots of all lens candidates of a picture (logics/spot.py rank_candidate_spots),
+-- alternatives to the spot found are served from here without calling serpapi or google again
+CREATE TABLE IF NOT EXISTS "spot_alternatives" (
+    picture_id uuid PRIMARY KEY,
+    ranked_at timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    candidate_n integer NOT NULL,
+    spots jsonb NOT NULL
+);
@@ -0,0 +1,7 @@
+-- searches running in some worker (servers/utils/claim.py), other workers wait for their result
+-- instead of searching again, a claim expires so one left by a killed worker does not block the key
+CREATE TABLE IF NOT EXISTS "search_claims" (
+    key text PRIMARY KEY,
+    owner uuid NOT NULL,
+    expire_at timestamp with time zone NOT NULL
+);
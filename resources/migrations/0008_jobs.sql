@@ -0,0 +1,17 @@
+-- background jobs claimed by the job runner of every worker (servers/utils/job.py)
+CREATE TABLE IF NOT EXISTS "jobs" (
+    id uuid PRIMARY KEY,
+    created_at timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    type varchar(32),
+    status varchar(16) CHECK (status IN ('pending', 'running', 'succeeded', 'failed')),
+    attempts integer NOT NULL DEFAULT 0,
+    params jsonb,
+    result jsonb,
+    error text
+);
+
+-- claimable jobs
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "jobs_open_created_at_idx"
+    ON "jobs" (created_at)
+    WHERE status IN ('pending', 'running');
@@ -1,3 +1,6 @@
+-- tables only, indexes and later changes are versioned in resources/migrations
+-- and applied with: python src/servers/scripts/migrate_db.py
+
 -- DROP TABLE IF EXISTS "users" CASCADE;
 CREATE TABLE IF NOT EXISTS "users" (
     id uuid PRIMARY KEY,
@@ -2,6 +2,7 @@ import os
 import sys
 
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import Session
@@ -11,13 +12,30 @@ sys.path.insert(0, _root_dir)
 
 from init import params as params_init
 
+from databases import pool as db_pool
+
+
+def _to_async_dsn(dsn: str) -> str:
+
+    """map sync postgres dsn to asyncpg driver dsn"""
+
+    for scheme in ('postgresql+psycopg2://', 'postgresql://', 'postgres://'):
+        if dsn.startswith(scheme):
+            return 'postgresql+asyncpg://' + dsn[len(scheme):]
+
+    return dsn
+
 
 # init database
 _envs = params_init.load_environment_variables()
-engine = create_engine(_envs['db_dsn'], pool_pre_ping=True, pool_recycle=3600)
+engine = create_engine(_envs['db_dsn'], **db_pool.engine_options(_envs, is_async=False))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# init async database, used side by side with sync one
+async_engine = create_async_engine(_to_async_dsn(_envs['db_dsn']), **db_pool.engine_options(_envs, is_async=True))
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 
 def get_db_session() -> Session:
 
@@ -27,3 +45,20 @@ def get_db_session() -> Session:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db_session() -> AsyncSession:
+
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_pool_stats() -> dict:
+
+    return {
+        'mode':   _envs['db_pool_mode'],
+        'budget': _envs['db_pool_budget'],
+        'async':  db_pool.get_pool_stats(async_engine),
+        'sync':   db_pool.get_pool_stats(engine),
+    }
+
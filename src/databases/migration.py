@@ -0,0 +1,119 @@
+import os
+import re
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+
+MIGRATION_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'resources',
+    'migrations'
+)
+
+_MIGRATION_FILE_RE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+_CONCURRENT_INDEX_RE = re.compile(r'INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+"?(\w+)"?', re.IGNORECASE)
+
+_CREATE_MIGRATION_TABLE = """
+CREATE TABLE IF NOT EXISTS "schema_migrations" (
+    version integer PRIMARY KEY,
+    name text NOT NULL,
+    applied_at timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def list_migrations(migration_dir: str = MIGRATION_DIR) -> list[tuple[int, str, str]]:
+
+    """(version, name, path) of migration files named like 0001_add_indexes.sql, by version"""
+
+    migrations = []
+    for filename in os.listdir(migration_dir):
+
+        matched = _MIGRATION_FILE_RE.match(filename)
+        if matched is None:
+            continue
+
+        migrations.append((int(matched.group(1)), matched.group(2), os.path.join(migration_dir, filename)))
+
+    return sorted(migrations)
+
+
+def _split_statements(sql: str) -> list[str]:
+
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+
+    return [stmt.strip() for stmt in '\n'.join(lines).split(';') if len(stmt.strip()) > 0]
+
+
+def applied_versions(engine: Engine) -> set[int]:
+
+    with engine.begin() as conn:
+        conn.execute(text(_CREATE_MIGRATION_TABLE))
+        return set(conn.execute(text('SELECT version FROM "schema_migrations"')).scalars())
+
+
+def _drop_invalid_indexes(conn, index_names: list[str]):
+
+    """a failed concurrent build leaves an invalid index that IF NOT EXISTS would skip"""
+
+    invalid_names = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE NOT i.indisvalid AND c.relname = ANY(:names)"
+        ),
+        {'names': index_names}
+    ).scalars().all()
+
+    for index_name in invalid_names:
+        logging.warning("dropping invalid index %s left by a failed build", index_name)
+        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"'))
+
+
+def _apply_migration(engine: Engine, version: int, name: str, sql: str):
+
+    statements = _split_statements(sql)
+    record = text('INSERT INTO "schema_migrations" (version, name) VALUES (:version, :name)')
+
+    # concurrent index builds can not run inside a transaction, each statement commits on its own
+    concurrent_index_names = _CONCURRENT_INDEX_RE.findall(sql)
+    if len(concurrent_index_names) > 0:
+
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            _drop_invalid_indexes(conn, concurrent_index_names)
+            for stmt in statements:
+                conn.execute(text(stmt))
+            conn.execute(record, {'version': version, 'name': name})
+
+        return
+
+    with engine.begin() as conn:
+        for stmt in statements:
+            conn.execute(text(stmt))
+        conn.execute(record, {'version': version, 'name': name})
+
+
+def apply_migrations(engine: Engine, migration_dir: str = MIGRATION_DIR, dry_run: bool = False) -> list[str]:
+
+    """
+    apply pending migrations in version order, returns names of applied (or pending when dry run)
+    statements of online migrations are idempotent, so a run stopped halfway is safe to repeat
+    """
+
+    done_versions = applied_versions(engine)
+
+    applied = []
+    for version, name, path in list_migrations(migration_dir):
+
+        if version in done_versions:
+            continue
+
+        if not dry_run:
+            logging.info("applying migration %04d %s", version, name)
+            with open(path, encoding='utf-8') as f:
+                _apply_migration(engine, version, name, f.read())
+
+        applied.append(f"{version:04d}_{name}")
+
+    return applied
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import uuid
+
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.dialects.postgresql import UUID
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from databases.database import Base
+
+
+class SearchClaim(Base):
+
+    __tablename__ = 'search_claims'
+
+    key = Column(String, primary_key=True)
+    owner = Column(UUID(as_uuid=True))
+    expire_at = Column(DateTime(timezone=True))
+
+    def __init__(
+            self,
+            key: str = None,
+            owner: uuid.UUID = None,
+            expire_at=None,
+    ):
+
+        self.key       = key
+        self.owner     = owner
+        self.expire_at = expire_at
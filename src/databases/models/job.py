@@ -0,0 +1,43 @@
+import os
+import sys
+
+import datetime
+import uuid
+
+from sqlalchemy import Column, String, Integer, DateTime
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import func
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from databases.database import Base
+
+
+class Job(Base):
+
+    __tablename__ = 'jobs'
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+    type = Column(String)
+    status = Column(String)
+    attempts = Column(Integer, default=0)
+    params = Column(JSONB)
+    result = Column(JSONB)
+    error = Column(String)
+
+    def __init__(
+            self,
+            uuid_str: str = None,
+            type: str = None,
+            status: str = 'pending',
+            params: dict = None,
+    ):
+
+        self.id       = uuid_str or str(uuid.uuid4())
+        self.type     = type
+        self.status   = status
+        self.attempts = 0
+        self.params   = params
@@ -27,6 +27,7 @@ class Picture(Base):
     reference_type = Column(String)
     reference_id = Column(UUID(as_uuid=True))
     found_spot = Column(Boolean)
+    content_hash = Column(String)
 
     def __init__(
             self,
@@ -36,7 +37,8 @@ class Picture(Base):
             url: str = None,
             reference_type: str = None,
             reference_id: str = None,
-            found_spot: bool = None
+            found_spot: bool = None,
+            content_hash: str = None
     ):
 
         self.id             = uuid_str or str(uuid.uuid4())
@@ -46,3 +48,4 @@ class Picture(Base):
         self.reference_type = reference_type
         self.reference_id   = reference_id
         self.found_spot     = found_spot
+        self.content_hash   = content_hash
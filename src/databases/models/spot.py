@@ -4,7 +4,7 @@ import sys
 import datetime
 import uuid
 
-from sqlalchemy import Column, String, Float, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, String, Float, Integer, DateTime, ForeignKey, LargeBinary
 from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
 from sqlalchemy.orm import relationship
 from sqlalchemy import func
@@ -63,7 +63,7 @@ class Spot(Base):
     geometry = Column(JSONB)
 
     spot_image_id = Column(UUID(as_uuid=True), ForeignKey("spot_images.id"))
-    spot_image = relationship('SpotImage', back_populates="spot")
+    spot_image = relationship('SpotImage', back_populates="spot", lazy="raise_on_sql")
 
     def __init__(
             self,
@@ -93,3 +93,95 @@ class Spot(Base):
 
         if geometry is not None:
             self.geometry = geometry
+
+
+class NearbySpotResult(Base):
+
+    __tablename__ = 'nearby_spot_results'
+
+    place_id = Column(String, primary_key=True)
+    radius = Column(Integer, primary_key=True)
+    fetched_at = Column(DateTime(timezone=True), server_default=func.now())
+    spots = Column(JSONB)
+
+    def __init__(
+            self,
+            place_id: str = None,
+            radius: int = None,
+            spots: list[dict] = None,
+    ):
+
+        self.place_id = place_id
+        self.radius   = radius
+        self.spots    = spots
+
+
+class PlaceTextSearch(Base):
+
+    __tablename__ = 'place_text_searches'
+
+    query = Column(String, primary_key=True)
+    fetched_at = Column(DateTime(timezone=True), server_default=func.now())
+    expire_at = Column(DateTime(timezone=True))
+    result_n = Column(Integer)
+    results = Column(JSONB)
+
+    def __init__(
+            self,
+            query: str = None,
+            results: list[dict] = None,
+            expire_at: datetime.datetime = None,
+    ):
+
+        self.query     = query
+        self.results   = results
+        self.result_n  = len(results) if results is not None else 0
+        self.expire_at = expire_at
+
+
+class LensSearch(Base):
+
+    __tablename__ = 'lens_searches'
+
+    picture_id = Column(UUID(as_uuid=True), primary_key=True)
+    fetched_at = Column(DateTime(timezone=True), server_default=func.now())
+    pic_url = Column(String)
+    content_hash = Column(String)
+    match_n = Column(Integer)
+    raw_matches = Column(LargeBinary)
+
+    def __init__(
+            self,
+            picture_id: str = None,
+            pic_url: str = None,
+            content_hash: str = None,
+            match_n: int = None,
+            raw_matches: bytes = None,
+    ):
+
+        self.picture_id   = picture_id
+        self.pic_url      = pic_url
+        self.content_hash = content_hash
+        self.match_n      = match_n
+        self.raw_matches  = raw_matches
+
+
+class SpotAlternative(Base):
+
+    __tablename__ = 'spot_alternatives'
+
+    picture_id = Column(UUID(as_uuid=True), primary_key=True)
+    ranked_at = Column(DateTime(timezone=True), server_default=func.now())
+    candidate_n = Column(Integer)
+    spots = Column(JSONB)
+
+    def __init__(
+            self,
+            picture_id: str = None,
+            candidate_n: int = None,
+            spots: list[dict] = None,
+    ):
+
+        self.picture_id  = picture_id
+        self.candidate_n = candidate_n
+        self.spots       = spots
@@ -0,0 +1,122 @@
+import logging
+import math
+import time
+import uuid
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+
+_POOL_TIMEOUT = 10.0
+
+POOL_MODE_SESSION = 'session'
+POOL_MODE_TRANSACTION = 'transaction'
+
+
+class _TimedPoolMixin:
+
+    """record how long checkouts take, waiting on a full pool included"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_n   = 0
+        self.checkout_s   = 0.0
+        self.checkout_max = 0.0
+        self.timeout_n    = 0
+
+    def _do_get(self):
+
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeout_n += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.checkout_n += 1
+            self.checkout_s += elapsed
+            self.checkout_max = max(self.checkout_max, elapsed)
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def worker_pool_sizes(budget: int, worker_n: int) -> tuple[int, int]:
+
+    """
+    (pool_size, max_overflow) of the async engine of a worker from the connection budget of all workers,
+    one connection of the share is left to the sync engine, which only loads resources at start,
+    half of the rest is overflow so idle workers give connections back
+    """
+
+    share = budget // worker_n
+    if share < 2:
+        logging.warning("db connection budget %d is too small for %d workers, using 2 each", budget, worker_n)
+        share = 2
+
+    async_n = share - 1
+    pool_size = math.ceil(async_n / 2)
+
+    return pool_size, async_n - pool_size
+
+
+def engine_options(envs: dict, is_async: bool) -> dict:
+
+    """
+    create_engine options governed by DB_POOL_BUDGET and DB_POOL_MODE,
+    without a budget sqlalchemy default pool sizes are kept
+    in transaction mode (pgbouncer, supabase pooler on 6543) statements are not cached,
+    prepared statements do not survive a server connection switch between transactions
+    """
+
+    options = {
+        'poolclass':     TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+        'pool_pre_ping': True,
+        'pool_recycle':  3600,
+        'pool_timeout':  _POOL_TIMEOUT,
+    }
+
+    if envs['db_pool_budget'] is not None:
+
+        pool_size, max_overflow = worker_pool_sizes(int(envs['db_pool_budget']), int(envs['app_workers']))
+        if not is_async:
+            pool_size, max_overflow = 1, 0
+
+        options['pool_size'] = pool_size
+        options['max_overflow'] = max_overflow
+
+    if (envs['db_pool_mode'] == POOL_MODE_TRANSACTION) and is_async:
+        options['connect_args'] = {
+            'statement_cache_size':          0,
+            'prepared_statement_cache_size': 0,
+            'prepared_statement_name_func':  lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+
+    return options
+
+
+def get_pool_stats(engine) -> dict:
+
+    pool = engine.pool
+
+    stats = {
+        'pool_size':    pool.size(),
+        'checked_out':  pool.checkedout(),
+        'checked_in':   pool.checkedin(),
+        'overflow':     pool.overflow(),
+        'max_overflow': pool._max_overflow,
+    }
+
+    if isinstance(pool, _TimedPoolMixin):
+        stats['checkout_n'] = pool.checkout_n
+        stats['checkout_avg_ms'] = round(pool.checkout_s / pool.checkout_n * 1000, 3) if pool.checkout_n > 0 else None
+        stats['checkout_max_ms'] = round(pool.checkout_max * 1000, 3)
+        stats['timeout_n'] = pool.timeout_n
+
+    return stats
@@ -0,0 +1,433 @@
+import os
+import sys
+
+import datetime
+import math
+import uuid
+
+from sqlalchemy import select, delete, desc, func, tuple_, any_, bindparam, or_, literal_column, Float, String
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert
+from sqlalchemy.orm import contains_eager, joinedload
+from sqlalchemy.sql import Select
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _root_dir)
+
+from databases.models.mood import MoodMessage as DBMoodMessage
+from databases.models.mood import MoodPicture as DBMoodPicture
+from databases.models.picture import Picture as DBPicture
+from databases.models.spot import SpotImage as DBSpotImage
+from databases.models.spot import Spot as DBSpot
+from databases.models.spot import NearbySpotResult as DBNearbySpotResult
+from databases.models.spot import PlaceTextSearch as DBPlaceTextSearch
+from databases.models.spot import LensSearch as DBLensSearch
+from databases.models.spot import SpotAlternative as DBSpotAlternative
+from databases.models.claim import SearchClaim as DBSearchClaim
+
+
+# every lookup loads what the caller reads in one statement, relationships are never lazy loaded
+
+_EARTH_RADIUS_M = 6371000.0
+_LAT_DEGREE_M = 111320.0
+
+
+def _to_uuid_list(id_list) -> list[uuid.UUID]:
+
+    """parse ids from clients, invalid ones can not match any row and are dropped"""
+
+    uuid_list = []
+    for _id in id_list:
+        try:
+            uuid_list.append(uuid.UUID(str(_id)))
+        except ValueError:
+            continue
+
+    return uuid_list
+
+
+def cached_spot_by_picture(picture_id) -> Select:
+
+    """latest spot found for picture with a usable thumbnail, spot image loaded along"""
+
+    return select(DBSpot) \
+             .join(
+                 DBSpot.spot_image
+             ).filter(
+                 DBSpotImage.reference_id == picture_id
+             ).filter(
+                 func.ltrim(DBSpotImage.thumbnail, ' \t\r\n').startswith('http')
+             ).order_by(
+                 desc(DBSpotImage.created_at)
+             ).options(
+                 contains_eager(DBSpot.spot_image)
+             ).limit(1)
+
+
+def spot_with_image(spot_id) -> Select:
+
+    return select(DBSpot) \
+             .filter(
+                 DBSpot.id == spot_id
+             ).options(
+                 joinedload(DBSpot.spot_image)
+             )
+
+
+def unused_saved_mood_picture(mood_message_id, used_mood_pic_ids) -> Select:
+
+    """saved picture of a mood message not used by client yet, ones with spot found first"""
+
+    return select(DBPicture) \
+             .join(
+                 DBMoodPicture,
+                 DBMoodPicture.id == DBPicture.reference_id
+             ).filter(
+                 DBPicture.reference_type == "mood_pic"
+             ).filter(
+                 DBMoodPicture.mood_message_id == mood_message_id
+             ).filter(
+                 DBPicture.reference_id.not_in(_to_uuid_list(used_mood_pic_ids))
+             ).order_by(
+                 desc(DBPicture.found_spot),
+                 desc(DBMoodPicture.created_at)
+             ).limit(1)
+
+
+def unused_recent_mood_picture(mood_message_id, used_mood_pic_ids, max_age: datetime.timedelta) -> Select:
+
+    return select(DBMoodPicture) \
+             .filter(
+                 DBMoodPicture.mood_message_id == mood_message_id
+             ).filter(
+                 DBMoodPicture.created_at > func.now() - max_age
+             ).filter(
+                 DBMoodPicture.id.not_in(_to_uuid_list(used_mood_pic_ids))
+             ).order_by(
+                 desc(DBMoodPicture.created_at)
+             ).limit(1)
+
+
+def saved_picture_by_reference(reference_id) -> Select:
+
+    return select(DBPicture) \
+             .filter(
+                 DBPicture.reference_id == reference_id
+             ).order_by(
+                 desc(DBPicture.created_at)
+             ).limit(1)
+
+
+def cached_mood_messages() -> Select:
+
+    return select(
+        DBMoodMessage.id,
+        DBMoodMessage.content,
+        DBMoodMessage.created_at
+    ).filter(
+        DBMoodMessage.cached == True
+    )
+
+
+def cached_mood_messages_after(cursor: tuple, limit: int) -> Select:
+
+    """next page of cached mood messages by (created_at, id), cursor id None for created_at only"""
+
+    msg_query = cached_mood_messages() \
+                  .order_by(
+                      DBMoodMessage.created_at,
+                      DBMoodMessage.id
+                  ).limit(limit)
+
+    if (cursor is not None) and (cursor[1] is None):
+        msg_query = msg_query.filter(DBMoodMessage.created_at > cursor[0])
+    elif cursor is not None:
+        msg_query = msg_query.filter(tuple_(DBMoodMessage.created_at, DBMoodMessage.id) > cursor)
+
+    return msg_query
+
+
+def _id_in(id_column, id_list: list[uuid.UUID]):
+
+    """id = ANY(:ids) with one array parameter, statement text stays the same for any number of ids"""
+
+    return id_column == any_(bindparam('ids', id_list, type_=ARRAY(UUID(as_uuid=True))))
+
+
+def mood_messages_by_ids(id_list: list[uuid.UUID]) -> Select:
+
+    return select(
+        DBMoodMessage.id,
+        DBMoodMessage.content
+    ).filter(
+        _id_in(DBMoodMessage.id, id_list)
+    )
+
+
+def pictures_by_ids(id_list: list[uuid.UUID]) -> Select:
+
+    return select(
+        DBPicture.id,
+        DBPicture.url,
+        DBPicture.size
+    ).filter(
+        _id_in(DBPicture.id, id_list)
+    )
+
+
+def spots_with_image_by_ids(id_list: list[uuid.UUID]) -> Select:
+
+    return select(DBSpot) \
+             .filter(
+                 _id_in(DBSpot.id, id_list)
+             ).options(
+                 joinedload(DBSpot.spot_image)
+             )
+
+
+def nearby_spot_result(place_id: str, radius: int) -> Select:
+
+    return select(
+        DBNearbySpotResult.spots,
+        DBNearbySpotResult.fetched_at
+    ).filter(
+        DBNearbySpotResult.place_id == place_id
+    ).filter(
+        DBNearbySpotResult.radius == radius
+    )
+
+
+def upsert_nearby_spot_result(place_id: str, radius: int, spot_list: list[dict]):
+
+    """save nearby spots of a place, replacing the ones fetched earlier"""
+
+    stmt = insert(DBNearbySpotResult).values(
+        place_id=place_id,
+        radius=radius,
+        spots=spot_list,
+        fetched_at=func.now()
+    )
+
+    return stmt.on_conflict_do_update(
+        index_elements=[DBNearbySpotResult.place_id, DBNearbySpotResult.radius],
+        set_={
+            'spots':      stmt.excluded.spots,
+            'fetched_at': stmt.excluded.fetched_at,
+        }
+    )
+
+
+def place_text_searches(query_list: list[str]) -> Select:
+
+    """unexpired places text search results of normalized queries, query = ANY(:queries) in one statement"""
+
+    return select(
+        DBPlaceTextSearch.query,
+        DBPlaceTextSearch.results
+    ).filter(
+        DBPlaceTextSearch.query == any_(bindparam('queries', query_list, type_=ARRAY(String)))
+    ).filter(
+        DBPlaceTextSearch.expire_at > func.now()
+    )
+
+
+def upsert_place_text_searches(search_list: list[tuple[str, list[dict], datetime.timedelta]]):
+
+    """save (query, results, ttl) of distinct queries in one statement, in query order so concurrent upserts do not deadlock"""
+
+    stmt = insert(DBPlaceTextSearch).values([
+        {
+            'query':      query,
+            'results':    result_list,
+            'result_n':   len(result_list),
+            'fetched_at': func.now(),
+            'expire_at':  func.now() + ttl,
+        }
+        for query, result_list, ttl in sorted(search_list, key=lambda search: search[0])
+    ])
+
+    return stmt.on_conflict_do_update(
+        index_elements=[DBPlaceTextSearch.query],
+        set_={
+            'results':    stmt.excluded.results,
+            'result_n':   stmt.excluded.result_n,
+            'fetched_at': stmt.excluded.fetched_at,
+            'expire_at':  stmt.excluded.expire_at,
+        }
+    )
+
+
+def lens_search(picture_id, content_hash: str = None) -> Select:
+
+    """stored lens matches of a picture, else of a picture with the same bytes"""
+
+    if content_hash is None:
+        return select(DBLensSearch.raw_matches).filter(DBLensSearch.picture_id == picture_id)
+
+    return select(
+        DBLensSearch.raw_matches
+    ).filter(
+        or_(DBLensSearch.picture_id == picture_id, DBLensSearch.content_hash == content_hash)
+    ).order_by(
+        (DBLensSearch.picture_id == picture_id).desc()
+    ).limit(1)
+
+
+def upsert_lens_search(picture_id, pic_url: str, content_hash: str, match_n: int, raw_matches: bytes):
+
+    stmt = insert(DBLensSearch).values(
+        picture_id=picture_id,
+        pic_url=pic_url,
+        content_hash=content_hash,
+        match_n=match_n,
+        raw_matches=raw_matches,
+        fetched_at=func.now()
+    )
+
+    return stmt.on_conflict_do_update(
+        index_elements=[DBLensSearch.picture_id],
+        set_={
+            'pic_url':      stmt.excluded.pic_url,
+            'content_hash': stmt.excluded.content_hash,
+            'match_n':      stmt.excluded.match_n,
+            'raw_matches':  stmt.excluded.raw_matches,
+            'fetched_at':   stmt.excluded.fetched_at,
+        }
+    )
+
+
+def spot_alternatives(picture_id) -> Select:
+
+    return select(
+        DBSpotAlternative.spots
+    ).filter(
+        DBSpotAlternative.picture_id == picture_id
+    )
+
+
+def upsert_spot_alternatives(picture_id, candidate_n: int, spot_list: list[dict]):
+
+    stmt = insert(DBSpotAlternative).values(
+        picture_id=picture_id,
+        candidate_n=candidate_n,
+        spots=spot_list,
+        ranked_at=func.now()
+    )
+
+    return stmt.on_conflict_do_update(
+        index_elements=[DBSpotAlternative.picture_id],
+        set_={
+            'candidate_n': stmt.excluded.candidate_n,
+            'spots':       stmt.excluded.spots,
+            'ranked_at':   stmt.excluded.ranked_at,
+        }
+    )
+
+
+def claim_search(key: str, owner, ttl: datetime.timedelta):
+
+    """take the claim of key unless held by another owner and not expired, returns owner when taken"""
+
+    stmt = insert(DBSearchClaim).values(
+        key=key,
+        owner=owner,
+        expire_at=func.now() + ttl
+    )
+
+    return stmt.on_conflict_do_update(
+        index_elements=[DBSearchClaim.key],
+        set_={
+            'owner':     stmt.excluded.owner,
+            'expire_at': stmt.excluded.expire_at,
+        },
+        where=(DBSearchClaim.expire_at < func.now())
+    ).returning(DBSearchClaim.owner)
+
+
+def release_search_claim(key: str, owner):
+
+    return delete(DBSearchClaim).filter(
+        DBSearchClaim.key == key
+    ).filter(
+        DBSearchClaim.owner == owner
+    )
+
+
+# coordinates of spots, the same expressions as the spots_location_idx index of migration 0003
+SPOT_LAT = literal_column("(spots.geometry #>> '{location,lat}')::double precision", Float)
+SPOT_LNG = literal_column("(spots.geometry #>> '{location,lng}')::double precision", Float)
+
+
+def _distance_m(lat_column, lng_column, lat: float, lng: float):
+
+    """haversine distance in meters between coordinate columns and a point"""
+
+    d_lat = func.radians(lat_column - lat) * 0.5
+    d_lng = func.radians(lng_column - lng) * 0.5
+    a = func.power(func.sin(d_lat), 2) \
+        + math.cos(math.radians(lat)) * func.cos(func.radians(lat_column)) * func.power(func.sin(d_lng), 2)
+
+    return 2 * _EARTH_RADIUS_M * func.asin(func.sqrt(func.least(a, 1.0)))
+
+
+def _lng_ranges(lng: float, d_lng: float) -> list[tuple[float, float]]:
+
+    """longitude ranges of a bounding box, split in two when it crosses the antimeridian"""
+
+    if d_lng >= 180:
+        return [(-180.0, 180.0)]
+
+    low, high = lng - d_lng, lng + d_lng
+    if low < -180:
+        return [(low + 360, 180.0), (-180.0, high)]
+    if high > 180:
+        return [(low, 180.0), (-180.0, high - 360)]
+
+    return [(low, high)]
+
+
+def known_spots_near(lat: float, lng: float, radius: int, limit: int, exclude_place_id: str = None) -> Select:
+
+    """
+    known spots within radius meters of a point, nearest first and one per place,
+    the bounding box of the radius is scanned on the coordinates index before distances are computed
+    """
+
+    d_lat = radius / _LAT_DEGREE_M
+    d_lng = radius / (_LAT_DEGREE_M * max(math.cos(math.radians(lat)), 0.01))
+
+    distance_m = _distance_m(SPOT_LAT, SPOT_LNG, lat, lng).label('distance_m')
+
+    near_query = select(
+        DBSpot.id,
+        DBSpot.name,
+        DBSpot.address,
+        DBSpot.rating,
+        DBSpot.rating_n,
+        DBSpot.place_id,
+        DBSpot.types,
+        DBSpot.geometry,
+        distance_m
+    ).distinct(
+        DBSpot.place_id
+    ).filter(
+        DBSpot.place_id.is_not(None)
+    ).filter(
+        SPOT_LAT.between(lat - d_lat, lat + d_lat)
+    ).filter(
+        or_(*[SPOT_LNG.between(low, high) for low, high in _lng_ranges(lng, d_lng)])
+    ).order_by(
+        DBSpot.place_id,
+        desc(DBSpot.created_at)
+    )
+
+    if exclude_place_id is not None:
+        near_query = near_query.filter(DBSpot.place_id != exclude_place_id)
+
+    near_query = near_query.subquery()
+
+    return select(near_query) \
+             .filter(
+                 near_query.c.distance_m <= radius
+             ).order_by(
+                 near_query.c.distance_m
+             ).limit(limit)
@@ -9,6 +9,11 @@ _root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, _root_dir)
 
 from utils import misc as misc_utils
+from utils import http as http_utils
+from init import params as params_init
+
+
+_ASYNC_CLIENT = None
 
 
 def init_openai(api_org, api_key, retry_n=1):
@@ -19,3 +24,21 @@ def init_openai(api_org, api_key, retry_n=1):
     openai.api_key      = api_key
 
     _ = misc_utils.retry(retry_n=retry_n, _func=openai.Model.list)
+
+
+def get_async_openai_client() -> openai.AsyncOpenAI:
+
+    """get async openai client on top of the worker shared http client"""
+
+    global _ASYNC_CLIENT
+
+    if _ASYNC_CLIENT is None:
+        envs = params_init.load_environment_variables()
+        _ASYNC_CLIENT = openai.AsyncOpenAI(
+            api_key=envs['openai_api_key'],
+            organization=envs['openai_api_org'],
+            http_client=http_utils.get_async_client('openai'),
+            max_retries=0,
+        )
+
+    return _ASYNC_CLIENT
@@ -1,4 +1,6 @@
 import os
+import tempfile
+import multiprocessing
 
 
 def load_environment_variables():
@@ -9,6 +11,11 @@ def load_environment_variables():
     app_host        = os.getenv("APP_HOST", "0.0.0.0")
     app_port        = os.getenv("APP_PORT", "5000")
     app_auth_token  = os.getenv("APP_AUTH_TOKEN")
+    app_workers     = os.getenv("APP_WORKERS") or str((multiprocessing.cpu_count() * 2) + 1)
+
+    # cache
+    shared_cache_path = os.getenv("SHARED_CACHE_PATH") or os.path.join(tempfile.gettempdir(), "odyssey_shared_cache.db")
+    shared_cache_mb   = os.getenv("SHARED_CACHE_MB", "256")
 
     # aws
     aws_access_id     = os.getenv("AWS_ACCESS_KEY_ID")
@@ -17,19 +24,26 @@ def load_environment_variables():
 
     aws_s3_bucket_name = os.getenv("AWS_S3_BUCKET_NAME")
     aws_s3_file_path   = os.getenv("AWS_S3_FILE_PATH")
+    aws_s3_endpoint    = os.getenv("AWS_S3_ENDPOINT_URL") or None
 
     # db
     db_dsn = os.getenv("DB_DSN")
 
+    db_pool_budget = os.getenv("DB_POOL_BUDGET") or None
+    db_pool_mode   = os.getenv("DB_POOL_MODE") or "session"
+
     # google
     google_api_key = os.getenv("GOOGLE_API_KEY")
 
+    nearby_speculation = os.getenv("NEARBY_SPECULATION") or "auto"
+
     # openai
     openai_api_key = os.getenv("OPENAI_API_KEY")
     openai_api_org = os.getenv("OPENAI_API_ORG")
 
     mood_message_model = os.getenv("MOOD_MESSAGE_MODEL")
     mood_image_size    = os.getenv("MOOD_IMAGE_SIZE")
+    mood_pool_size     = os.getenv("MOOD_POOL_SIZE", "3")
 
     # sentry
     sentry_dsn = os.getenv("SENTRY_DSN")
@@ -37,23 +51,34 @@ def load_environment_variables():
     # serpapi
     serpapi_api_key = os.getenv("SERPAPI_API_KEY")
 
+    spot_source_config = os.getenv("SPOT_SOURCE_CONFIG") or None
+
     envs = {
         'app_host':           app_host,
         'app_port':           app_port,
         'app_auth_token':     app_auth_token,
+        'app_workers':        app_workers,
         'aws_access_id':      aws_access_id,
         'aws_access_key':     aws_access_key,
         'aws_access_region':  aws_access_region,
         'aws_s3_bucket_name': aws_s3_bucket_name,
         'aws_s3_file_path':   aws_s3_file_path,
+        'aws_s3_endpoint':    aws_s3_endpoint,
         'db_dsn':             db_dsn,
+        'db_pool_budget':     db_pool_budget,
+        'db_pool_mode':       db_pool_mode,
         'google_api_key':     google_api_key,
+        'nearby_speculation': nearby_speculation,
         'openai_api_key':     openai_api_key,
         'openai_api_org':     openai_api_org,
         'mood_message_model': mood_message_model,
         'mood_image_size':    mood_image_size,
+        'mood_pool_size':     mood_pool_size,
         'sentry_dsn':         sentry_dsn,
         'serpapi_api_key':    serpapi_api_key,
+        'spot_source_config': spot_source_config,
+        'shared_cache_path':  shared_cache_path,
+        'shared_cache_mb':    shared_cache_mb,
     }
 
     return envs
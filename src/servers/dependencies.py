@@ -10,6 +10,8 @@ sys.path.insert(0, _root_dir)
 
 from servers.utils import init as server_init
 
+from utils import deadline as deadline_utils
+
 
 app_params, app_resources, app_logger = server_init.init_server()
 
@@ -17,3 +19,13 @@ app_params, app_resources, app_logger = server_init.init_server()
 async def verify_token(authorization: Annotated[str, Header()]):
     if authorization != f"Basic {app_params['app_auth_token']}":
         raise HTTPException(status_code=401, detail="header invalid")
+
+
+async def init_request_deadline():
+
+    """
+    start the total time budget of a request, every upstream call and retry
+    only gets what is left of it, keep it below gunicorn worker timeout
+    """
+
+    deadline_utils.set_deadline(app_resources['request_budget'])
@@ -2,15 +2,14 @@ import os
 import sys
 import logging
 
-import openai
-from wrapt_timeout_decorator import timeout
-
 _root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, _root_dir)
 
 from utils import s3 as s3_utils
 from utils import misc as misc_utils
 
+from init import openai as openai_init
+
 from servers.models import mood as mood_models
 
 
@@ -29,14 +28,26 @@ some tourist spot that reflect my mood which is
 """.strip()
 
 
-@timeout(_MSG_TIMEOUT)
-def _openai_random_mood_message_create(
+def _parse_random_mood_message(msg_str: str) -> str:
+
+    msg_str = msg_str.strip()
+
+    if ('AI' in msg_str) or ('computer' in msg_str):
+        logging.warning(msg_str)
+        raise Exception('model not generating mood message')
+
+    msg_str = msg_str.strip('\"').strip('\'')
+
+    return msg_str
+
+
+async def _openai_random_mood_message_create_async(
         model: str,
         prompt: str,
         n: int
 ):
 
-    openai_response = openai.ChatCompletion.create(
+    openai_response = await openai_init.get_async_openai_client().chat.completions.create(
         model=model,
         messages=[
             {"role": "user", "content": prompt}
@@ -45,24 +56,17 @@ def _openai_random_mood_message_create(
         temperature=2
     )
 
-    msg_str = openai_response.choices[0]['message']['content'].strip()
-
-    if ('AI' in msg_str) or ('computer' in msg_str):
-        logging.warning(msg_str)
-        raise Exception('model not generating mood message')
-
-    msg_str = msg_str.strip('\"').strip('\'')
-
-    return msg_str
+    return _parse_random_mood_message(openai_response.choices[0].message.content)
 
 
-def generate_random_mood_message(
+async def generate_random_mood_message_async(
         model: str
 ) -> mood_models.MoodMessage:
 
-    mood_message = misc_utils.retry(
+    mood_message = await misc_utils.retry_async(
         retry_n=_MSG_RETRY,
-        _func=_openai_random_mood_message_create,
+        timeout=_MSG_TIMEOUT,
+        _func=_openai_random_mood_message_create_async,
         model=model,
         prompt=_MSG_PROMPT,
         n=1,
@@ -71,34 +75,22 @@ def generate_random_mood_message(
     return mood_message
 
 
-@timeout(_IMG_TIMEOUT)
-def _openai_image_create(prompt: str, size: str, n: int):
-    return openai.Image.create(
+async def _openai_image_create_async(prompt: str, size: str, n: int):
+
+    openai_response = await openai_init.get_async_openai_client().images.generate(
         prompt=prompt, size=size, n=n,
     )
 
+    return openai_response.model_dump()
+
 
-def generate_mood_image_by_description(
+def _openai_image_response_to_mood_picture(
+        openai_response: dict,
         mood_msg: mood_models.MoodMessage,
+        prompt: str,
         image_size: str,
 ) -> mood_models.MoodPicture:
 
-    """
-    generate image based on mood message and update picture
-    """
-
-    # openai generate image
-    logging.info("generating image from mood: %s", mood_msg.content)
-
-    prompt = f"{_IMG_PROMPT} {mood_msg.content}"
-    openai_response = misc_utils.retry(
-        retry_n=_IMG_RETRY,
-        _func=_openai_image_create,
-        prompt=prompt,
-        size=image_size,
-        n=1,
-    )
-
     # parsing response
     logging.info("parsing response from openai")
 
@@ -118,6 +110,38 @@ def generate_mood_image_by_description(
         prompt=prompt,
     )
 
+    return mood_pic
+
+
+async def generate_mood_image_by_description_async(
+        mood_msg: mood_models.MoodMessage,
+        image_size: str,
+) -> mood_models.MoodPicture:
+
+    """
+    generate image based on mood message and update picture, without blocking event loop
+    """
+
+    # openai generate image
+    logging.info("generating image from mood: %s", mood_msg.content)
+
+    prompt = f"{_IMG_PROMPT} {mood_msg.content}"
+    openai_response = await misc_utils.retry_async(
+        retry_n=_IMG_RETRY,
+        timeout=_IMG_TIMEOUT,
+        _func=_openai_image_create_async,
+        prompt=prompt,
+        size=image_size,
+        n=1,
+    )
+
+    mood_pic = _openai_image_response_to_mood_picture(
+        openai_response=openai_response,
+        mood_msg=mood_msg,
+        prompt=prompt,
+        image_size=image_size,
+    )
+
     logging.info("done generated images from mood message")
 
     return mood_pic
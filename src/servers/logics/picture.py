@@ -2,9 +2,6 @@ import os
 import sys
 import logging
 
-import openai
-from wrapt_timeout_decorator import timeout
-
 _root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, _root_dir)
 
@@ -17,29 +14,13 @@ _RETRY = 1
 _TIMEOUT = 10.0
 
 
-@timeout(_TIMEOUT)
-def _upload_picture_to_s3(
-        source_url: str,
-        filename: str,
-        s3_region: str,
-        s3_bucket_name: str,
-        s3_file_path: str,
-):
-
-    return s3_utils.s3_upload_fileobj_by_url(
-        source_url=source_url,
-        s3_region=s3_region,
-        s3_bucket_name=s3_bucket_name,
-        s3_file_path=s3_file_path,
-        filename=filename,
-    )
-
-def save_picture_to_s3_by_url(
+async def save_picture_to_s3_by_url_async(
         source_url: str,
         source_size: str,
         s3_region: str,
         s3_bucket_name: str,
         s3_file_path: str,
+        s3_endpoint_url: str = None,
 ) -> pic_models.Picture:
 
     logging.info("uploading picture to s3: %s", source_url)
@@ -48,16 +29,19 @@ def save_picture_to_s3_by_url(
         size=source_size,
     )
 
-    s3_http_url = misc_utils.retry(
+    s3_http_url, content_hash = await misc_utils.retry_async(
         retry_n=_RETRY,
-        _func=_upload_picture_to_s3,
+        timeout=_TIMEOUT,
+        _func=s3_utils.s3_upload_fileobj_by_url_async,
         source_url=source_url,
         filename=pic.filename,
         s3_region=s3_region,
         s3_bucket_name=s3_bucket_name,
         s3_file_path=s3_file_path,
+        s3_endpoint_url=s3_endpoint_url,
     )
     pic.url = s3_http_url
+    pic.content_hash = content_hash
 
     logging.info("done upload picture to %s", pic.url)
 
@@ -1,35 +1,111 @@
 import os
 import sys
 
+import asyncio
+import collections
 import logging
-
-from wrapt_timeout_decorator import timeout
-from serpapi import GoogleSearch
-import requests
+import math
+import re
+import time
 
 _root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, _root_dir)
 
+from utils import http as http_utils
+from utils import deadline as deadline_utils
+from utils import shared_cache as shared_cache_utils
+from utils import source_match as source_match_utils
+
 from servers.models import spot as spot_models
 
 
 _GLEN_TIMEOUT = 60.0
 _GMAP_TIMEOUT = 10.0
 
-_SPOT_SOURCE_WHITELIST_SET = {
-    'agoda',
-    'dreamstime',
-    'expedia',
-    'istockphoto',
-    'kiwicollection',
-    'kkday',
-    'klook',
-    'tripadvisor'
+NEARBY_RADIUS = 5000
+
+# typed and untyped nearby searches sent together: never, always, or in regions where typed is often empty
+SPECULATION_OFF = 'off'
+SPECULATION_ON = 'on'
+SPECULATION_AUTO = 'auto'
+
+_SPECULATION_AUTO_MIN_N = 20
+_SPECULATION_AUTO_EMPTY_RATE = 0.3
+_SPECULATION_REGION_N = 1000
+
+_SERPAPI_REQ_URL = 'https://serpapi.com/search'
+_GMAP_TEXT_SEARCH_REQ_URL = 'https://maps.googleapis.com/maps/api/place/textsearch/json'
+_GMAP_NEARBY_SEARCH_REQ_URL = 'https://maps.googleapis.com/maps/api/place/nearbysearch/json'
+
+# other statuses, e.g. OVER_QUERY_LIMIT, are failures that must not be shared with other workers
+_GMAP_CACHEABLE_STATUS_SET = {'OK', 'ZERO_RESULTS'}
+
+# lens match sites kept as spot candidates, weighted by how much they are trusted to name the place
+# in the title, travel sites over stock photos, defaults of the config in env SPOT_SOURCE_CONFIG
+_SPOT_SOURCE_ALLOW_DICT = {
+    'tripadvisor':    1.0,
+    'klook':          0.9,
+    'kkday':          0.9,
+    'expedia':        0.8,
+    'agoda':          0.8,
+    'kiwicollection': 0.8,
+    'istockphoto':    0.6,
+    'dreamstime':     0.6,
 }
 
-_SPOT_SOURCE_BLACKLIST_SET = {
+_SPOT_SOURCE_DENY_SET = {
     'skyscrapercity'
 }
+_SPOT_SOURCE_DEFAULT_WEIGHT = 0.5
+
+# how likely places of a type are the sight of a picture, the best type of a place counts
+_SPOT_TYPE_AFFINITY_DICT = {
+    'tourist_attraction': 1.0,
+    'natural_feature':    1.0,
+    'park':               0.9,
+    'museum':             0.9,
+    'place_of_worship':   0.9,
+    'church':             0.9,
+    'hindu_temple':       0.9,
+    'amusement_park':     0.8,
+    'zoo':                0.8,
+    'aquarium':           0.8,
+    'point_of_interest':  0.5,
+    'locality':           0.4,
+    'establishment':      0.2,
+}
+
+# candidate spot ranking, each feature is scaled to [0, 1], see rank_candidate_spots
+_SPOT_RANK_WEIGHT_DICT = {
+    'position':  0.30,
+    'agreement': 0.20,
+    'source':    0.15,
+    'place':     0.10,
+    'rating':    0.10,
+    'rating_n':  0.05,
+    'types':     0.10,
+}
+_SPOT_RANK_RATING_N_SCALE = math.log1p(10000)
+
+# sites lens titles end with, e.g. "Santorini, Greece - Tripadvisor"
+_TITLE_SOURCE_SET = set(_SPOT_SOURCE_ALLOW_DICT) | _SPOT_SOURCE_DENY_SET | {
+    'alamy',
+    'booking',
+    'flickr',
+    'getty images',
+    'lonely planet',
+    'pinterest',
+    'shutterstock',
+    'viator',
+    'wikipedia'
+}
+_TITLE_SEPARATOR_RE = re.compile(r'\s+[-|\u2013\u2014]\s+')
+_TITLE_DOMAIN_RE = re.compile(r'(^www\.|\.(com|net|org|jp|tw)$)')
+
+spot_source_matcher = source_match_utils.ReloadableSourceMatcher(
+    default_allow=_SPOT_SOURCE_ALLOW_DICT,
+    default_deny=sorted(_SPOT_SOURCE_DENY_SET)
+)
 
 
 def _glen_match_to_spot_image(serpapi_match: str) -> spot_models.SpotImage:
@@ -48,9 +124,8 @@ def _glen_match_to_spot_image(serpapi_match: str) -> spot_models.SpotImage:
     return spot
 
 
-def search_spot_image_by_pic_url(api_key: str, pic_url: str) -> list[spot_models.SpotImage]:
+def _glen_params(api_key: str, pic_url: str) -> dict:
 
-    # serpapi request
     params = {
         "engine":   "google_lens",
         "url":      pic_url,
@@ -60,79 +135,86 @@ def search_spot_image_by_pic_url(api_key: str, pic_url: str) -> list[spot_models
         "no_cache": "true"
     }
 
-    serpapi_search = GoogleSearch(params)
-    serpapi_search_results = serpapi_search.get_dict()
-    glen_visual_matches = serpapi_search_results["visual_matches"]
+    return params
 
-    logging.info("matching spots using serpapi...")
 
-    # # by kayac crawler
-    # glen_req_url = "https://visual-search-api-service.fly.dev/search/google-lens"
-    # glen_req_params = {
-    #     "url": pic_url
-    # }
-
-    # # matches
-    # resp = requests.get(
-    #     glen_req_url,
-    #     params=glen_req_params,
-    #     timeout=_GLEN_TIMEOUT
-    # )
-    # glen_visual_matches = resp.json().get('visual_matches')
-
-    # filter match
-    prioritized_matches = []
-    other_matches = []
+def _glen_cache_params(params: dict) -> dict:
+    return {'engine': params['engine'], 'url': params['url'], 'hl': params['hl']}
+
+
+def _gmap_cache_params(params: dict) -> dict:
+    return {k: v for k, v in params.items() if k != 'key'}
+
+
+def _gmap_results(name: str, params: dict, resp_json: dict) -> list[dict]:
+
+    """results of a google map response, shared with other workers unless the request failed"""
+
+    if resp_json.get('status') in _GMAP_CACHEABLE_STATUS_SET:
+        shared_cache_utils.put(name, _gmap_cache_params(params), resp_json.get('results') or [])
+
+    return resp_json.get('results')
+
+
+def glen_visual_matches_to_spot_images(glen_visual_matches: list[dict]) -> list[spot_models.SpotImage]:
+
+    """
+    spot images of lens matches from allowed sites, matches of denied and unknown sites are dropped,
+    ordered by site weight over lens position so trusted sites are tried first
+    """
+
+    matcher = spot_source_matcher.get()
+
+    ranked_list = []
     for v_match in glen_visual_matches:
 
-        pass_bool = False
-        for v_src in _SPOT_SOURCE_WHITELIST_SET:
-            if v_src in v_match['source'].lower():
-                prioritized_matches.append(v_match)
-                pass_bool = True
-                print(v_match)
-                break
+        verdict, weight = matcher.match(v_match.get('source'), v_match.get('link'))
+        if verdict != source_match_utils.MATCH_ALLOW:
+            continue
 
-        if not pass_bool:
-            other_matches.append(v_match)
+        spot_img = _glen_match_to_spot_image(v_match)
+        spot_img.meta_data['src_weight'] = weight
+        ranked_list.append((weight / math.sqrt(v_match.get('position') or 1), spot_img))
 
-    filtered_matches = prioritized_matches
+    ranked_list.sort(key=lambda ranked: ranked[0], reverse=True)
 
-    # filtered_matches = prioritized_matches + other_matches
-    # filtered_matches = filtered_matches[:10]
+    return [spot_img for _, spot_img in ranked_list]
 
-    # if len(prioritized_matches) > 0:
-    #     filtered_matches = prioritized_matches
-    # else:
-    #     filtered_matches = other_matches[:10]
 
-    # result
-    spot_img_list = []
-    for v_match in filtered_matches:
-        spot_img_list.append(_glen_match_to_spot_image(v_match))
+async def search_visual_matches_by_pic_url_async(api_key: str, pic_url: str) -> list[dict]:
 
-    return spot_img_list
+    """raw lens visual matches of a picture, kept by callers for retries and offline re-scoring"""
 
+    # serpapi request, unless a worker has done it already
+    params = _glen_params(api_key=api_key, pic_url=pic_url)
 
-def search_spot_by_spot_image(api_key: str, image: spot_models.SpotImage) -> list[spot_models.Spot]:
+    glen_visual_matches = shared_cache_utils.get('glen', _glen_cache_params(params))
+    if glen_visual_matches is None:
 
-    # request
-    gmap_req_url = 'https://maps.googleapis.com/maps/api/place/textsearch/json'
-    gmap_req_params = {
-        'key':   api_key,
-        'query': image.title
-    }
+        resp = await deadline_utils.wait_for(
+            http_utils.get_async_client('serpapi').get(_SERPAPI_REQ_URL, params=params, timeout=_GLEN_TIMEOUT),
+            cap=_GLEN_TIMEOUT
+        )
+        resp.raise_for_status()
+        glen_visual_matches = resp.json()["visual_matches"]
+        shared_cache_utils.put('glen', _glen_cache_params(params), glen_visual_matches)
 
-    resp = requests.get(
-        gmap_req_url,
-        params=gmap_req_params,
-        timeout=_GMAP_TIMEOUT
-    )
+    return glen_visual_matches
+
+
+async def search_spot_image_by_pic_url_async(api_key: str, pic_url: str) -> list[spot_models.SpotImage]:
+
+    glen_visual_matches = await search_visual_matches_by_pic_url_async(api_key=api_key, pic_url=pic_url)
+
+    logging.info("matching spots using serpapi...")
+
+    return glen_visual_matches_to_spot_images(glen_visual_matches)
+
+
+def gmap_text_search_results_to_spots(raw_result_list: list[dict]) -> list[spot_models.Spot]:
 
-    # result
     result_list = []
 
-    raw_result_list = resp.json().get('results')
     if (raw_result_list is not None) and (len(raw_result_list) > 0):
 
         for result in raw_result_list:
@@ -151,41 +233,147 @@ def search_spot_by_spot_image(api_key: str, image: spot_models.SpotImage) -> lis
     return result_list
 
 
-def search_nearby_spots_by_spot(
-        api_key: str,
-        spot: spot_models.Spot,
-        logger: logging.Logger
-) -> list[spot_models.Spot]:
+def _is_title_source(segment: str) -> bool:
+
+    segment = segment.strip()
+
+    return (_TITLE_DOMAIN_RE.search(segment) is not None) or any(src in segment for src in _TITLE_SOURCE_SET)
+
+
+def normalize_place_query(title: str) -> str:
+
+    """
+    places text search query of a lens title: lowercased, trailing source sites dropped and whitespace
+    collapsed, so titles of the same place from different pictures share one query
+    """
+
+    if title is None:
+        return ''
+
+    segments = _TITLE_SEPARATOR_RE.split(' '.join(title.lower().split()))
+    while (len(segments) > 1) and _is_title_source(segments[-1]):
+        segments.pop()
+
+    return ' - '.join(segments).strip(' -|,.')
+
+
+async def search_places_by_text_async(api_key: str, query: str) -> list[dict]:
+
+    """raw places text search results, None when google failed so the failure is not cached"""
+
+    resp = await deadline_utils.wait_for(
+        http_utils.get_async_client('gmap').get(
+            _GMAP_TEXT_SEARCH_REQ_URL,
+            params={'key': api_key, 'query': query},
+            timeout=_GMAP_TIMEOUT
+        ),
+        cap=_GMAP_TIMEOUT
+    )
+    resp_json = resp.json()
+
+    if resp_json.get('status') not in _GMAP_CACHEABLE_STATUS_SET:
+        logging.warning("places text search failed with status %s", resp_json.get('status'))
+        return None
+
+    return resp_json.get('results') or []
+
+
+async def search_spot_by_spot_image_async(api_key: str, image: spot_models.SpotImage) -> list[spot_models.Spot]:
+
+    query = normalize_place_query(image.title)
+    if len(query) == 0:
+        return []
+
+    # result
+    return gmap_text_search_results_to_spots(await search_places_by_text_async(api_key=api_key, query=query))
+
+
+def rank_candidate_spots(
+        candidate_list: list[spot_models.SpotImage],
+        spot_lists: list[list[spot_models.Spot]],
+        top_k: int
+) -> list[tuple[float, spot_models.Spot]]:
+
+    """
+    rank places found for all lens candidates of a picture, best first as (score, spot), a place found
+    by several candidates is kept once with the image of its best candidate, scored by:
+    lens position of its best candidate, share of candidates agreeing on it, trust of the match site,
+    places rank within the text search, rating, number of ratings and type of place
+    """
+
+    found_candidate_n = sum(1 for spot_list in spot_lists if len(spot_list) > 0)
+
+    place_dict = {}
+    for candidate, spot_list in zip(candidate_list, spot_lists):
+
+        position = candidate.meta_data.get('position') or 1
+        source_weight = candidate.meta_data.get('src_weight') or _SPOT_SOURCE_DEFAULT_WEIGHT
+
+        for place_rank, spot in enumerate(spot_list):
+
+            key = spot.place_id or spot.name
+            place = place_dict.get(key)
+            if place is None:
+                place = place_dict[key] = {
+                    'spot':       spot,
+                    'image':      candidate,
+                    'position':   position,
+                    'source':     source_weight,
+                    'place_rank': place_rank,
+                    'candidates': set(),
+                }
+            elif position < place['position']:
+                place['image'] = candidate
+                place['position'] = position
+
+            place['source'] = max(place['source'], source_weight)
+            place['place_rank'] = min(place['place_rank'], place_rank)
+            place['candidates'].add(id(candidate))
+
+    ranked_list = []
+    for place in place_dict.values():
+
+        spot = place['spot']
+        features = {
+            'position':  1 / math.sqrt(place['position']),
+            'agreement': len(place['candidates']) / found_candidate_n,
+            'source':    place['source'],
+            'place':     1 / (1 + place['place_rank']),
+            'rating':    min((spot.rating or 0) / 5, 1.0),
+            'rating_n':  min(math.log1p(spot.rating_n or 0) / _SPOT_RANK_RATING_N_SCALE, 1.0),
+            'types':     max((_SPOT_TYPE_AFFINITY_DICT.get(t, 0.0) for t in spot.types or []), default=0.0),
+        }
+        score = sum(_SPOT_RANK_WEIGHT_DICT[name] * value for name, value in features.items())
+
+        spot.image = place['image']
+        ranked_list.append((round(score, 4), spot))
+
+    ranked_list.sort(key=lambda ranked: ranked[0], reverse=True)
+
+    return ranked_list[:top_k]
+
+
+def _gmap_nearby_params(api_key: str, spot: spot_models.Spot, radius: int) -> dict:
 
     # request for tourist_attraction
-    gmap_req_url = 'https://maps.googleapis.com/maps/api/place/nearbysearch/json'
     gmap_req_params = {
         "location": f"{spot.geometry['location']['lat']},{spot.geometry['location']['lng']}",
-        "radius":   "5000",
+        "radius":   str(radius),
         "type":     "tourist_attraction",
         "key":      api_key
     }
-    resp = requests.get(
-        gmap_req_url,
-        params=gmap_req_params,
-        timeout=_GMAP_TIMEOUT
-    )
 
-    # check tourist_attraction response
-    if len(resp.json().get('results')) == 0:
+    return gmap_req_params
 
-        # request without type
-        gmap_req_params.pop('type', None)
-        resp = requests.get(
-            gmap_req_url,
-            params=gmap_req_params,
-            timeout=_GMAP_TIMEOUT
-        )
 
-    # parse response
+def _gmap_nearby_results_to_spots(
+        raw_result_list: list[dict],
+        spot: spot_models.Spot,
+        logger: logging.Logger
+) -> list[spot_models.Spot]:
+
     result_list = []
 
-    raw_result_list = resp.json().get('results')
     if (raw_result_list is not None) and (len(raw_result_list) > 0):
 
         for result in raw_result_list:
@@ -196,7 +384,7 @@ def search_nearby_spots_by_spot(
                 logger.warning("result nearby spot missing %s", diff_set)
                 continue
 
-            spot = spot_models.Spot(
+            nearby_spot = spot_models.Spot(
                 address=result['vicinity'],
                 name=result['name'],
                 rating=result.get('rating', 0),
@@ -206,6 +394,197 @@ def search_nearby_spots_by_spot(
                 types=result['types'],
                 geometry=result['geometry']
             )
-            result_list.append(spot)
+            result_list.append(nearby_spot)
 
     return result_list
+
+
+class NearbySpeculation:
+
+    """
+    per region (1 degree cells) counts of typed nearby searches coming back empty,
+    speculation pays off when typed is empty, the untyped request was then already in flight
+    and its time is saved, otherwise the untyped request was wasted
+    """
+
+    def __init__(self):
+        self.regions = collections.OrderedDict()
+
+    def _region_stats(self, region: str) -> dict:
+
+        region_stats = self.regions.get(region)
+        if region_stats is None:
+            region_stats = self.regions[region] = {
+                'search_n':      0,
+                'typed_empty_n': 0,
+                'speculated_n':  0,
+                'paid_off_n':    0,
+                'saved_s':       0.0,
+            }
+        self.regions.move_to_end(region)
+
+        while len(self.regions) > _SPECULATION_REGION_N:
+            self.regions.popitem(last=False)
+
+        return region_stats
+
+    def should_speculate(self, region: str, mode: str) -> bool:
+
+        if mode == SPECULATION_ON:
+            return True
+        if mode != SPECULATION_AUTO:
+            return False
+
+        region_stats = self.regions.get(region)
+        if (region_stats is None) or (region_stats['search_n'] < _SPECULATION_AUTO_MIN_N):
+            return False
+
+        return region_stats['typed_empty_n'] / region_stats['search_n'] >= _SPECULATION_AUTO_EMPTY_RATE
+
+    def record(self, region: str, typed_empty: bool, speculated: bool, saved_s: float = 0.0):
+
+        region_stats = self._region_stats(region)
+        region_stats['search_n'] += 1
+        region_stats['typed_empty_n'] += 1 if typed_empty else 0
+        region_stats['speculated_n'] += 1 if speculated else 0
+        region_stats['paid_off_n'] += 1 if (speculated and typed_empty) else 0
+        region_stats['saved_s'] += saved_s
+
+    def stats(self) -> dict:
+
+        total = collections.Counter()
+        region_list = []
+        for region, region_stats in self.regions.items():
+
+            total.update(region_stats)
+            region_list.append({
+                'region':           region,
+                'search_n':         region_stats['search_n'],
+                'typed_empty_rate': round(region_stats['typed_empty_n'] / region_stats['search_n'], 3),
+                'speculated_n':     region_stats['speculated_n'],
+                'paid_off_n':       region_stats['paid_off_n'],
+                'saved_s':          round(region_stats['saved_s'], 3),
+            })
+
+        region_list.sort(key=lambda region_stats: region_stats['search_n'], reverse=True)
+
+        return {
+            'search_n':      total['search_n'],
+            'typed_empty_n': total['typed_empty_n'],
+            'speculated_n':  total['speculated_n'],
+            'paid_off_rate': round(total['paid_off_n'] / total['speculated_n'], 3) if total['speculated_n'] > 0 else None,
+            'wasted_n':      total['speculated_n'] - total['paid_off_n'],
+            'saved_s':       round(total['saved_s'], 3),
+            'top_regions':   region_list[:20],
+        }
+
+
+nearby_speculation = NearbySpeculation()
+
+
+def _nearby_region(spot: spot_models.Spot) -> str:
+
+    location = spot.geometry['location']
+
+    return f"{math.floor(float(location['lat']))},{math.floor(float(location['lng']))}"
+
+
+def _merge_nearby_spots(
+        gmap_spot_list: list[spot_models.Spot],
+        known_spot_list: list[spot_models.Spot]
+) -> list[spot_models.Spot]:
+
+    """google results first in their order, then known spots of places google did not return"""
+
+    place_id_set = {spot.place_id for spot in gmap_spot_list}
+
+    return gmap_spot_list + [spot for spot in known_spot_list if spot.place_id not in place_id_set]
+
+
+async def search_nearby_spots_by_spot_async(
+        api_key: str,
+        spot: spot_models.Spot,
+        logger: logging.Logger,
+        radius: int = NEARBY_RADIUS,
+        known_spots: list[spot_models.Spot] = None,
+        min_known_n: int = None,
+        speculation: str = SPECULATION_OFF
+) -> list[spot_models.Spot]:
+
+    """
+    nearby spots from google map merged with known spots nearest first,
+    google is not requested when at least min_known_n spots are known within radius,
+    a speculating search sends the untyped request along with the typed one
+    """
+
+    known_spots = known_spots or []
+    if (min_known_n is not None) and (len(known_spots) >= min_known_n):
+        logger.info("skip nearby search, %d known spot(s) within %d m of %s", len(known_spots), radius, spot.place_id)
+        return known_spots
+
+    http_client = http_utils.get_async_client('gmap')
+
+    async def _search(gmap_req_params: dict, raw_result_list: list[dict] = None) -> list[dict]:
+
+        if raw_result_list is None:
+            raw_result_list = shared_cache_utils.get('gmap_nearby', _gmap_cache_params(gmap_req_params))
+        if raw_result_list is None:
+
+            resp = await deadline_utils.wait_for(
+                http_client.get(_GMAP_NEARBY_SEARCH_REQ_URL, params=gmap_req_params, timeout=_GMAP_TIMEOUT),
+                cap=_GMAP_TIMEOUT
+            )
+            raw_result_list = _gmap_results('gmap_nearby', gmap_req_params, resp.json())
+
+        return raw_result_list
+
+    async def _timed_search(gmap_req_params: dict) -> tuple[list[dict], float]:
+
+        start = time.perf_counter()
+        raw_result_list = await _search(gmap_req_params)
+
+        return raw_result_list, time.perf_counter() - start
+
+    # request for tourist_attraction, and without type only when it finds nothing unless speculating
+    gmap_req_params = _gmap_nearby_params(api_key=api_key, spot=spot, radius=radius)
+    untyped_req_params = {k: v for k, v in gmap_req_params.items() if k != 'type'}
+
+    # speculate on a typed cache miss only, an untyped request sent along a cached typed one is paid for nothing
+    typed_cached_list = shared_cache_utils.get('gmap_nearby', _gmap_cache_params(gmap_req_params))
+
+    region = _nearby_region(spot)
+    speculated = (typed_cached_list is None) and nearby_speculation.should_speculate(region, speculation)
+
+    if speculated:
+
+        untyped_task = asyncio.create_task(_timed_search(untyped_req_params))
+        try:
+
+            raw_result_list, typed_s = await _timed_search(gmap_req_params)
+            typed_empty = len(raw_result_list) == 0
+
+            saved_s = 0.0
+            if typed_empty:
+                raw_result_list, untyped_s = await untyped_task
+                saved_s = min(typed_s, untyped_s)
+
+        finally:
+            untyped_task.cancel()
+            await asyncio.gather(untyped_task, return_exceptions=True)
+
+        nearby_speculation.record(region, typed_empty=typed_empty, speculated=True, saved_s=saved_s)
+
+    else:
+
+        raw_result_list = await _search(gmap_req_params, typed_cached_list)
+        typed_empty = len(raw_result_list) == 0
+
+        if typed_empty:
+            raw_result_list = await _search(untyped_req_params)
+
+        nearby_speculation.record(region, typed_empty=typed_empty, speculated=False)
+
+    # parse response
+    gmap_spot_list = _gmap_nearby_results_to_spots(raw_result_list, spot=spot, logger=logger)
+
+    return _merge_nearby_spots(gmap_spot_list, known_spots)
@@ -13,7 +13,8 @@ class Picture:
             filename:   str = None,
             size:       str = None,
             url:        str = None,
-            found_spot: bool = None
+            found_spot: bool = None,
+            content_hash: str = None
     ):
 
         time_now        = datetime.datetime.now()
@@ -26,6 +27,8 @@ class Picture:
         self.url        = url
         self.found_spot = found_spot
 
+        self.content_hash = content_hash  # sha256 of picture bytes saved on s3
+
         self.meta_data = {
             "ref_id":   None,
             "ref_type": None,  # 'mood_pic'
@@ -24,6 +24,7 @@ class SpotImage:
             'position':   None,
             'src_domain': None,
             'src_url':    None,
+            'src_weight': None,
         }
 
 
@@ -0,0 +1,72 @@
+import os
+import sys
+
+from fastapi import APIRouter
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from servers.dependencies import app_resources, app_logger
+from servers.models.error import ErrorInfo
+from servers.utils import mood_refresh as mood_refresh_utils
+
+
+router = APIRouter(
+    prefix="/v1/admin"
+)
+
+
+@router.post("/mood-cache/refresh")
+async def post_mood_cache_refresh():
+
+    """
+    post_mood_cache_refresh: merge newly cached mood messages into the worker serving this request
+    curl -XPOST 'http://0.0.0.0:5000/v1/admin/mood-cache/refresh'
+
+    only new messages since the worker watermark are read, other workers pick them up on their next poll
+    """
+
+    app_logger.info("endpoint: /v1/admin/mood-cache/refresh, info: get request for refreshing cached mood messages")
+
+    try:
+
+        added_n = await mood_refresh_utils.mood_refresher.force_refresh()
+        if added_n is None:
+            resp = JSONResponse(
+                status_code=429,
+                content={"message": "cached mood messages refreshed too recently, retry later"}
+            )
+            return resp
+
+    except Exception as e:
+
+        err_msg = f"endpoint: /v1/admin/mood-cache/refresh, error: {repr(e)}"
+        app_logger.error(err_msg)
+
+        err_info = ErrorInfo(
+            err_type="FailedToProcessRequest",
+            err_msg=err_msg
+        )
+        return JSONResponse(
+            status_code=500,
+            content=jsonable_encoder(err_info)
+        )
+
+    raw_resp = {
+        "pid":        os.getpid(),
+        "added_n":    added_n,
+        "mood_cache": app_resources['cached_mood_messages'].stats(),
+    }
+    resp = JSONResponse(
+        status_code=200,
+        content=jsonable_encoder(raw_resp)
+    )
+
+    app_logger.info(
+        "endpoint: /v1/admin/mood-cache/refresh, info: done refreshing cached mood messages, added %d",
+        added_n
+    )
+
+    return resp
@@ -0,0 +1,93 @@
+import os
+import sys
+
+import json
+
+from fastapi import APIRouter, Depends
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from servers.dependencies import app_params, app_resources, app_logger
+from servers.models.error import ErrorInfo
+
+from databases import database as db_main
+from databases.models.job import Job as DBJob
+
+
+router = APIRouter(
+    prefix="/v1/jobs"
+)
+
+
+@router.get("/{job_id}")
+async def get_job(
+        job_id: str,
+        db: AsyncSession = Depends(db_main.get_async_db_session)
+):
+
+    """
+    get_job: get status and result of a background job
+    curl -XGET 'http://0.0.0.0:5000/v1/jobs/0b0e0d9c-64b5-4bd6-a7a4-0de5a5e2a6f4'
+    """
+
+    app_logger.info(
+        "endpoint: /v1/jobs/<job_id>, info: get request for job %s",
+        job_id
+    )
+
+    err_status_code = 500
+    err_type = "FailedToProcessRequest"
+    try:
+
+        # check job_id
+        if (job_id is None) or (len(job_id.strip()) == 0):
+            err_status_code = 400
+            err_type = "InvalidRequest"
+            raise Exception("missing job_id")
+
+        # get job from db
+        db_job = await db.get(DBJob, job_id)
+        if db_job is None:
+            err_status_code = 404
+            err_type = "InvalidRequest"
+            raise Exception(f"job {job_id} not found in database")
+
+    except Exception as e:
+        req_msg = {'job_id': job_id}
+        err_msg = f"endpoint: /v1/jobs/<job_id>, error: {repr(e)}, request: {json.dumps(req_msg)}"
+        app_logger.error(err_msg)
+
+        err_info = ErrorInfo(
+            err_type=err_type,
+            err_msg=err_msg
+        )
+        return JSONResponse(
+            status_code=err_status_code,
+            content=jsonable_encoder(err_info)
+        )
+
+    raw_resp = {
+        "job_id":     db_job.id,
+        "type":       db_job.type,
+        "status":     db_job.status,
+        "result":     db_job.result,
+        "error":      db_job.error,
+        "created_at": db_job.created_at,
+        "updated_at": db_job.updated_at,
+    }
+    resp = JSONResponse(
+        status_code=200,
+        content=jsonable_encoder(raw_resp)
+    )
+
+    app_logger.info(
+        "endpoint: /v1/jobs/<job_id>, info: done request for job %s",
+        job_id
+    )
+
+    return resp
@@ -2,16 +2,15 @@ import os
 import sys
 
 import json
-from typing import Optional
+from typing import Annotated, Optional
 
-import random
+import datetime
 
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, Header, Response
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.ext.asyncio import AsyncSession
 
 _root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, _root_dir)
@@ -19,32 +18,167 @@ sys.path.insert(0, _root_dir)
 from servers.dependencies import app_params, app_resources, app_logger
 
 from servers.utils import model as model_utils
+from servers.utils import batch as batch_utils
+from servers.utils import job as job_utils
+from servers.utils import mood_pool as mood_pool_utils
+from servers.utils import claim as claim_utils
 
 from servers.models.error import ErrorInfo
 from servers.models import mood as mood_models
 
 from servers.logics import mood as mood_logics
 
+from utils import cache as cache_utils
+from utils.singleflight import SingleFlight
+
 from databases import database as db_main
+from databases import queries as db_queries
 from databases.models.mood import MoodMessage as DBMoodMessage
 from databases.models.mood import MoodPicture as DBMoodPicture
-from databases.models.picture import Picture as DBPicture
 
 
 router = APIRouter(
     prefix="/v1/mood"
 )
 
+_MOOD_PICTURE_JOB = "mood_picture"
+
+# pictures this recent are shared with concurrent requests, openai picture urls expire after an hour
+_SHARED_MOOD_PICTURE_AGE = datetime.timedelta(minutes=10)
+
+# a claim left by a killed worker is taken over after this, longer than any openai generation
+_MOOD_PICTURE_CLAIM_TTL = datetime.timedelta(minutes=5)
+
+_mood_picture_flight = SingleFlight()
+
+_mood_message_cache = cache_utils.get_cache('mood_message', max_size=10000, ttl=3600.0)
+
+
+def _mood_picture_result(db_mood_pic: DBMoodPicture) -> dict:
+
+    return {
+        "mood_pic_id":   str(db_mood_pic.id),
+        "mood_pic_url":  db_mood_pic.url,
+        "mood_pic_size": db_mood_pic.size
+    }
+
+
+async def _generate_mood_picture(mood_message_id: str, used_mood_pic_id_set: set) -> dict:
+
+    """
+    generate mood picture once across gunicorn workers: the claim makes concurrent requests in
+    other workers wait and then share the picture generated here, no transaction is open while
+    waiting on openai
+    """
+
+    claim_key = f"mood_picture:{mood_message_id}"
+
+    async def _find_shared(db: AsyncSession) -> dict:
+        db_mood_pic = await db.scalar(
+            db_queries.unused_recent_mood_picture(mood_message_id, used_mood_pic_id_set, _SHARED_MOOD_PICTURE_AGE)
+        )
+        return _mood_picture_result(db_mood_pic) if db_mood_pic is not None else None
+
+    claim_owner, result = await claim_utils.claim_or_wait(claim_key, _MOOD_PICTURE_CLAIM_TTL, _find_shared)
+    if result is not None:
+        app_logger.info(
+            "found mood picture %s generated by other worker for mood message %s",
+            result['mood_pic_id'],
+            mood_message_id
+        )
+        return result
+
+    try:
+
+        async with db_main.AsyncSessionLocal() as db:
+            db_mood_msg = await db.get(DBMoodMessage, mood_message_id)
+        if (db_mood_msg is None) or (len(db_mood_msg.content) == 0):
+            raise Exception(f"mood message {mood_message_id} not found in database")
+
+        # generate by openai
+        svr_mood_msg = model_utils.db_mood_message_to_server_mood_message(db_mood_msg)
+        image_size   = app_params['mood_image_size']
+        svr_mood_pic = await mood_logics.generate_mood_image_by_description_async(
+            mood_msg=svr_mood_msg,
+            image_size=image_size,
+        )
+
+        # save generated mood picture, committed with claim release
+        db_mood_pic = DBMoodPicture(
+            uuid_str=svr_mood_pic.uuid,
+            url=svr_mood_pic.url,
+            size=svr_mood_pic.size,
+            prompt=svr_mood_pic.prompt,
+            model=svr_mood_pic.model,
+            mood_message_id=db_mood_msg.id
+        )
+        async with db_main.AsyncSessionLocal() as db:
+            db.add(db_mood_pic)
+            await db.execute(db_queries.release_search_claim(claim_key, claim_owner))
+            await db.commit()
+
+    except BaseException:
+        await claim_utils.release(claim_key, claim_owner)
+        raise
+
+    result = {
+        "mood_pic_id":   str(svr_mood_pic.uuid),
+        "mood_pic_url":  svr_mood_pic.url,
+        "mood_pic_size": svr_mood_pic.size
+    }
+
+    return result
+
+
+async def _generate_mood_picture_once(mood_message_id: str, used_mood_pic_id_set: set) -> dict:
+
+    """generate once for all concurrent identical requests in this worker"""
+
+    return await _mood_picture_flight.do(
+        (mood_message_id, frozenset(used_mood_pic_id_set)),
+        _generate_mood_picture,
+        mood_message_id,
+        used_mood_pic_id_set
+    )
+
+
+async def _run_mood_picture_job(job_params: dict) -> dict:
+
+    return await _generate_mood_picture_once(
+        job_params['mood_message_id'],
+        set(job_params.get('used_mood_pic_ids', []))
+    )
+
+
+job_utils.job_runner.register(_MOOD_PICTURE_JOB, _run_mood_picture_job)
+
+
+async def _load_mood_message(db: AsyncSession, mood_message_id: str) -> dict:
+
+    db_mood_message = await db.get(DBMoodMessage, mood_message_id)
+    if (db_mood_message is None) or (len(db_mood_message.content) == 0):
+        return None
+
+    raw_resp = {
+        "mood_message_id": db_mood_message.id,
+        "message":         db_mood_message.content
+    }
+
+    return jsonable_encoder(raw_resp)
+
 
 @router.get("/{mood_message_id}")
-def get_mood_message(
+async def get_mood_message(
         mood_message_id: str,
-        db: Session = Depends(db_main.get_db_session)
+        if_none_match: Annotated[Optional[str], Header()] = None,
+        db: AsyncSession = Depends(db_main.get_async_db_session)
 ):
 
     """
     get_mood_message: get mood message content by id
     curl -XGET 'http://0.0.0.0:5000/v1/mood/c0793ebf-fbc9-4e01-bc39-f2d6184e14f2'
+
+    mood messages never change, a matching If-None-Match is answered with 304 without db lookup
     """
 
     app_logger.info(
@@ -62,9 +196,26 @@ def get_mood_message(
             err_type = "InvalidRequest"
             raise Exception("missing mood_message_id")
 
-        # get mood message from db
-        db_mood_message = db.get(DBMoodMessage, mood_message_id)
-        if (db_mood_message is None) or (len(db_mood_message.content) == 0):
+        mood_message_key = cache_utils.canonical_id(mood_message_id)
+        if mood_message_key is None:
+            err_status_code = 404
+            err_type = "InvalidRequest"
+            raise Exception(f"mood message {mood_message_id} not found in database")
+
+        # client has it already, before the lookup so * can not tell it exists
+        etag = cache_utils.resource_etag('mood_message', mood_message_key)
+        if cache_utils.etag_matches(if_none_match, etag, found=False):
+            return Response(
+                status_code=304,
+                headers={"ETag": etag, "Cache-Control": cache_utils.IMMUTABLE_CACHE_CONTROL}
+            )
+
+        # get mood message from cache or db
+        raw_resp = await _mood_message_cache.get_or_load(
+            mood_message_key,
+            lambda: _load_mood_message(db, mood_message_key)
+        )
+        if raw_resp is None:
             err_status_code = 404
             err_type = "InvalidRequest"
             raise Exception(f"mood message {mood_message_id} not found in database")
@@ -83,13 +234,10 @@ def get_mood_message(
             content=jsonable_encoder(err_info)
         )
 
-    raw_resp = {
-        "mood_message_id": db_mood_message.id,
-        "message":         db_mood_message.content
-    }
     resp = JSONResponse(
         status_code=200,
-        content=jsonable_encoder(raw_resp)
+        content=raw_resp,
+        headers={"ETag": etag, "Cache-Control": cache_utils.IMMUTABLE_CACHE_CONTROL}
     )
 
     app_logger.info(
@@ -100,10 +248,81 @@ def get_mood_message(
     return resp
 
 
+@router.post(":batchGet")
+async def batch_get_mood_messages(
+        req_body: dict,
+        db: AsyncSession = Depends(db_main.get_async_db_session)
+):
+
+    """
+    batch_get_mood_messages: get mood messages by ids in one query, ids not found are listed in missing_ids
+    curl -XPOST 'http://0.0.0.0:5000/v1/mood:batchGet' -H 'Content-Type: application/json' -d '{"ids": ["c0793ebf-fbc9-4e01-bc39-f2d6184e14f2"]}'
+    """
+
+    app_logger.info("endpoint: /v1/mood:batchGet, info: get request for batch getting mood messages")
+
+    err_status_code = 500
+    err_type = "FailedToProcessRequest"
+    try:
+
+        # parse ids
+        try:
+            req_id_list = batch_utils.parse_batch_ids(req_body)
+        except ValueError as e:
+            err_status_code = 400
+            err_type = "InvalidRequest"
+            raise e
+
+        # get all from db at once
+        parsed_id_list = [parsed_id for _, parsed_id in req_id_list if parsed_id is not None]
+        db_row_list = (await db.execute(db_queries.mood_messages_by_ids(parsed_id_list))).all()
+
+        found = {
+            db_row.id: {
+                "mood_message_id": str(db_row.id),
+                "message":         db_row.content
+            }
+            for db_row in db_row_list
+            if (db_row.content is not None) and (len(db_row.content) > 0)
+        }
+        found_list, missing_id_list = batch_utils.split_found(req_id_list, found)
+
+    except Exception as e:
+        err_msg = f"endpoint: /v1/mood:batchGet, error: {repr(e)}"
+        app_logger.error(err_msg)
+
+        err_info = ErrorInfo(
+            err_type=err_type,
+            err_msg=err_msg
+        )
+        return JSONResponse(
+            status_code=err_status_code,
+            content=jsonable_encoder(err_info)
+        )
+
+    # items are json ready, serialized once
+    raw_resp = {
+        "mood_messages": found_list,
+        "missing_ids":   missing_id_list
+    }
+    resp = JSONResponse(
+        status_code=200,
+        content=raw_resp
+    )
+
+    app_logger.info(
+        "endpoint: /v1/mood:batchGet, info: done request for batch getting mood messages, found: %d, missing: %d",
+        len(found_list),
+        len(missing_id_list)
+    )
+
+    return resp
+
+
 @router.post("/generate")
-def generate_mood_message(
+async def generate_mood_message(
         req_body: Optional[dict] = None,
-        db: Session = Depends(db_main.get_db_session)
+        db: AsyncSession = Depends(db_main.get_async_db_session)
 ):
 
     """
@@ -133,27 +352,24 @@ def generate_mood_message(
         # try to get from cached
         if req_cache_bool:
 
-            cached_mood_message_id_list = app_resources['cached_mood_message_id_list']
-            cached_msg_n = len(cached_mood_message_id_list)
-
-            if cached_msg_n > 0:
+            cached_msg_id, cached_msg_str = app_resources['cached_mood_messages'].random()
+            if cached_msg_id is not None:
+                random_mood_id  = cached_msg_id
+                random_mood_str = cached_msg_str
+                app_logger.info(f"return cached mood message {cached_msg_id} from memory")
 
-                cached_i = random.randint(0, cached_msg_n-1)
-                cached_msg_id = cached_mood_message_id_list[cached_i]
+        # take a pre-generated one from pool
+        if (random_mood_str is None) or (len(random_mood_str.strip()) == 0):
 
-                db_mood_msg = db.get(DBMoodMessage, cached_msg_id)
-                if (db_mood_msg is None) or (len(db_mood_msg.content) == 0):
-                    app_logger.error(f"cached mood message {cached_msg_id} not found in database")
-                else:
-                    random_mood_id  = db_mood_msg.id
-                    random_mood_str = db_mood_msg.content
-                    app_logger.info(f"return cached mood message {cached_msg_id} from database")
+            pooled_mood_str = mood_pool_utils.mood_pool.pop(app_params['mood_message_model'])
+            if pooled_mood_str is not None:
+                random_mood_str = pooled_mood_str
+                app_logger.info("return pre-generated mood message from pool")
 
-        # generate by openai
+        # or generate by openai when pool is drained
         if (random_mood_str is None) or (len(random_mood_str.strip()) == 0):
 
-            # TODO: resolve worker timeout
-            random_mood_str = mood_logics.generate_random_mood_message(
+            random_mood_str = await mood_logics.generate_random_mood_message_async(
                 model=app_params['mood_message_model']
             )
 
@@ -190,9 +406,9 @@ def generate_mood_message(
 
 @router.post("")
 @router.post("/")
-def post_mood_message(
+async def post_mood_message(
         req_body: dict,
-        db: Session = Depends(db_main.get_db_session)
+        db: AsyncSession = Depends(db_main.get_async_db_session)
 ):
 
     """
@@ -224,7 +440,7 @@ def post_mood_message(
         if (req_mood_msg_id is not None) and (len(req_mood_msg_id) > 0):
 
             # check for cache
-            db_mood_msg = db.get(DBMoodMessage, req_mood_msg_id)
+            db_mood_msg = await db.get(DBMoodMessage, req_mood_msg_id)
 
             if (db_mood_msg is not None) \
                and (db_mood_msg.cached is True) \
@@ -263,7 +479,7 @@ def post_mood_message(
             cached=mood_msg.cached
         )
         db.add(db_mood_msg)
-        db.commit()
+        await db.commit()
 
     except Exception as e:
         err_msg = f"endpoint: /v1/mood, error: {repr(e)}"
@@ -279,7 +495,7 @@ def post_mood_message(
         )
 
     raw_resp = {
-        "mood_message_id": db_mood_msg.id
+        "mood_message_id": mood_msg.uuid
     }
     resp = JSONResponse(
         status_code=200,
@@ -288,22 +504,25 @@ def post_mood_message(
 
     app_logger.info(
         "endpoint: /v1/mood, info: done request for saving mood message %s to db",
-        db_mood_msg.id
+        mood_msg.uuid
     )
 
     return resp
 
 
 @router.post("/{mood_message_id}/picture")
-def post_mood_message_to_mood_picture(
+async def post_mood_message_to_mood_picture(
         req_body: dict,
         mood_message_id: str,
-        db: Session = Depends(db_main.get_db_session)
+        db: AsyncSession = Depends(db_main.get_async_db_session)
 ):
 
     """
     post_mood_message_to_mood_picture: generate mood picture from mood message
     curl -XPOST 'http://0.0.0.0:5000/v1/mood/c0793ebf-fbc9-4e01-bc39-f2d6184e14f2/picture' -H 'Content-Type: application/json' -d '{"used_mood_pic_ids": []}'
+
+    with "as_job": "true" a picture not found in cache is generated in background,
+    the response is 202 with a job id to poll on /v1/jobs/<job_id>
     """
 
     app_logger.info(
@@ -336,71 +555,68 @@ def post_mood_message_to_mood_picture(
             raise Exception("failed to parse mood_message_id")
 
         # get mood message from db
-        db_mood_msg = db.get(DBMoodMessage, mood_message_id)
+        db_mood_msg = await db.get(DBMoodMessage, mood_message_id)
         if (db_mood_msg is None) or (len(db_mood_msg.content) == 0):
             err_status_code = 404
             err_type = "InvalidRequest"
             raise Exception(f"mood message {mood_message_id} not found in database")
 
         # try to get from cache
-        db_s3_pic_list = db.query(DBPicture) \
-                           .join(
-                               DBMoodPicture,
-                               DBMoodPicture.id == DBPicture.reference_id,
-                               isouter=True
-                           ).filter(
-                               DBPicture.reference_type == "mood_pic"
-                           ).filter(
-                               DBMoodPicture.mood_message_id == db_mood_msg.id
-                           ).order_by(
-                               desc(DBPicture.found_spot),
-                               desc(DBMoodPicture.created_at)
-                           ).all()
-
-        if (db_s3_pic_list is not None) and (len(db_s3_pic_list) > 0):
-
-            for db_s3_pic in db_s3_pic_list:
-
-                if str(db_s3_pic.reference_id) not in used_mood_pic_id_set:
-
-                    raw_resp = {
-                        "mood_pic_id":   db_s3_pic.reference_id,
-                        "mood_pic_url":  db_s3_pic.url,
-                        "mood_pic_size": db_s3_pic.size
-                    }
-                    resp = JSONResponse(
-                        status_code=200,
-                        content=jsonable_encoder(raw_resp)
-                    )
-
-                    app_logger.info(
-                        "endpoint: /v1/mood/<mood_message_id>/picture, info: found cached mood picture %s for mood message %s",
-                        db_s3_pic.reference_id,
-                        mood_message_id
-                    )
-
-                    return resp
-
-        # TODO: resolve worker timeout
-        # if not cached mood picture not found, generate by openai
-        svr_mood_msg = model_utils.db_mood_message_to_server_mood_message(db_mood_msg)
-        image_size   = app_params['mood_image_size']
-        svr_mood_pic = mood_logics.generate_mood_image_by_description(
-            mood_msg=svr_mood_msg,
-            image_size=image_size,
-        )
+        db_s3_pic = await db.scalar(db_queries.unused_saved_mood_picture(db_mood_msg.id, used_mood_pic_id_set))
+        if db_s3_pic is not None:
+
+            raw_resp = {
+                "mood_pic_id":   db_s3_pic.reference_id,
+                "mood_pic_url":  db_s3_pic.url,
+                "mood_pic_size": db_s3_pic.size
+            }
+            resp = JSONResponse(
+                status_code=200,
+                content=jsonable_encoder(raw_resp)
+            )
 
-        # save generated mood picture
-        db_mood_pic = DBMoodPicture(
-            uuid_str=svr_mood_pic.uuid,
-            url=svr_mood_pic.url,
-            size=svr_mood_pic.size,
-            prompt=svr_mood_pic.prompt,
-            model=svr_mood_pic.model,
-            mood_message_id=mood_message_id
-        )
-        db.add(db_mood_pic)
-        db.commit()
+            app_logger.info(
+                "endpoint: /v1/mood/<mood_message_id>/picture, info: found cached mood picture %s for mood message %s",
+                db_s3_pic.reference_id,
+                mood_message_id
+            )
+
+            return resp
+
+        # if not cached mood picture not found, generate by openai in background job
+        req_job_bool_str = req_body.get('as_job', 'false')
+        if req_job_bool_str.lower() == 'true':
+
+            db_job = await job_utils.job_runner.submit(
+                db,
+                job_type=_MOOD_PICTURE_JOB,
+                params={
+                    "mood_message_id":   str(db_mood_msg.id),
+                    "used_mood_pic_ids": list(used_mood_pic_id_set)
+                }
+            )
+
+            raw_resp = {
+                "job_id": db_job.id,
+                "status": db_job.status
+            }
+            resp = JSONResponse(
+                status_code=202,
+                content=jsonable_encoder(raw_resp),
+                headers={"Location": f"/v1/jobs/{db_job.id}"}
+            )
+
+            app_logger.info(
+                "endpoint: /v1/mood/<mood_message_id>/picture, info: submitted job %s for mood message %s",
+                db_job.id,
+                mood_message_id
+            )
+
+            return resp
+
+        # or generate by openai in request, db connection is released while waiting on upstream
+        await db.commit()
+        raw_resp = await _generate_mood_picture_once(str(db_mood_msg.id), used_mood_pic_id_set)
 
     except Exception as e:
 
@@ -416,11 +632,6 @@ def post_mood_message_to_mood_picture(
             content=jsonable_encoder(err_info)
         )
 
-    raw_resp = {
-        "mood_pic_id":   db_mood_pic.id,
-        "mood_pic_url":  db_mood_pic.url,
-        "mood_pic_size": db_mood_pic.size
-    }
     resp = JSONResponse(
         status_code=200,
         content=jsonable_encoder(raw_resp)
@@ -428,7 +639,7 @@ def post_mood_message_to_mood_picture(
 
     app_logger.info(
         "endpoint: /v1/mood/<mood_message_id>/picture, info: done generating picture %s from mood message %s",
-        db_mood_pic.id,
+        raw_resp['mood_pic_id'],
         mood_message_id
     )
 
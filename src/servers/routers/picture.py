@@ -2,23 +2,27 @@ import os
 import sys
 
 import json
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, Header, Response
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.ext.asyncio import AsyncSession
 
 _root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, _root_dir)
 
 from servers.dependencies import app_params, app_resources, app_logger
 from servers.utils import model as model_utils
+from servers.utils import batch as batch_utils
 from servers.models.error import ErrorInfo
 from servers.logics import picture as pic_logics
 
+from utils import cache as cache_utils
+
 from databases import database as db_main
+from databases import queries as db_queries
 from databases.models.mood import MoodPicture as DBMoodPicture
 from databases.models.picture import Picture as DBPicture
 
@@ -28,15 +32,36 @@ router = APIRouter(
 )
 
 
+_picture_cache = cache_utils.get_cache('picture', max_size=10000, ttl=3600.0)
+
+
+async def _load_picture(db: AsyncSession, s3_pic_id: str) -> dict:
+
+    db_picture = await db.get(DBPicture, s3_pic_id)
+    if (db_picture is None) or (len(db_picture.url) == 0):
+        return None
+
+    raw_resp = {
+        "s3_pic_id":   db_picture.id,
+        "s3_pic_url":  db_picture.url,
+        "s3_pic_size": db_picture.size
+    }
+
+    return jsonable_encoder(raw_resp)
+
+
 @router.get("/{s3_pic_id}")
-def get_picture(
+async def get_picture(
         s3_pic_id: str,
-        db: Session = Depends(db_main.get_db_session)
+        if_none_match: Annotated[Optional[str], Header()] = None,
+        db: AsyncSession = Depends(db_main.get_async_db_session)
 ):
 
     """
     get_picture: get s3 picture info from by id
     curl -XGET 'http://0.0.0.0:5000/v1/pictures/d1e82e9f-bc4f-4a97-991b-0e37d50dd6c9'
+
+    s3 pictures never change, a matching If-None-Match is answered with 304 without db lookup
     """
 
     app_logger.info(
@@ -54,9 +79,26 @@ def get_picture(
             err_type = "InvalidRequest"
             raise Exception("missing s3_pic_id")
 
-        # get mood message from db
-        db_picture = db.get(DBPicture, s3_pic_id)
-        if (db_picture is None) or (len(db_picture.url) == 0):
+        s3_pic_key = cache_utils.canonical_id(s3_pic_id)
+        if s3_pic_key is None:
+            err_status_code = 404
+            err_type = "InvalidRequest"
+            raise Exception(f"s3 picture {s3_pic_id} not found in database")
+
+        # client has it already, before the lookup so * can not tell it exists
+        etag = cache_utils.resource_etag('picture', s3_pic_key)
+        if cache_utils.etag_matches(if_none_match, etag, found=False):
+            return Response(
+                status_code=304,
+                headers={"ETag": etag, "Cache-Control": cache_utils.IMMUTABLE_CACHE_CONTROL}
+            )
+
+        # get s3 picture from cache or db
+        raw_resp = await _picture_cache.get_or_load(
+            s3_pic_key,
+            lambda: _load_picture(db, s3_pic_key)
+        )
+        if raw_resp is None:
             err_status_code = 404
             err_type = "InvalidRequest"
             raise Exception(f"s3 picture {s3_pic_id} not found in database")
@@ -75,14 +117,10 @@ def get_picture(
             content=jsonable_encoder(err_info)
         )
 
-    raw_resp = {
-        "s3_pic_id":   db_picture.id,
-        "s3_pic_url":  db_picture.url,
-        "s3_pic_size": db_picture.size
-    }
     resp = JSONResponse(
         status_code=200,
-        content=jsonable_encoder(raw_resp)
+        content=raw_resp,
+        headers={"ETag": etag, "Cache-Control": cache_utils.IMMUTABLE_CACHE_CONTROL}
     )
 
     app_logger.info(
@@ -93,11 +131,83 @@ def get_picture(
     return resp
 
 
+@router.post(":batchGet")
+async def batch_get_pictures(
+        req_body: dict,
+        db: AsyncSession = Depends(db_main.get_async_db_session)
+):
+
+    """
+    batch_get_pictures: get s3 pictures by ids in one query, ids not found are listed in missing_ids
+    curl -XPOST 'http://0.0.0.0:5000/v1/pictures:batchGet' -H 'Content-Type: application/json' -d '{"ids": ["d1e82e9f-bc4f-4a97-991b-0e37d50dd6c9"]}'
+    """
+
+    app_logger.info("endpoint: /v1/pictures:batchGet, info: get request for batch getting s3 pictures")
+
+    err_status_code = 500
+    err_type = "FailedToProcessRequest"
+    try:
+
+        # parse ids
+        try:
+            req_id_list = batch_utils.parse_batch_ids(req_body)
+        except ValueError as e:
+            err_status_code = 400
+            err_type = "InvalidRequest"
+            raise e
+
+        # get all from db at once
+        parsed_id_list = [parsed_id for _, parsed_id in req_id_list if parsed_id is not None]
+        db_row_list = (await db.execute(db_queries.pictures_by_ids(parsed_id_list))).all()
+
+        found = {
+            db_row.id: {
+                "s3_pic_id":   str(db_row.id),
+                "s3_pic_url":  db_row.url,
+                "s3_pic_size": db_row.size
+            }
+            for db_row in db_row_list
+            if (db_row.url is not None) and (len(db_row.url) > 0)
+        }
+        found_list, missing_id_list = batch_utils.split_found(req_id_list, found)
+
+    except Exception as e:
+        err_msg = f"endpoint: /v1/pictures:batchGet, error: {repr(e)}"
+        app_logger.error(err_msg)
+
+        err_info = ErrorInfo(
+            err_type=err_type,
+            err_msg=err_msg
+        )
+        return JSONResponse(
+            status_code=err_status_code,
+            content=jsonable_encoder(err_info)
+        )
+
+    # items are json ready, serialized once
+    raw_resp = {
+        "pictures":    found_list,
+        "missing_ids": missing_id_list
+    }
+    resp = JSONResponse(
+        status_code=200,
+        content=raw_resp
+    )
+
+    app_logger.info(
+        "endpoint: /v1/pictures:batchGet, info: done request for batch getting s3 pictures, found: %d, missing: %d",
+        len(found_list),
+        len(missing_id_list)
+    )
+
+    return resp
+
+
 @router.post("")
 @router.post("/")
-def post_picture(
+async def post_picture(
         req_body: dict,
-        db: Session = Depends(db_main.get_db_session)
+        db: AsyncSession = Depends(db_main.get_async_db_session)
 ):
 
     """
@@ -139,10 +249,7 @@ def post_picture(
         if pic_ref_type == 'mood_pic':
 
             # check if pic already save on s3
-            db_pic = db.query(DBPicture) \
-                       .filter(DBPicture.reference_id == pic_ref_id) \
-                       .order_by(desc(DBPicture.created_at)) \
-                       .first()
+            db_pic = await db.scalar(db_queries.saved_picture_by_reference(pic_ref_id))
 
             if db_pic is not None:
 
@@ -151,7 +258,7 @@ def post_picture(
             else:
 
                 # get mood picture from db
-                db_mood_pic = db.get(DBMoodPicture, pic_ref_id)
+                db_mood_pic = await db.get(DBMoodPicture, pic_ref_id)
                 if (db_mood_pic is None) or (len(db_mood_pic.url) == 0):
                     err_status_code = 404
                     err_type = "InvalidRequest"
@@ -161,12 +268,13 @@ def post_picture(
                 svr_mood_pic = model_utils.db_mood_picture_to_server_mood_picture(db_mood_pic)
 
                 # save pic to s3
-                svr_picture = pic_logics.save_picture_to_s3_by_url(
+                svr_picture = await pic_logics.save_picture_to_s3_by_url_async(
                     source_url=svr_mood_pic.url,
                     source_size=svr_mood_pic.size,
                     s3_region=app_params['aws_access_region'],
                     s3_bucket_name=app_params['aws_s3_bucket_name'],
-                    s3_file_path=app_params['aws_s3_file_path']
+                    s3_file_path=app_params['aws_s3_file_path'],
+                    s3_endpoint_url=app_params['aws_s3_endpoint']
                 )
 
                 # save pic to db
@@ -177,9 +285,10 @@ def post_picture(
                     url=svr_picture.url,
                     reference_type=pic_ref_type,
                     reference_id=pic_ref_id,
+                    content_hash=svr_picture.content_hash,
                 )
                 db.add(db_pic)
-                db.commit()
+                await db.commit()
 
     except Exception as e:
         err_msg = f"endpoint: /v1/pictures, error: {repr(e)}, request: {json.dumps(req_body)}"
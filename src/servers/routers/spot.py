@@ -2,23 +2,38 @@ import os
 import sys
 
 import json
+import asyncio
+import contextvars
+import datetime
+import functools
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, Header, Response
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.ext.asyncio import AsyncSession
 
 _root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, _root_dir)
 
 from servers.dependencies import app_params, app_resources, app_logger
 from servers.models.error import ErrorInfo
+from servers.models import spot as spot_models
 from servers.utils import model as model_utils
+from servers.utils import batch as batch_utils
+from servers.utils import place_search as place_search_utils
+from servers.utils import progress as progress_utils
+from servers.utils import claim as claim_utils
 from servers.logics import spot as spot_logics
 
+from utils import cache as cache_utils
+from utils import deadline as deadline_utils
+from utils import json as js_utils
+from utils.singleflight import SingleFlight
+
 from databases import database as db_main
+from databases import queries as db_queries
 from databases.models.picture import Picture as DBPicture
 from databases.models.spot import SpotImage as DBSpotImage
 from databases.models.spot import Spot as DBSpot
@@ -29,15 +44,319 @@ router = APIRouter(
 )
 
 
+_spot_search_flight = SingleFlight()
+
+# lens candidates searched on places, at most this many at once, their places are ranked together
+_SPOT_CANDIDATE_MAX = 10
+_SPOT_CANDIDATE_CONCURRENCY = 5
+
+# best ranked spots of a picture kept for alternatives
+_SPOT_ALTERNATIVE_N = 5
+
+# a claim left by a killed worker is taken over after this, longer than any spot search
+_SPOT_SEARCH_CLAIM_TTL = datetime.timedelta(minutes=5)
+
+# seconds without an event before a progress stream sends a keepalive
+_SPOT_STREAM_KEEPALIVE = 15.0
+
+# (response content, etag) of spots found for pictures
+_spot_search_cache = cache_utils.get_cache('spot_search', max_size=10000, ttl=600.0)
+
+# nearby spots of a place are kept in db, fresh for a day, then served while refreshed in background
+_NEARBY_FRESH_AGE = datetime.timedelta(days=1)
+_NEARBY_MAX_AGE = datetime.timedelta(days=30)
+_NEARBY_REFRESH_BUDGET = 60.0
+_NEARBY_SPOT_N = 10
+
+# google is not requested when this many known spots lie within the radius
+_NEARBY_KNOWN_MIN = 10
+
+_nearby_flight = SingleFlight()
+_nearby_refresh_tasks = {}
+
+# nearby spots of spots served by this worker, kept shorter than fresh age
+_nearby_cache = cache_utils.get_cache('nearby_spots', max_size=10000, ttl=300.0)
+
+
+async def _find_cached_spot(db: AsyncSession, picture_id) -> dict:
+
+    db_spot = await db.scalar(db_queries.cached_spot_by_picture(picture_id))
+    if db_spot is None:
+        return None
+
+    raw_resp = {
+        "spot_id":    db_spot.id,
+        "created_at": db_spot.created_at,
+        "address":    db_spot.address,
+        "name":       db_spot.name,
+        "rating":     db_spot.rating,
+        "rating_n":   db_spot.rating_n,
+        "place_id":   db_spot.place_id,
+        "reference":  db_spot.reference,
+        "types":      db_spot.types,
+        "geometry":   db_spot.geometry,
+        "image": {
+            "id":  db_spot.spot_image.id,
+            "url": db_spot.spot_image.thumbnail,
+        }
+    }
+
+    return raw_resp
+
+
+async def _load_lens_matches(picture_id, content_hash: str) -> list[dict]:
+
+    async with db_main.AsyncSessionLocal() as db:
+        raw_matches = await db.scalar(db_queries.lens_search(picture_id, content_hash))
+    if raw_matches is None:
+        return None
+
+    return js_utils.loads_compressed(raw_matches)
+
+
+async def _save_lens_matches(picture_id, picture_url: str, content_hash: str, glen_visual_matches: list[dict]):
+
+    """
+    own transaction, so the paid lens search is kept even when the spot search fails later, called
+    with no other connection checked out by the search, a failed save only loses the stored matches
+    """
+
+    try:
+        async with db_main.AsyncSessionLocal() as db:
+            await db.execute(
+                db_queries.upsert_lens_search(
+                    picture_id=picture_id,
+                    pic_url=picture_url,
+                    content_hash=content_hash,
+                    match_n=len(glen_visual_matches),
+                    raw_matches=js_utils.dumps_compressed(glen_visual_matches)
+                )
+            )
+            await db.commit()
+    except Exception as e:
+        app_logger.warning("failed to save lens matches of s3 picture %s: %s", picture_id, repr(e))
+
+
+def _publish_candidate(progress_key: str, candidate_list: list, candidate_i: int, result):
+
+    spot_img = candidate_list[candidate_i]
+    candidate_event = {
+        "index":      candidate_i,
+        "title":      spot_img.title,
+        "src_domain": spot_img.meta_data['src_domain'],
+    }
+
+    if isinstance(result, BaseException):
+        progress_utils.spot_search_progress.publish(progress_key, "candidate", {**candidate_event, "error": repr(result)})
+        return
+
+    candidate_event['places'] = [spot.name for spot in result[:3]]
+    candidate_event['place_n'] = len(result)
+    progress_utils.spot_search_progress.publish(progress_key, "candidate", candidate_event)
+
+
+def _ranked_spot_resp(score: float, svr_spot, saved: bool) -> dict:
+
+    """ranked spot of a picture, only the one saved as the spot of the picture has a spot_id"""
+
+    res_spot = {
+        "spot_id":    svr_spot.uuid if saved else None,
+        "score":      score,
+        "address":    svr_spot.address,
+        "name":       svr_spot.name,
+        "rating":     svr_spot.rating,
+        "rating_n":   svr_spot.rating_n,
+        "place_id":   svr_spot.place_id,
+        "reference":  svr_spot.reference,
+        "types":      svr_spot.types,
+        "geometry":   svr_spot.geometry,
+        "image": {
+            "url":        svr_spot.image.thumbnail,
+            "title":      svr_spot.image.title,
+            "src_domain": svr_spot.image.meta_data['src_domain'],
+        }
+    }
+
+    return res_spot
+
+
+async def _search_spot_by_picture(picture_id, picture_url: str, content_hash: str = None) -> dict:
+
+    """
+    search spot for picture once across gunicorn workers: the claim makes concurrent searches in
+    other workers wait and then read the spot saved here, no transaction is open while waiting on
+    serpapi or google
+    """
+
+    claim_key = f"spot_search:{picture_id}"
+    claim_owner, raw_resp = await claim_utils.claim_or_wait(
+        claim_key,
+        _SPOT_SEARCH_CLAIM_TTL,
+        lambda db: _find_cached_spot(db, picture_id)
+    )
+    if raw_resp is not None:
+        app_logger.info("found spot %s searched by other worker for picture %s", raw_resp['spot_id'], picture_id)
+        return raw_resp
+
+    try:
+
+        # search: s3 picture (mood image) -> lens matches, stored ones when searched before
+        lens_source = "db"
+        glen_visual_matches = await _load_lens_matches(picture_id, content_hash)
+        if glen_visual_matches is None:
+
+            lens_source = "serpapi"
+
+            glen_visual_matches = await spot_logics.search_visual_matches_by_pic_url_async(
+                api_key=app_params['serpapi_api_key'],
+                pic_url=picture_url
+            )
+            await _save_lens_matches(picture_id, picture_url, content_hash, glen_visual_matches)
+
+        else:
+            app_logger.info("found stored lens matches for s3 picture %s", picture_id)
+
+        # lens matches -> spot image
+        spot_img_list = spot_logics.glen_visual_matches_to_spot_images(glen_visual_matches)
+        app_logger.info("found %d spot image for s3 picture %s", len(spot_img_list), picture_id)
+
+        # spot image -> spots of all candidates, searched concurrently and ranked together
+        candidate_list = [spot_img for spot_img in spot_img_list if spot_img is not None][:_SPOT_CANDIDATE_MAX]
+        progress_utils.spot_search_progress.publish(
+            str(picture_id),
+            "lens",
+            {"source": lens_source, "match_n": len(glen_visual_matches), "candidate_n": len(candidate_list)}
+        )
+
+        candidate_result_list = await place_search_utils.place_text_search.search_all(
+            api_key=app_params['google_api_key'],
+            images=candidate_list,
+            concurrency=_SPOT_CANDIDATE_CONCURRENCY,
+            _on_result=functools.partial(_publish_candidate, str(picture_id), candidate_list)
+        )
+
+        err_list = [result for result in candidate_result_list if isinstance(result, BaseException)]
+        if (len(err_list) > 0) and (len(err_list) == len(candidate_list)):
+            raise err_list[0]
+        if len(err_list) > 0:
+            app_logger.warning("failed to search %d of %d lens candidate(s): %s", len(err_list), len(candidate_list), repr(err_list[0]))
+
+        spot_lists = [result if not isinstance(result, BaseException) else [] for result in candidate_result_list]
+        ranked_list = spot_logics.rank_candidate_spots(candidate_list, spot_lists, top_k=_SPOT_ALTERNATIVE_N)
+        app_logger.info("ranked %d spot(s) found with %d lens candidate(s)", len(ranked_list), len(candidate_list))
+
+        if len(ranked_list) == 0:
+            await claim_utils.release(claim_key, claim_owner)
+            return None
+        spot_result = ranked_list[0][1]
+
+        # update spot image and spot to db, committed with claim release
+        db_spot_img = DBSpotImage(
+            uuid_str=spot_result.image.uuid,
+            thumbnail=spot_result.image.thumbnail,
+            url=spot_result.image.url,
+            title=spot_result.image.title,
+            reference_id=picture_id,
+            meta_data=spot_result.image.meta_data
+        )
+        db_spot = DBSpot(
+            uuid_str=spot_result.uuid,
+            address=spot_result.address,
+            name=spot_result.name,
+            rating=spot_result.rating,
+            rating_n=spot_result.rating_n,
+            place_id=spot_result.place_id,
+            reference=spot_result.reference,
+            types=spot_result.types,
+            geometry=spot_result.geometry,
+            spot_image_id=picture_id
+        )
+        db_spot.spot_image = db_spot_img
+
+        async with db_main.AsyncSessionLocal() as db:
+            db.add(db_spot)
+            await db.execute(
+                db_queries.upsert_spot_alternatives(
+                    picture_id=picture_id,
+                    candidate_n=len(candidate_list),
+                    spot_list=jsonable_encoder([
+                        _ranked_spot_resp(score, svr_spot, saved=(svr_spot is spot_result))
+                        for score, svr_spot in ranked_list
+                    ])
+                )
+            )
+            await db.execute(db_queries.release_search_claim(claim_key, claim_owner))
+            await db.commit()
+
+    except BaseException:
+        await claim_utils.release(claim_key, claim_owner)
+        raise
+
+    raw_resp = {
+        "spot_id":    spot_result.uuid,
+        "created_at": spot_result.created_at,
+        "address":    spot_result.address,
+        "name":       spot_result.name,
+        "rating":     spot_result.rating,
+        "rating_n":   spot_result.rating_n,
+        "place_id":   spot_result.place_id,
+        "reference":  spot_result.reference,
+        "types":      spot_result.types,
+        "geometry":   spot_result.geometry,
+        "image": {
+            "id":  spot_result.image.uuid,
+            "url": spot_result.image.thumbnail
+        }
+    }
+
+    return raw_resp
+
+
+async def _search_spot(picture_id, picture_url: str, content_hash: str = None) -> dict:
+
+    """spot search of a picture shared by its requests, stages are published to its progress streams"""
+
+    try:
+        return await _search_spot_by_picture(picture_id, picture_url, content_hash)
+    finally:
+        progress_utils.spot_search_progress.close(str(picture_id))
+
+
+def _cache_spot_search(s3_pic_key: str, raw_resp: dict) -> tuple[dict, str]:
+
+    content = jsonable_encoder(raw_resp)
+    cached_entry = (content, cache_utils.content_etag(content))
+
+    if s3_pic_key is not None:
+        _spot_search_cache.set(s3_pic_key, cached_entry)
+
+    return cached_entry
+
+
+def _spot_search_response(cached_entry: tuple[dict, str], if_none_match: str) -> Response:
+
+    content, etag = cached_entry
+    headers = {"ETag": etag, "Cache-Control": cache_utils.REVALIDATE_CACHE_CONTROL}
+
+    if cache_utils.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    return JSONResponse(status_code=200, content=content, headers=headers)
+
+
 @router.get("/search")
-def get_spot_search_by_picture(
+async def get_spot_search_by_picture(
         s3_pic_id: str,
-        db: Session = Depends(db_main.get_db_session)
+        if_none_match: Annotated[Optional[str], Header()] = None,
+        db: AsyncSession = Depends(db_main.get_async_db_session)
 ):
 
     """
     get_spot_search_by_picture: search spot by s3 picture
     curl -XGET 'http://0.0.0.0:5000/v1/spots/search?s3_pic_id=48cdc742-ffac-4a68-a472-66f478daba17'
+
+    concurrent searches for the same picture share one upstream search,
+    spots found are cached by the worker and revalidated with If-None-Match
     """
 
     app_logger.info(
@@ -55,8 +374,14 @@ def get_spot_search_by_picture(
             err_type = "InvalidRequest"
             raise Exception("failed to parse s3_pic_id")
 
+        # spot found earlier in this worker, no db lookup
+        s3_pic_key = cache_utils.canonical_id(s3_pic_id)
+        cached_entry = _spot_search_cache.get(s3_pic_key) if s3_pic_key is not None else None
+        if cached_entry is not None:
+            return _spot_search_response(cached_entry, if_none_match)
+
         # get s3 picture from db
-        db_picture = db.get(DBPicture, s3_pic_id)
+        db_picture = await db.get(DBPicture, s3_pic_id)
         if (db_picture is None) or (len(db_picture.url) == 0):
             err_status_code = 404
             err_type = "InvalidRequest"
@@ -70,117 +395,348 @@ def get_spot_search_by_picture(
             return resp
 
         # try to get from cache
-        db_spot_list = db.query(DBSpot) \
-                         .join(
-                             DBSpotImage,
-                             isouter=True
-                         ).filter(
-                             DBSpotImage.reference_id == db_picture.id
-                         ).order_by(
-                             desc(DBSpotImage.created_at)
-                         ).all()
+        raw_resp = await _find_cached_spot(db, db_picture.id)
+        if raw_resp is not None:
 
-        for db_spot in db_spot_list:
+            resp = _spot_search_response(_cache_spot_search(s3_pic_key, raw_resp), if_none_match)
+
+            app_logger.info(
+                "endpoint: /v1/spots/search, info: found cached spot %s for picture %s",
+                raw_resp['spot_id'],
+                s3_pic_id
+            )
+
+            return resp
+
+        # release db connection while waiting on upstream
+        await db.commit()
+
+        # search once for all concurrent requests of the picture
+        raw_resp = await _spot_search_flight.do(
+            str(db_picture.id),
+            _search_spot,
+            db_picture.id,
+            db_picture.url,
+            db_picture.content_hash
+        )
+
+        if raw_resp is None:
+
+            resp = JSONResponse(
+                status_code=404,
+                content={"message": f"no spot found for s3 picture {s3_pic_id}"}
+            )
+            return resp
+
+    except Exception as e:
+
+        err_msg = f"endpoint: /v1/mood, error: {repr(e)}"
+        app_logger.error(err_msg)
+
+        err_info = ErrorInfo(
+            err_type=err_type,
+            err_msg=err_msg
+        )
+        return JSONResponse(
+            status_code=err_status_code,
+            content=jsonable_encoder(err_info)
+        )
+
+    resp = _spot_search_response(_cache_spot_search(s3_pic_key, raw_resp), if_none_match)
+
+    app_logger.info(
+        "endpoint: /v1/spots/search, info: done request for searching spot with picture %s",
+        s3_pic_id
+    )
+
+    return resp
+
+
+async def _spot_search_events(s3_pic_key: str, db_picture, content: dict):
+
+    """
+    stage events of a spot search as server-sent events: picture, lens, candidate for each candidate tried,
+    then found or not_found, error when the search failed, keepalive comments while waiting
+    """
+
+    yield progress_utils.sse_event("picture", {"s3_pic_id": s3_pic_key, "searched": content is not None})
+
+    if content is not None:
+        yield progress_utils.sse_event("found", content)
+        return
+
+    progress_key = str(db_picture.id)
+    progress_queue = progress_utils.spot_search_progress.subscribe(progress_key)
+
+    # search once for all concurrent requests of the picture, streamed or not
+    search_task = asyncio.ensure_future(
+        _spot_search_flight.do(
+            progress_key,
+            _search_spot,
+            db_picture.id,
+            db_picture.url,
+            db_picture.content_hash
+        )
+    )
+
+    event_task = None
+    try:
+
+        while not search_task.done():
+
+            event_task = asyncio.ensure_future(progress_queue.get())
+            done, _ = await asyncio.wait(
+                {event_task, search_task},
+                timeout=_SPOT_STREAM_KEEPALIVE,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+
+            if event_task in done:
+                yield progress_utils.sse_event(*event_task.result())
+                continue
+
+            event_task.cancel()
+            if len(done) == 0:
+                yield progress_utils.SSE_KEEPALIVE
+
+        # events published right before the search returned
+        while not progress_queue.empty():
+            yield progress_utils.sse_event(*progress_queue.get_nowait())
+
+        raw_resp = search_task.result()
+
+    except Exception as e:
+
+        err_msg = f"endpoint: /v1/spots/search:stream, error: {repr(e)}"
+        app_logger.error(err_msg)
+
+        err_info = ErrorInfo(
+            err_type="FailedToProcessRequest",
+            err_msg=err_msg
+        )
+        yield progress_utils.sse_event("error", jsonable_encoder(err_info))
+        return
+
+    finally:
+
+        # client gone, the shared search goes on for the others
+        search_task.cancel()
+        if event_task is not None:
+            event_task.cancel()
+        progress_utils.spot_search_progress.unsubscribe(progress_key, progress_queue)
+
+    if raw_resp is None:
+        yield progress_utils.sse_event("not_found", {"message": f"no spot found for s3 picture {s3_pic_key}"})
+        return
+
+    content, _ = _cache_spot_search(s3_pic_key, raw_resp)
+    yield progress_utils.sse_event("found", content)
 
-            if (db_spot is not None) and \
-               (db_spot.spot_image is not None) and \
-               (db_spot.spot_image.thumbnail is not None) and \
-               (len(db_spot.spot_image.thumbnail) > 0) and \
-               (db_spot.spot_image.thumbnail.strip().startswith('http')):
-
-                raw_resp = {
-                    "spot_id":    db_spot.id,
-                    "created_at": db_spot.created_at,
-                    "address":    db_spot.address,
-                    "name":       db_spot.name,
-                    "rating":     db_spot.rating,
-                    "rating_n":   db_spot.rating_n,
-                    "place_id":   db_spot.place_id,
-                    "reference":  db_spot.reference,
-                    "types":      db_spot.types,
-                    "geometry":   db_spot.geometry,
-                    "image": {
-                        "id":  db_spot.spot_image.id,
-                        "url": db_spot.spot_image.thumbnail,
-                    }
-                }
+    app_logger.info("endpoint: /v1/spots/search:stream, info: streamed spot %s for picture %s", raw_resp['spot_id'], s3_pic_key)
+
+
+@router.get("/search:stream")
+async def stream_spot_search_by_picture(
+        s3_pic_id: str,
+        db: AsyncSession = Depends(db_main.get_async_db_session)
+):
+
+    """
+    stream_spot_search_by_picture: search spot by s3 picture, streaming progress as server-sent events
+    curl -N -XGET 'http://0.0.0.0:5000/v1/spots/search:stream?s3_pic_id=48cdc742-ffac-4a68-a472-66f478daba17'
+
+    the first event follows the db lookup of the picture, the search is shared with /v1/spots/search,
+    the stream is served on the event loop and holds no db connection while searching
+    """
+
+    app_logger.info(
+        "endpoint: /v1/spots/search:stream, info: get request for streaming spot search with picture %s",
+        s3_pic_id
+    )
+
+    err_status_code = 500
+    err_type = "FailedToProcessRequest"
+    try:
+
+        # check s3_pic_id
+        s3_pic_key = cache_utils.canonical_id(s3_pic_id)
+        if s3_pic_key is None:
+            err_status_code = 400
+            err_type = "InvalidRequest"
+            raise Exception("failed to parse s3_pic_id")
+
+        # spot found earlier in this worker, no db lookup
+        db_picture = None
+        cached_entry = _spot_search_cache.get(s3_pic_key)
+
+        if cached_entry is None:
+
+            # get s3 picture from db
+            db_picture = await db.get(DBPicture, s3_pic_key)
+            if (db_picture is None) or (len(db_picture.url) == 0):
+                err_status_code = 404
+                err_type = "InvalidRequest"
+                raise Exception(f"s3 picture {s3_pic_id} not found in database")
+
+            if (db_picture.found_spot is False):
                 resp = JSONResponse(
-                    status_code=200,
-                    content=jsonable_encoder(raw_resp)
+                    status_code=404,
+                    content={"message": f"no spot found for s3 picture {s3_pic_id}"}
                 )
+                return resp
 
-                app_logger.info(
-                    "endpoint: /v1/spots/search, info: found cached spot %s for picture %s",
-                    db_spot.id,
-                    s3_pic_id
-                )
+            raw_resp = await _find_cached_spot(db, db_picture.id)
+            if raw_resp is not None:
+                cached_entry = _cache_spot_search(s3_pic_key, raw_resp)
 
-                return resp
+            # release db connection before streaming
+            await db.commit()
 
-        # TODO: resolve worker timeout
-        # search: s3 picture (mood image) -> spot image
-        spot_img_list = spot_logics.search_spot_image_by_pic_url(
-            api_key=app_params['serpapi_api_key'],
-            pic_url=db_picture.url
+    except Exception as e:
+
+        err_msg = f"endpoint: /v1/spots/search:stream, error: {repr(e)}"
+        app_logger.error(err_msg)
+
+        err_info = ErrorInfo(
+            err_type=err_type,
+            err_msg=err_msg
+        )
+        return JSONResponse(
+            status_code=err_status_code,
+            content=jsonable_encoder(err_info)
         )
-        app_logger.info("found %d spot image for s3 picture %s", len(spot_img_list), s3_pic_id)
 
-        # spot image -> spot
-        spot_result = None
-        for spot_img in spot_img_list:
+    resp = StreamingResponse(
+        _spot_search_events(s3_pic_key, db_picture, cached_entry[0] if cached_entry is not None else None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-            if spot_img is None:
-                continue
+    return resp
 
-            # TODO: resolve worker timeout
-            spot_list = spot_logics.search_spot_by_spot_image(
-                api_key=app_params['google_api_key'],
-                image=spot_img,
-            )
 
-            if len(spot_list) > 0:
-                spot_result = spot_list[0]
-                spot_result.image = spot_img
-                break
+@router.get("/alternatives")
+async def get_spot_alternatives_by_picture(
+        s3_pic_id: str,
+        db: AsyncSession = Depends(db_main.get_async_db_session)
+):
+
+    """
+    get_spot_alternatives_by_picture: get best ranked spots of an s3 picture searched before, best first
+    curl -XGET 'http://0.0.0.0:5000/v1/spots/alternatives?s3_pic_id=48cdc742-ffac-4a68-a472-66f478daba17'
+
+    spots are ranked when the picture is searched, served from db without new upstream calls
+    """
+
+    app_logger.info(
+        "endpoint: /v1/spots/alternatives, info: get request for spot alternatives of picture %s",
+        s3_pic_id
+    )
 
-        # update spot image and spot to db
-        if spot_result is None:
+    err_status_code = 500
+    err_type = "FailedToProcessRequest"
+    try:
 
+        # check s3_pic_id
+        s3_pic_key = cache_utils.canonical_id(s3_pic_id)
+        if s3_pic_key is None:
+            err_status_code = 400
+            err_type = "InvalidRequest"
+            raise Exception("failed to parse s3_pic_id")
+
+        res_spot_list = await db.scalar(db_queries.spot_alternatives(s3_pic_key))
+        if res_spot_list is None:
             resp = JSONResponse(
                 status_code=404,
-                content={"message": f"no spot found for s3 picture {s3_pic_id}"}
+                content={"message": f"no spot alternatives ranked for s3 picture {s3_pic_id}"}
             )
             return resp
 
-        else:
+    except Exception as e:
 
-            db_spot_img = DBSpotImage(
-                uuid_str=spot_result.image.uuid,
-                thumbnail=spot_result.image.thumbnail,
-                url=spot_result.image.url,
-                title=spot_result.image.title,
-                reference_id=db_picture.id,
-                meta_data=spot_result.image.meta_data
-            )
-            db_spot = DBSpot(
-                uuid_str=spot_result.uuid,
-                address=spot_result.address,
-                name=spot_result.name,
-                rating=spot_result.rating,
-                rating_n=spot_result.rating_n,
-                place_id=spot_result.place_id,
-                reference=spot_result.reference,
-                types=spot_result.types,
-                geometry=spot_result.geometry,
-                spot_image_id=db_picture.id
-            )
-            db_spot.spot_image = db_spot_img
-            db.add(db_spot)
-            db.commit()
+        err_msg = f"endpoint: /v1/spots/alternatives, error: {repr(e)}"
+        app_logger.error(err_msg)
 
-    except Exception as e:
+        err_info = ErrorInfo(
+            err_type=err_type,
+            err_msg=err_msg
+        )
+        return JSONResponse(
+            status_code=err_status_code,
+            content=jsonable_encoder(err_info)
+        )
 
-        err_msg = f"endpoint: /v1/mood, error: {repr(e)}"
+    # spots are json ready, serialized once
+    raw_resp = {"spots": res_spot_list}
+    resp = JSONResponse(
+        status_code=200,
+        content=raw_resp
+    )
+
+    app_logger.info(
+        "endpoint: /v1/spots/alternatives, info: done request for spot alternatives of picture %s, found: %d",
+        s3_pic_id,
+        len(res_spot_list)
+    )
+
+    return resp
+
+
+@router.post(":batchGet")
+async def batch_get_spots(
+        req_body: dict,
+        db: AsyncSession = Depends(db_main.get_async_db_session)
+):
+
+    """
+    batch_get_spots: get spots by ids in one query, ids not found are listed in missing_ids
+    curl -XPOST 'http://0.0.0.0:5000/v1/spots:batchGet' -H 'Content-Type: application/json' -d '{"ids": ["5d9b7970-5567-48fd-85f4-3a29080b2c38"]}'
+    """
+
+    app_logger.info("endpoint: /v1/spots:batchGet, info: get request for batch getting spots")
+
+    err_status_code = 500
+    err_type = "FailedToProcessRequest"
+    try:
+
+        # parse ids
+        try:
+            req_id_list = batch_utils.parse_batch_ids(req_body)
+        except ValueError as e:
+            err_status_code = 400
+            err_type = "InvalidRequest"
+            raise e
+
+        # get all from db at once
+        parsed_id_list = [parsed_id for _, parsed_id in req_id_list if parsed_id is not None]
+        db_spot_list = (await db.scalars(db_queries.spots_with_image_by_ids(parsed_id_list))).all()
+
+        found = {}
+        for db_spot in db_spot_list:
+
+            if (db_spot.name is None) or (len(db_spot.name) == 0):
+                continue
+
+            found[db_spot.id] = {
+                "spot_id":    str(db_spot.id),
+                "created_at": db_spot.created_at.isoformat() if db_spot.created_at is not None else None,
+                "address":    db_spot.address,
+                "name":       db_spot.name,
+                "rating":     db_spot.rating,
+                "rating_n":   db_spot.rating_n,
+                "place_id":   db_spot.place_id,
+                "reference":  db_spot.reference,
+                "types":      db_spot.types,
+                "geometry":   db_spot.geometry,
+                "image": {
+                    "id":  str(db_spot.spot_image.id),
+                    "url": db_spot.spot_image.thumbnail,
+                } if db_spot.spot_image is not None else None
+            }
+        found_list, missing_id_list = batch_utils.split_found(req_id_list, found)
+
+    except Exception as e:
+        err_msg = f"endpoint: /v1/spots:batchGet, error: {repr(e)}"
         app_logger.error(err_msg)
 
         err_info = ErrorInfo(
@@ -192,44 +748,152 @@ def get_spot_search_by_picture(
             content=jsonable_encoder(err_info)
         )
 
+    # items are json ready, serialized once
     raw_resp = {
-        "spot_id":    spot_result.uuid,
-        "created_at": spot_result.created_at,
-        "address":    spot_result.address,
-        "name":       spot_result.name,
-        "rating":     spot_result.rating,
-        "rating_n":   spot_result.rating_n,
-        "place_id":   spot_result.place_id,
-        "reference":  spot_result.reference,
-        "types":      spot_result.types,
-        "geometry":   spot_result.geometry,
-        "image": {
-            "id":  spot_result.image.uuid,
-            "url": spot_result.image.thumbnail
-        }
+        "spots":       found_list,
+        "missing_ids": missing_id_list
     }
     resp = JSONResponse(
         status_code=200,
-        content=jsonable_encoder(raw_resp)
+        content=raw_resp
     )
 
     app_logger.info(
-        "endpoint: /v1/spots/search, info: done request for searching spot with picture %s",
-        s3_pic_id
+        "endpoint: /v1/spots:batchGet, info: done request for batch getting spots, found: %d, missing: %d",
+        len(found_list),
+        len(missing_id_list)
     )
 
     return resp
 
 
+def _nearby_spot_resp(svr_nearby_spot) -> dict:
+
+    res_spot = {
+        "spot_id":    svr_nearby_spot.uuid,
+        "created_at": svr_nearby_spot.created_at,
+        "address":    svr_nearby_spot.address,
+        "name":       svr_nearby_spot.name,
+        "rating":     svr_nearby_spot.rating,
+        "rating_n":   svr_nearby_spot.rating_n,
+        "place_id":   svr_nearby_spot.place_id,
+        "reference":  svr_nearby_spot.reference,
+        "types":      svr_nearby_spot.types,
+        "geometry":   svr_nearby_spot.geometry,
+    }
+
+    return res_spot
+
+
+async def _find_known_nearby_spots(db: AsyncSession, svr_spot, radius: int) -> list[spot_models.Spot]:
+
+    """spots found earlier within radius of a spot, nearest first"""
+
+    location = (svr_spot.geometry or {}).get('location') or {}
+    if (location.get('lat') is None) or (location.get('lng') is None):
+        return []
+
+    known_rows = (await db.execute(
+        db_queries.known_spots_near(
+            lat=float(location['lat']),
+            lng=float(location['lng']),
+            radius=radius,
+            limit=_NEARBY_SPOT_N,
+            exclude_place_id=svr_spot.place_id
+        )
+    )).all()
+
+    known_spot_list = []
+    for known_row in known_rows:
+
+        known_spot = spot_models.Spot(
+            uuid_str=str(known_row.id),
+            address=known_row.address,
+            name=known_row.name,
+            rating=known_row.rating,
+            rating_n=known_row.rating_n,
+            place_id=known_row.place_id,
+            reference=svr_spot.place_id,
+            types=known_row.types,
+            geometry=known_row.geometry
+        )
+        known_spot_list.append(known_spot)
+
+    return known_spot_list
+
+
+async def _fetch_nearby_spots(svr_spot, radius: int) -> list[dict]:
+
+    """
+    search nearby spots with google map merged with known spots around, saved by place for later requests,
+    google is skipped when enough spots around are known
+    """
+
+    async with db_main.AsyncSessionLocal() as db:
+
+        known_spot_list = await _find_known_nearby_spots(db, svr_spot, radius)
+
+        # release db connection while waiting on upstream
+        await db.commit()
+
+        svr_nearby_spot_list = await spot_logics.search_nearby_spots_by_spot_async(
+            api_key=app_params['google_api_key'],
+            spot=svr_spot,
+            logger=app_logger,
+            radius=radius,
+            known_spots=known_spot_list,
+            min_known_n=_NEARBY_KNOWN_MIN,
+            speculation=app_params['nearby_speculation']
+        )
+        res_spot_list = jsonable_encoder([_nearby_spot_resp(s) for s in svr_nearby_spot_list[:_NEARBY_SPOT_N]])
+
+        if svr_spot.place_id is not None:
+            await db.execute(db_queries.upsert_nearby_spot_result(svr_spot.place_id, radius, res_spot_list))
+            await db.commit()
+
+    return res_spot_list
+
+
+async def _refresh_nearby_spots(svr_spot, radius: int):
+
+    # own budget, the request that found the result stale is not waiting on it
+    with deadline_utils.budget(_NEARBY_REFRESH_BUDGET):
+        try:
+            res_spot_list = await _nearby_flight.do(
+                (svr_spot.place_id, radius),
+                _fetch_nearby_spots,
+                svr_spot,
+                radius
+            )
+            app_logger.info("refreshed %d nearby spot(s) of place %s", len(res_spot_list), svr_spot.place_id)
+        except Exception as e:
+            app_logger.error("failed to refresh nearby spots of place %s: %s", svr_spot.place_id, repr(e))
+
+
+def _schedule_nearby_refresh(svr_spot, radius: int):
+
+    """refresh stale nearby spots once per place in this worker, outside of the request context"""
+
+    key = (svr_spot.place_id, radius)
+    if key in _nearby_refresh_tasks:
+        return
+
+    task = asyncio.create_task(_refresh_nearby_spots(svr_spot, radius), context=contextvars.Context())
+    _nearby_refresh_tasks[key] = task
+    task.add_done_callback(lambda _: _nearby_refresh_tasks.pop(key, None))
+
+
 @router.get("/{spot_id}/nearby")
-def get_near_spots_by_spot(
+async def get_near_spots_by_spot(
         spot_id: str,
-        db: Session = Depends(db_main.get_db_session)
+        db: AsyncSession = Depends(db_main.get_async_db_session)
 ):
 
     """
     get_near_spot_by_spot: search for near by spots by a given spot
     curl -XGET 'http://0.0.0.0:5000/v1/spots/5d9b7970-5567-48fd-85f4-3a29080b2c38/nearby'
+
+    nearby spots are saved by place and radius, stale ones are served while refreshed in background
     """
 
     app_logger.info(
@@ -247,41 +911,55 @@ def get_near_spots_by_spot(
             err_type = "InvalidRequest"
             raise Exception("failed to parse spot_id")
 
-        # get spot from db
-        db_spot = db.get(DBSpot, spot_id)
-        if (db_spot is None) or (len(db_spot.name) == 0):
-            err_status_code = 404
-            err_type = "InvalidRequest"
-            raise Exception(f"spot {spot_id} not found in database")
+        # served by this worker recently, no db lookup
+        spot_key = cache_utils.canonical_id(spot_id)
+        res_spot_list = _nearby_cache.get(spot_key) if spot_key is not None else None
+        res_source = "worker"
 
-        # TODO: resolve worker timeout
-        # nearby spot search
-        svr_spot = model_utils.db_spot_to_server_spot(db_spot)
-        svr_nearby_spot_list = spot_logics.search_nearby_spots_by_spot(
-            api_key=app_params['google_api_key'],
-            spot=svr_spot,
-            logger=app_logger
-        )
-        svr_nearby_spot_list = svr_nearby_spot_list[:10]
-        app_logger.info("found %d nearby spot(s) for spot %s", len(svr_nearby_spot_list), spot_id)
-
-        # prepare result
-        res_spot_list = []
-        for svr_nearby_spot in svr_nearby_spot_list:
-
-            res_spot = {
-                "spot_id":    svr_nearby_spot.uuid,
-                "created_at": svr_nearby_spot.created_at,
-                "address":    svr_nearby_spot.address,
-                "name":       svr_nearby_spot.name,
-                "rating":     svr_nearby_spot.rating,
-                "rating_n":   svr_nearby_spot.rating_n,
-                "place_id":   svr_nearby_spot.place_id,
-                "reference":  svr_nearby_spot.reference,
-                "types":      svr_nearby_spot.types,
-                "geometry":   svr_nearby_spot.geometry,
-            }
-            res_spot_list.append(res_spot)
+        if res_spot_list is None:
+
+            # get spot from db
+            db_spot = await db.scalar(db_queries.spot_with_image(spot_id))
+            if (db_spot is None) or (len(db_spot.name) == 0):
+                err_status_code = 404
+                err_type = "InvalidRequest"
+                raise Exception(f"spot {spot_id} not found in database")
+
+            svr_spot = model_utils.db_spot_to_server_spot(db_spot)
+            radius = spot_logics.NEARBY_RADIUS
+
+            # saved nearby spots of the place
+            if svr_spot.place_id is not None:
+
+                db_nearby = (await db.execute(db_queries.nearby_spot_result(svr_spot.place_id, radius))).first()
+                if db_nearby is not None:
+
+                    age = datetime.datetime.now(datetime.timezone.utc) - db_nearby.fetched_at
+                    if age < _NEARBY_MAX_AGE:
+                        res_spot_list = db_nearby.spots
+                        res_source = "db"
+                    if age >= _NEARBY_FRESH_AGE:
+                        _schedule_nearby_refresh(svr_spot, radius)
+
+            if res_spot_list is None:
+
+                # release db connection while waiting on upstream
+                await db.commit()
+
+                # TODO: resolve worker timeout
+                # nearby spot search, once for all concurrent requests of the place
+                res_spot_list = await _nearby_flight.do(
+                    (svr_spot.place_id or spot_key, radius),
+                    _fetch_nearby_spots,
+                    svr_spot,
+                    radius
+                )
+                res_source = "google"
+
+            if spot_key is not None:
+                _nearby_cache.set(spot_key, res_spot_list)
+
+        app_logger.info("found %d nearby spot(s) for spot %s from %s", len(res_spot_list), spot_id, res_source)
 
     except Exception as e:
 
@@ -297,10 +975,11 @@ def get_near_spots_by_spot(
             content=jsonable_encoder(err_info)
         )
 
+    # spots are json ready, serialized once
     raw_resp = {"spots": res_spot_list}
     resp = JSONResponse(
         status_code=200,
-        content=jsonable_encoder(raw_resp)
+        content=raw_resp
     )
     app_logger.info(
         "endpoint: /v1/spots/{spot_id}/nearby, info: done request for searching nearby spots for spot %s",
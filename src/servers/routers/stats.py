@@ -0,0 +1,62 @@
+import os
+import sys
+
+from fastapi import APIRouter
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from servers.dependencies import app_resources
+from servers.utils import job as job_utils
+from servers.utils import mood_pool as mood_pool_utils
+from servers.utils import mood_refresh as mood_refresh_utils
+from servers.utils import place_search as place_search_utils
+from servers.utils import progress as progress_utils
+from servers.logics import spot as spot_logics
+
+from utils import http as http_utils
+from utils import s3 as s3_utils
+from utils import cache as cache_utils
+from utils import shared_cache as shared_cache_utils
+
+from databases import database as db_main
+
+
+router = APIRouter(
+    prefix="/v1/stats"
+)
+
+
+@router.get("")
+@router.get("/")
+async def get_worker_stats():
+
+    """
+    get_worker_stats: get resource usage metrics of the worker serving this request
+    curl -XGET 'http://0.0.0.0:5000/v1/stats'
+    """
+
+    raw_resp = {
+        "pid":           os.getpid(),
+        "http_clients":  http_utils.get_client_stats(),
+        "s3_uploads":    s3_utils.get_upload_stats(),
+        "jobs":          job_utils.job_runner.stats(),
+        "mood_pool":     mood_pool_utils.mood_pool.stats(),
+        "mood_cache":    app_resources['cached_mood_messages'].stats(),
+        "mood_refresh":  mood_refresh_utils.mood_refresher.stats(),
+        "db_pools":      db_main.get_pool_stats(),
+        "caches":        cache_utils.get_cache_stats(),
+        "place_search":  place_search_utils.place_text_search.stats(),
+        "nearby":        spot_logics.nearby_speculation.stats(),
+        "lens_sources":  spot_logics.spot_source_matcher.stats(),
+        "spot_progress": progress_utils.spot_search_progress.stats(),
+        "shared_caches": shared_cache_utils.get_shared_cache_stats(),
+    }
+    resp = JSONResponse(
+        status_code=200,
+        content=jsonable_encoder(raw_resp)
+    )
+
+    return resp
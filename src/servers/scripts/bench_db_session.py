@@ -0,0 +1,177 @@
+"""
+Benchmark sync and async db session paths for odyssey
+"""
+
+import os
+import sys
+
+import argparse
+
+import logging
+import json
+
+import asyncio
+import time
+import statistics
+
+from concurrent.futures import ThreadPoolExecutor
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from init import params as params_init
+
+from databases import database as db_main
+from databases.models.mood import MoodMessage as DBMoodMessage
+
+
+def _parse_script_arguments() -> dict:
+
+    # parse args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=2000, help="number of requests per path")
+    parser.add_argument('-c', type=int, default=40, help="concurrent requests, anyio threadpool default is 40")
+    raw_args = parser.parse_args()
+
+    args = {
+        'n': raw_args.n,
+        'c': raw_args.c,
+    }
+
+    return args
+
+
+def _init_script_params() -> dict:
+
+    args = _parse_script_arguments()
+    envs = params_init.load_environment_variables()
+
+    # db
+    if envs['db_dsn'] is None:
+        raise Exception("Missing env DB_DSN")
+
+    params = {
+        'n': args['n'],
+        'c': args['c'],
+    }
+
+    return params
+
+
+def _init_logging() -> logging.Logger:
+
+    logging.basicConfig(encoding='utf-8', level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    return logger
+
+
+def _summary(path: str, elapsed: float, latency_list: list[float]) -> dict:
+
+    latency_list = sorted(latency_list)
+
+    return {
+        'path':           path,
+        'requests':       len(latency_list),
+        'elapsed_s':      round(elapsed, 3),
+        'throughput_rps': round(len(latency_list) / elapsed, 1),
+        'latency_p50_ms': round(statistics.median(latency_list) * 1000, 2),
+        'latency_p99_ms': round(latency_list[int(len(latency_list) * 0.99) - 1] * 1000, 2),
+    }
+
+
+def _bench_sync(mood_message_id: str, n: int, c: int) -> dict:
+
+    """one session per request on a bounded threadpool, like a sync fastapi route"""
+
+    def _request():
+
+        start = time.perf_counter()
+
+        db = db_main.SessionLocal()
+        try:
+            db.get(DBMoodMessage, mood_message_id)
+        finally:
+            db.close()
+
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=c) as executor:
+        latency_list = list(executor.map(lambda _: _request(), range(n)))
+
+    return _summary('sync', time.perf_counter() - start, latency_list)
+
+
+async def _bench_async(mood_message_id: str, n: int, c: int) -> dict:
+
+    """one async session per request on the event loop, like an async fastapi route"""
+
+    semaphore = asyncio.Semaphore(c)
+
+    async def _request():
+
+        async with semaphore:
+
+            start = time.perf_counter()
+
+            async with db_main.AsyncSessionLocal() as db:
+                await db.get(DBMoodMessage, mood_message_id)
+
+            return time.perf_counter() - start
+
+    # warm up pool on this event loop
+    await asyncio.gather(*[_request() for _ in range(c)])
+
+    start = time.perf_counter()
+    latency_list = await asyncio.gather(*[_request() for _ in range(n)])
+    elapsed = time.perf_counter() - start
+
+    await db_main.async_engine.dispose()
+
+    return _summary('async', elapsed, latency_list)
+
+
+if __name__ == '__main__':
+
+    # init
+    script_logger = _init_logging()
+    script_params = _init_script_params()
+
+    script_logger.info(
+        json.dumps(
+            script_params,
+            indent=4,
+        )
+    )
+
+    # seed a mood message to look up
+    script_db = db_main.SessionLocal()
+    bench_mood_msg = DBMoodMessage(content="benchmark mood message", model="benchmark")
+    script_db.add(bench_mood_msg)
+    script_db.commit()
+    bench_mood_msg_id = str(bench_mood_msg.id)
+
+    try:
+
+        # warm up both pools, then measure
+        _bench_sync(bench_mood_msg_id, n=script_params['c'], c=script_params['c'])
+        sync_result = _bench_sync(bench_mood_msg_id, n=script_params['n'], c=script_params['c'])
+
+        async_result = asyncio.run(
+            _bench_async(bench_mood_msg_id, n=script_params['n'], c=script_params['c'])
+        )
+
+        script_logger.info(
+            json.dumps(
+                [sync_result, async_result],
+                indent=4,
+            )
+        )
+
+    finally:
+
+        # clean up seeded mood message
+        script_db.delete(bench_mood_msg)
+        script_db.commit()
+        script_db.close()
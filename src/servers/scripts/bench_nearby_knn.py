@@ -0,0 +1,238 @@
+"""
+Benchmark nearest known spots lookup of odyssey at scale
+
+seeds spots clustered around random cities into the db in DB_DSN with migrations applied,
+then times the nearby lookup of routers/spot.py from random seeded spots, e.g.
+python src/servers/scripts/bench_nearby_knn.py -n 1000000 -q 500
+"""
+
+import os
+import sys
+
+import argparse
+
+import logging
+import json
+
+import statistics
+import time
+
+from sqlalchemy import select, text
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from init import params as params_init
+
+from databases import database as db_main
+from databases import queries as db_queries
+
+
+_SEED_TAG = 'nearby-bench'
+
+# spots scattered within about 25 km of city centers, so a 5 km radius holds a few dozen
+_SEED_SQL = """
+WITH centers AS (
+    SELECT c, -50 + random() * 110 AS lat, -180 + random() * 360 AS lng
+    FROM generate_series(0, :cluster_n - 1) c
+)
+INSERT INTO "spots" (id, name, address, place_id, geometry)
+    SELECT
+        gen_random_uuid(), :tag, :tag, :tag || '-' || i,
+        jsonb_build_object(
+            'location',
+            jsonb_build_object('lat', centers.lat + (random() - 0.5) * 0.5, 'lng', centers.lng + (random() - 0.5) * 0.5)
+        )
+    FROM generate_series(1, :n) i
+    JOIN centers ON centers.c = i % :cluster_n
+"""
+
+_CLEAN_SQL = """
+DELETE FROM "spots" WHERE name = :tag
+"""
+
+
+def _parse_script_arguments() -> dict:
+
+    # parse args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=1000000, help="number of spots to seed")
+    parser.add_argument('-q', type=int, default=500, help="number of lookups")
+    parser.add_argument('-k', type=int, default=10, help="nearest spots per lookup")
+    parser.add_argument('--radius', type=int, default=5000, help="lookup radius in meters")
+    parser.add_argument('--clusters', type=int, default=1000, help="number of cities spots are seeded around")
+    parser.add_argument('--keep', action='store_true', help="keep seeded spots")
+    raw_args = parser.parse_args()
+
+    args = {
+        'n':        raw_args.n,
+        'q':        raw_args.q,
+        'k':        raw_args.k,
+        'radius':   raw_args.radius,
+        'clusters': raw_args.clusters,
+        'keep':     raw_args.keep,
+    }
+
+    return args
+
+
+def _init_script_params() -> dict:
+
+    args = _parse_script_arguments()
+    envs = params_init.load_environment_variables()
+
+    # db
+    if envs['db_dsn'] is None:
+        raise Exception("Missing env DB_DSN")
+
+    params = {
+        'n':        args['n'],
+        'q':        args['q'],
+        'k':        args['k'],
+        'radius':   args['radius'],
+        'clusters': args['clusters'],
+        'keep':     args['keep'],
+    }
+
+    return params
+
+
+def _init_logging() -> logging.Logger:
+
+    logging.basicConfig(encoding='utf-8', level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    return logger
+
+
+def _check_schema():
+
+    with db_main.engine.connect() as conn:
+        location_index = conn.execute(
+            text("SELECT 1 FROM pg_indexes WHERE tablename = 'spots' AND indexname = 'spots_location_idx'")
+        ).first()
+
+    if location_index is None:
+        raise Exception("spots has no location index, apply migrations with src/servers/scripts/migrate_db.py")
+
+
+def _seed(n: int, cluster_n: int) -> float:
+
+    start = time.perf_counter()
+    with db_main.engine.begin() as conn:
+        conn.execute(text(_SEED_SQL), {'tag': _SEED_TAG, 'n': n, 'cluster_n': cluster_n})
+        conn.execute(text('ANALYZE "spots"'))
+
+    return time.perf_counter() - start
+
+
+def _sample_origins(q: int) -> list[tuple[float, float]]:
+
+    with db_main.engine.connect() as conn:
+        rows = conn.execute(
+            select(
+                db_queries.SPOT_LAT.label('lat'),
+                db_queries.SPOT_LNG.label('lng')
+            ).select_from(
+                text('"spots" TABLESAMPLE SYSTEM (1)')
+            ).filter(
+                text('name = :tag')
+            ).limit(q),
+            {'tag': _SEED_TAG}
+        ).all()
+
+    return [(row.lat, row.lng) for row in rows]
+
+
+def _explain(lat: float, lng: float, radius: int, k: int) -> dict:
+
+    stmt = db_queries.known_spots_near(lat, lng, radius, k)
+    compiled = stmt.compile(dialect=db_main.engine.dialect)
+
+    with db_main.engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, FORMAT JSON) {compiled.string}", compiled.params).scalar()
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    index_names = set()
+    pending_plans = [plan[0]['Plan']]
+    while len(pending_plans) > 0:
+        sub_plan = pending_plans.pop()
+        if 'Index Name' in sub_plan:
+            index_names.add(sub_plan['Index Name'])
+        pending_plans += sub_plan.get('Plans', [])
+
+    return {
+        'indexes':      sorted(index_names),
+        'execution_ms': plan[0]['Execution Time'],
+    }
+
+
+def _bench(origins: list[tuple[float, float]], radius: int, k: int) -> dict:
+
+    latency_list, found_list = [], []
+    with db_main.engine.connect() as conn:
+
+        for lat, lng in origins:
+
+            start = time.perf_counter()
+            rows = conn.execute(db_queries.known_spots_near(lat, lng, radius, k)).all()
+            latency_list.append(time.perf_counter() - start)
+            found_list.append(len(rows))
+
+    latency_list = sorted(latency_list)
+
+    return {
+        'lookups':        len(latency_list),
+        'avg_found':      round(statistics.mean(found_list), 1),
+        'full_k_rate':    round(sum(1 for found in found_list if found >= k) / len(found_list), 3),
+        'latency_p50_ms': round(statistics.median(latency_list) * 1000, 2),
+        'latency_p99_ms': round(latency_list[int(len(latency_list) * 0.99) - 1] * 1000, 2),
+    }
+
+
+if __name__ == '__main__':
+
+    # init
+    script_logger = _init_logging()
+    script_params = _init_script_params()
+
+    script_logger.info(
+        json.dumps(
+            script_params,
+            indent=4,
+        )
+    )
+
+    _check_schema()
+
+    script_logger.info("seeding %d spots around %d cities", script_params['n'], script_params['clusters'])
+    seed_s = _seed(script_params['n'], script_params['clusters'])
+
+    try:
+
+        origins = _sample_origins(script_params['q'])
+        if len(origins) == 0:
+            raise Exception("no seeded spots sampled, seed more spots")
+
+        # warm up cache and connection, then measure
+        _bench(origins[:10], script_params['radius'], script_params['k'])
+        result = _bench(origins, script_params['radius'], script_params['k'])
+
+        result['seeded_spots'] = script_params['n']
+        result['seed_s'] = round(seed_s, 1)
+        result['plan'] = _explain(*origins[0], script_params['radius'], script_params['k'])
+
+        script_logger.info(
+            json.dumps(
+                result,
+                indent=4,
+            )
+        )
+
+    finally:
+
+        if not script_params['keep']:
+            with db_main.engine.begin() as conn:
+                conn.execute(text(_CLEAN_SQL), {'tag': _SEED_TAG})
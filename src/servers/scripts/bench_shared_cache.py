@@ -0,0 +1,241 @@
+"""
+Benchmark the sqlite cache shared by odyssey workers
+
+measures serialization cost of lens sized payloads, get and put latency in one worker,
+get throughput of several worker processes reading the same file and size bounded eviction, e.g.
+python src/servers/scripts/bench_shared_cache.py -n 2000 -p 4
+"""
+
+import os
+import sys
+
+import argparse
+
+import logging
+import json
+
+import pickle
+import statistics
+import tempfile
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from utils import shared_cache as shared_cache_utils
+
+
+def _parse_script_arguments() -> dict:
+
+    # parse args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=2000, help="number of entries")
+    parser.add_argument('-m', type=int, default=60, help="visual matches per lens payload")
+    parser.add_argument('-p', type=int, default=4, help="number of reading processes, like gunicorn workers")
+    parser.add_argument('--max-mb', type=int, default=2, help="size bound of the cache file")
+    raw_args = parser.parse_args()
+
+    args = {
+        'n':      raw_args.n,
+        'm':      raw_args.m,
+        'p':      raw_args.p,
+        'max_mb': raw_args.max_mb,
+    }
+
+    return args
+
+
+def _init_script_params() -> dict:
+
+    args = _parse_script_arguments()
+
+    params = {
+        'n':      args['n'],
+        'm':      args['m'],
+        'p':      args['p'],
+        'max_mb': args['max_mb'],
+        'path':   os.path.join(tempfile.mkdtemp(), "bench_shared_cache.db"),
+    }
+
+    return params
+
+
+def _init_logging() -> logging.Logger:
+
+    logging.basicConfig(encoding='utf-8', level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    return logger
+
+
+def _lens_payload(i: int, m: int) -> list[dict]:
+
+    """visual matches shaped like a serpapi google lens response"""
+
+    return [
+        {
+            'position':  pos,
+            'title':     f"Spot {i} seen from viewpoint {pos} - Tripadvisor",
+            'link':      f"https://www.tripadvisor.com/Attraction_Review-g{i}-d{pos}-Reviews.html",
+            'source':    "Tripadvisor",
+            'source_icon': f"https://encrypted-tbn{pos % 4}.gstatic.com/favicon-tbn?q=tbn:{i}{pos}",
+            'thumbnail': f"https://encrypted-tbn{pos % 4}.gstatic.com/images?q=tbn:ANd9Gc{i:08d}{pos:04d}",
+        }
+        for pos in range(1, m + 1)
+    ]
+
+
+def _latency_summary(name: str, latency_list: list[float]) -> dict:
+
+    latency_list = sorted(latency_list)
+
+    return {
+        'op':             name,
+        'ops':            len(latency_list),
+        'latency_p50_ms': round(statistics.median(latency_list) * 1000, 3),
+        'latency_p99_ms': round(latency_list[int(len(latency_list) * 0.99) - 1] * 1000, 3),
+    }
+
+
+def _bench_serialization(payload: list[dict], n: int) -> list[dict]:
+
+    codecs = [
+        ('json',      lambda v: json.dumps(v).encode('utf-8'), lambda b: json.loads(b)),
+        ('json_zlib', shared_cache_utils.encode,                shared_cache_utils.decode),
+        ('pickle',    pickle.dumps,                             pickle.loads),
+    ]
+
+    results = []
+    for name, _encode, _decode in codecs:
+
+        start = time.perf_counter()
+        for _ in range(n):
+            blob = _encode(payload)
+        encode_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(n):
+            _decode(blob)
+        decode_s = time.perf_counter() - start
+
+        results.append({
+            'codec':         name,
+            'bytes':         len(blob),
+            'encode_avg_ms': round(encode_s * 1000 / n, 3),
+            'decode_avg_ms': round(decode_s * 1000 / n, 3),
+        })
+
+    return results
+
+
+def _bench_put_get(n: int, m: int) -> list[dict]:
+
+    put_list, get_list = [], []
+    for i in range(n):
+
+        payload = _lens_payload(i, m)
+
+        start = time.perf_counter()
+        shared_cache_utils.put('glen', {'url': f"bench-{i}"}, payload)
+        put_list.append(time.perf_counter() - start)
+
+    for i in range(n):
+
+        start = time.perf_counter()
+        shared_cache_utils.get('glen', {'url': f"bench-{i}"})
+        get_list.append(time.perf_counter() - start)
+
+    return [_latency_summary('put', put_list), _latency_summary('get', get_list)]
+
+
+def _read_worker(path: str, max_mb: int, n: int) -> tuple[int, int, float]:
+
+    """one reading process, like a gunicorn worker opening the file after fork"""
+
+    shared_cache_utils.configure(path=path, max_mb=max_mb)
+
+    hit_n = 0
+    start = time.perf_counter()
+    for i in range(n):
+        if shared_cache_utils.get('glen', {'url': f"bench-{i}"}) is not None:
+            hit_n += 1
+
+    return hit_n, n, time.perf_counter() - start
+
+
+def _bench_processes(path: str, max_mb: int, n: int, p: int) -> dict:
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=p) as executor:
+        worker_results = list(executor.map(_read_worker, [path] * p, [max_mb] * p, [n] * p))
+    elapsed = time.perf_counter() - start
+
+    hit_n = sum(result[0] for result in worker_results)
+    get_n = sum(result[1] for result in worker_results)
+
+    return {
+        'processes':      p,
+        'gets':           get_n,
+        'hit_rate':       round(hit_n / get_n, 3),
+        'elapsed_s':      round(elapsed, 3),
+        'throughput_ops': round(get_n / elapsed, 1),
+    }
+
+
+def _bench_eviction(path: str, n: int, m: int) -> dict:
+
+    """write past the size bound, entries expiring first are trimmed"""
+
+    for i in range(n, n * 3):
+        shared_cache_utils.put('glen', {'url': f"bench-{i}"}, _lens_payload(i, m))
+
+    stored_bytes = shared_cache_utils._get_conn().execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+    stored_n = shared_cache_utils._get_conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    return {
+        'written':      n * 2,
+        'stored':       stored_n,
+        'stored_bytes': stored_bytes,
+        'file_bytes':   os.path.getsize(path),
+    }
+
+
+if __name__ == '__main__':
+
+    # init
+    script_logger = _init_logging()
+    script_params = _init_script_params()
+
+    script_logger.info(
+        json.dumps(
+            script_params,
+            indent=4,
+        )
+    )
+
+    shared_cache_utils.configure(path=script_params['path'], max_mb=script_params['max_mb'])
+
+    serialization_results = _bench_serialization(_lens_payload(0, script_params['m']), n=200)
+    put_get_results = _bench_put_get(n=script_params['n'], m=script_params['m'])
+    process_result = _bench_processes(
+        script_params['path'],
+        max_mb=script_params['max_mb'],
+        n=script_params['n'],
+        p=script_params['p']
+    )
+    eviction_result = _bench_eviction(script_params['path'], n=script_params['n'], m=script_params['m'])
+
+    script_logger.info(
+        json.dumps(
+            {
+                'serialization': serialization_results,
+                'single_worker': put_get_results,
+                'multi_worker':  process_result,
+                'eviction':      eviction_result,
+                'stats':         shared_cache_utils.get_shared_cache_stats(),
+            },
+            indent=4,
+        )
+    )
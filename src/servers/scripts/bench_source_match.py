@@ -0,0 +1,203 @@
+"""
+Benchmark the lens match site filter of odyssey
+
+times the compiled source matcher of logics/spot.py against the substring whitelist loop it replaced
+over lens visual matches recorded in lens_searches, or in a json file of visual match lists,
+--extra-sites lists more sites to see how both scale, e.g.
+python src/servers/scripts/bench_source_match.py --limit 2000 -r 5 --extra-sites 200
+python src/servers/scripts/bench_source_match.py --file lens_payloads.json
+"""
+
+import os
+import sys
+
+import argparse
+
+import logging
+import json
+
+import functools
+import time
+
+from sqlalchemy import select, desc
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from init import params as params_init
+
+from utils import json as js_utils
+from utils import source_match as source_match_utils
+
+from servers.logics import spot as spot_logics
+
+from databases import database as db_main
+from databases.models.spot import LensSearch as DBLensSearch
+
+
+def _parse_script_arguments() -> dict:
+
+    # parse args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--limit', type=int, default=1000, help="number of latest lens searches to load")
+    parser.add_argument('--file', type=str, default=None, help="json file of visual match lists, instead of db")
+    parser.add_argument('-r', type=int, default=5, help="rounds over all payloads")
+    parser.add_argument('--extra-sites', type=int, default=0, help="unmatched sites added to the allow list, to see scaling")
+    raw_args = parser.parse_args()
+
+    args = {
+        'limit':       raw_args.limit,
+        'file':        raw_args.file,
+        'r':           raw_args.r,
+        'extra_sites': raw_args.extra_sites,
+    }
+
+    return args
+
+
+def _init_script_params() -> dict:
+
+    args = _parse_script_arguments()
+    envs = params_init.load_environment_variables()
+
+    # db
+    if envs['db_dsn'] is None:
+        raise Exception("Missing env DB_DSN")
+
+    params = {
+        'limit':              args['limit'],
+        'file':               args['file'],
+        'r':                  args['r'],
+        'extra_sites':        args['extra_sites'],
+        'spot_source_config': envs['spot_source_config'],
+    }
+
+    return params
+
+
+def _init_logging() -> logging.Logger:
+
+    logging.basicConfig(encoding='utf-8', level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    return logger
+
+
+def _load_payloads(limit: int, file_path: str) -> list[list[dict]]:
+
+    if file_path is not None:
+        with open(file_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    lens_query = select(
+        DBLensSearch.raw_matches
+    ).order_by(
+        desc(DBLensSearch.fetched_at)
+    ).limit(limit)
+
+    with db_main.SessionLocal() as db:
+        return [js_utils.loads_compressed(raw_matches) for raw_matches in db.scalars(lens_query)]
+
+
+def _substring_verdicts(allow_list: list[str], payload: list[dict]) -> list[str]:
+
+    """filter before the compiled matcher: every allowed site tested as a substring of the source"""
+
+    verdict_list = []
+    for v_match in payload:
+
+        verdict = source_match_utils.MATCH_UNKNOWN
+        for v_src in allow_list:
+            if v_src in v_match['source'].lower():
+                verdict = source_match_utils.MATCH_ALLOW
+                break
+        verdict_list.append(verdict)
+
+    return verdict_list
+
+
+def _compiled_verdicts(matcher: source_match_utils.SourceMatcher, payload: list[dict]) -> list[str]:
+    return [matcher.match(v_match.get('source'), v_match.get('link'))[0] for v_match in payload]
+
+
+def _bench(name: str, _verdicts, payloads: list[list[dict]], r: int) -> tuple[dict, list[str]]:
+
+    start = time.perf_counter()
+    for _ in range(r):
+        verdict_list = [verdict for payload in payloads for verdict in _verdicts(payload)]
+    elapsed = time.perf_counter() - start
+
+    match_n = len(verdict_list) * r
+
+    return {
+        'filter':       name,
+        'matches':      match_n,
+        'kept':         sum(1 for verdict in verdict_list if verdict == source_match_utils.MATCH_ALLOW),
+        'denied':       sum(1 for verdict in verdict_list if verdict == source_match_utils.MATCH_DENY),
+        'per_match_us': round(elapsed * 1e6 / match_n, 3) if match_n > 0 else None,
+    }, verdict_list
+
+
+if __name__ == '__main__':
+
+    # init
+    script_logger = _init_logging()
+    script_params = _init_script_params()
+
+    script_logger.info(
+        json.dumps(
+            script_params,
+            indent=4,
+        )
+    )
+
+    # sites of the config in SPOT_SOURCE_CONFIG, else the defaults
+    spot_logics.spot_source_matcher.configure(path=script_params['spot_source_config'])
+    entries = spot_logics.spot_source_matcher.get().entries
+
+    allow_dict = {site: weight for site, weight in entries.items() if weight is not None}
+    allow_dict.update({f"bench-site-{i}": 0.5 for i in range(script_params['extra_sites'])})
+    deny_list = [site for site, weight in entries.items() if weight is None]
+
+    matcher = source_match_utils.SourceMatcher(allow_dict, deny_list)
+
+    payloads = _load_payloads(script_params['limit'], script_params['file'])
+    if len(payloads) == 0:
+        raise Exception("no lens payloads recorded, search some pictures first or pass --file")
+
+    substring_result, substring_verdict_list = _bench(
+        'substring',
+        functools.partial(_substring_verdicts, list(allow_dict)),
+        payloads,
+        script_params['r']
+    )
+    compiled_result, compiled_verdict_list = _bench(
+        'compiled',
+        functools.partial(_compiled_verdicts, matcher),
+        payloads,
+        script_params['r']
+    )
+
+    # matches the two filters disagree on, e.g. denied sites or sites only named in the link
+    diff_counter = {}
+    for v_match, old_verdict, new_verdict in zip(
+            [v_match for payload in payloads for v_match in payload],
+            substring_verdict_list,
+            compiled_verdict_list
+    ):
+        if old_verdict != new_verdict:
+            key = f"{v_match.get('source')}: {old_verdict} -> {new_verdict}"
+            diff_counter[key] = diff_counter.get(key, 0) + 1
+
+    script_logger.info(
+        json.dumps(
+            {
+                'payloads': len(payloads),
+                'sites':    len(entries) + script_params['extra_sites'],
+                'results':  [substring_result, compiled_result],
+                'speedup':  round(substring_result['per_match_us'] / compiled_result['per_match_us'], 2),
+                'diffs':    sorted(diff_counter.items(), key=lambda item: item[1], reverse=True)[:20],
+            },
+            indent=4,
+        )
+    )
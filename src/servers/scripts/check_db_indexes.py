@@ -0,0 +1,254 @@
+"""
+Check every hot db lookup of odyssey is planned with an index scan
+
+run against a local postgres with the schema and migrations applied, e.g.
+python src/servers/scripts/check_db_indexes.py --seed 20000
+seq scans are disabled for the check, so a seq scan in a plan means no usable index exists
+"""
+
+import os
+import sys
+
+import argparse
+
+import logging
+import json
+
+import datetime
+import uuid
+
+from sqlalchemy import text, select, func, or_, and_
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from init import params as params_init
+
+from databases import database as db_main
+from databases import queries as db_queries
+from databases.models.job import Job as DBJob
+from databases.models.picture import Picture as DBPicture
+
+
+_SEED_TAG = 'index-check'
+
+_SEED_SQL = """
+INSERT INTO "mood_messages" (id, content, model, cached)
+    SELECT gen_random_uuid(), 'index check mood message ' || i, :tag, i % 10 = 0
+    FROM generate_series(1, :n) i;
+INSERT INTO "mood_pictures" (id, url, size, model, mood_message_id)
+    SELECT gen_random_uuid(), 'https://example.com/' || id, '512x512', :tag, id
+    FROM "mood_messages" WHERE model = :tag;
+INSERT INTO "pictures" (id, filename, size, url, reference_type, reference_id, found_spot)
+    SELECT gen_random_uuid(), :tag, size, url, 'mood_pic', id, CASE WHEN random() < 0.5 THEN NULL ELSE true END
+    FROM "mood_pictures" WHERE model = :tag;
+INSERT INTO "spot_images" (id, thumbnail, title, reference_id)
+    SELECT gen_random_uuid(), 'https://example.com/thumbnail', :tag, id
+    FROM "pictures" WHERE filename = :tag;
+INSERT INTO "spots" (id, name, spot_image_id)
+    SELECT gen_random_uuid(), :tag, id
+    FROM "spot_images" WHERE title = :tag;
+INSERT INTO "jobs" (id, type, status, params)
+    SELECT gen_random_uuid(), :tag, CASE WHEN i % 20 = 0 THEN 'pending' ELSE 'succeeded' END, '{}'
+    FROM generate_series(1, :n) i
+"""
+
+_CLEAN_SQL = """
+DELETE FROM "spots" WHERE name = :tag;
+DELETE FROM "spot_images" WHERE title = :tag;
+DELETE FROM "pictures" WHERE filename = :tag;
+DELETE FROM "mood_pictures" WHERE model = :tag;
+DELETE FROM "mood_messages" WHERE model = :tag;
+DELETE FROM "jobs" WHERE type = :tag
+"""
+
+_CHECKED_TABLES = ('jobs', 'mood_messages', 'mood_pictures', 'pictures', 'spot_images', 'spots')
+
+
+def _parse_script_arguments() -> dict:
+
+    # parse args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, default=0, help="number of mood messages to seed with related rows")
+    parser.add_argument('--keep', action='store_true', help="keep seeded rows")
+    raw_args = parser.parse_args()
+
+    args = {
+        'seed': raw_args.seed,
+        'keep': raw_args.keep,
+    }
+
+    return args
+
+
+def _init_script_params() -> dict:
+
+    args = _parse_script_arguments()
+    envs = params_init.load_environment_variables()
+
+    # db
+    if envs['db_dsn'] is None:
+        raise Exception("Missing env DB_DSN")
+
+    params = {
+        'seed': args['seed'],
+        'keep': args['keep'],
+    }
+
+    return params
+
+
+def _init_logging() -> logging.Logger:
+
+    logging.basicConfig(encoding='utf-8', level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    return logger
+
+
+def _run_sql(sql: str, seed_n: int):
+
+    with db_main.engine.begin() as conn:
+        for stmt in sql.split(';'):
+            conn.execute(text(stmt), {'tag': _SEED_TAG, 'n': seed_n})
+        for table in _CHECKED_TABLES:
+            conn.execute(text(f'ANALYZE "{table}"'))
+
+
+def _sample_ids() -> tuple[str, str]:
+
+    """a seeded mood message and picture to look up, random ids without seed"""
+
+    with db_main.engine.connect() as conn:
+        row = conn.execute(
+            text(
+                'SELECT m.id, p.id FROM "mood_messages" m '
+                'JOIN "mood_pictures" mp ON mp.mood_message_id = m.id '
+                'JOIN "pictures" p ON p.reference_id = mp.id LIMIT 1'
+            )
+        ).first()
+
+    if row is None:
+        return str(uuid.uuid4()), str(uuid.uuid4())
+
+    return str(row[0]), str(row[1])
+
+
+def _hot_queries(mood_message_id: str, picture_id: str) -> dict:
+
+    """the lookups of routers, workers and scripts"""
+
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=10)
+
+    return {
+        'unused saved mood picture (routers/mood.py)': db_queries.unused_saved_mood_picture(
+            mood_message_id,
+            [str(uuid.uuid4())]
+        ),
+        'unused recent mood picture (routers/mood.py)': db_queries.unused_recent_mood_picture(
+            mood_message_id,
+            [str(uuid.uuid4())],
+            datetime.timedelta(minutes=10)
+        ),
+        'saved picture (routers/picture.py)': db_queries.saved_picture_by_reference(picture_id),
+        'cached spot (routers/spot.py)': db_queries.cached_spot_by_picture(picture_id),
+        'known nearby spots (routers/spot.py)': db_queries.known_spots_near(25.0339, 121.5645, 5000, 10),
+        'cached mood messages (utils/init.py)': db_queries.cached_mood_messages(),
+        'cached mood message refresh (utils/mood_refresh.py)': db_queries.cached_mood_messages_after(
+            (since, mood_message_id),
+            1000
+        ),
+        'pictures to search spots (scripts/cache_spot.py)': select(DBPicture).filter(
+            DBPicture.found_spot == None
+        ).order_by(
+            DBPicture.created_at
+        ),
+        'claimable jobs (utils/job.py)': select(DBJob.id).where(
+            or_(
+                DBJob.status == 'pending',
+                and_(DBJob.status == 'running', DBJob.updated_at < func.now())
+            )
+        ).order_by(
+            DBJob.created_at
+        ).limit(4).with_for_update(skip_locked=True),
+    }
+
+
+def _plan_scans(plan: dict) -> list[dict]:
+
+    scans = []
+    if ('Relation Name' in plan) or ('Index Name' in plan):
+        scans.append({
+            'node':  plan['Node Type'],
+            'table': plan.get('Relation Name'),
+            'index': plan.get('Index Name'),
+        })
+
+    for sub_plan in plan.get('Plans', []):
+        scans += _plan_scans(sub_plan)
+
+    return scans
+
+
+def _check_query(stmt) -> dict:
+
+    compiled = stmt.compile(dialect=db_main.engine.dialect, compile_kwargs={'render_postcompile': True})
+    compiled_params = {
+        key: str(value) if isinstance(value, uuid.UUID) else value
+        for key, value in compiled.params.items()
+    }
+
+    with db_main.engine.begin() as conn:
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", compiled_params).scalar()
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    scans = _plan_scans(plan[0]['Plan'])
+    seq_scans = [scan['table'] for scan in scans if (scan['node'] == 'Seq Scan') and (scan['table'] in _CHECKED_TABLES)]
+
+    return {
+        'passed':    len(seq_scans) == 0,
+        'seq_scans': seq_scans,
+        'indexes':   sorted(set(scan['index'] for scan in scans if scan['index'] is not None)),
+    }
+
+
+if __name__ == '__main__':
+
+    # init
+    script_logger = _init_logging()
+    script_params = _init_script_params()
+
+    script_logger.info(
+        json.dumps(
+            script_params,
+            indent=4,
+        )
+    )
+
+    if script_params['seed'] > 0:
+        script_logger.info("seeding %d mood messages with related rows", script_params['seed'])
+        _run_sql(_SEED_SQL, script_params['seed'])
+
+    try:
+
+        mood_message_id, picture_id = _sample_ids()
+
+        results = {}
+        for query_name, stmt in _hot_queries(mood_message_id, picture_id).items():
+            results[query_name] = _check_query(stmt)
+            script_logger.info("%s: %s", query_name, json.dumps(results[query_name]))
+
+    finally:
+
+        if (script_params['seed'] > 0) and (not script_params['keep']):
+            _run_sql(_CLEAN_SQL, script_params['seed'])
+
+    failed_list = [query_name for query_name, result in results.items() if not result['passed']]
+    script_logger.info("passed: %d, failed: %d", len(results) - len(failed_list), len(failed_list))
+
+    if len(failed_list) > 0:
+        script_logger.error("queries without index: %s", json.dumps(failed_list, indent=4))
+        sys.exit(1)
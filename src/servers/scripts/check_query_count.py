@@ -0,0 +1,190 @@
+"""
+Check the number of db statements each cached read of odyssey issues
+
+runs the app in process against the db in DB_DSN with all server envs set, e.g.
+python src/servers/scripts/check_query_count.py
+a request issuing more statements than expected, e.g. by a lazy load, fails the check
+"""
+
+import os
+import sys
+
+import argparse
+
+import logging
+import json
+
+import asyncio
+
+import httpx
+
+from sqlalchemy import event
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from init import params as params_init
+
+from databases import database as db_main
+from databases.models.mood import MoodMessage as DBMoodMessage
+from databases.models.mood import MoodPicture as DBMoodPicture
+from databases.models.picture import Picture as DBPicture
+from databases.models.spot import SpotImage as DBSpotImage
+from databases.models.spot import Spot as DBSpot
+
+
+_SEED_TAG = 'query-count'
+
+
+def _parse_script_arguments() -> dict:
+
+    # parse args
+    parser = argparse.ArgumentParser()
+    raw_args = parser.parse_args()
+
+    args = {}
+
+    return args
+
+
+def _init_script_params() -> dict:
+
+    args = _parse_script_arguments()
+    envs = params_init.load_environment_variables()
+
+    # app
+    if envs['app_auth_token'] is None:
+        raise Exception("Missing env APP_AUTH_TOKEN")
+
+    # db
+    if envs['db_dsn'] is None:
+        raise Exception("Missing env DB_DSN")
+
+    params = {
+        'app_auth_token': envs['app_auth_token'],
+    }
+
+    return params
+
+
+def _init_logging() -> logging.Logger:
+
+    logging.basicConfig(encoding='utf-8', level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    return logger
+
+
+def _seed(db) -> list:
+
+    """one cached mood message with a saved picture and a found spot"""
+
+    db_mood_msg = DBMoodMessage(content="query count mood message", model=_SEED_TAG, cached=True)
+    db_mood_pic = DBMoodPicture(url="https://example.com/mood", size="512x512", model=_SEED_TAG)
+    db_picture  = DBPicture(filename=_SEED_TAG, size="512x512", url="https://example.com/picture", found_spot=True)
+    db_spot_img = DBSpotImage(thumbnail="https://example.com/thumbnail", title=_SEED_TAG)
+    db_spot     = DBSpot(name=_SEED_TAG, address=_SEED_TAG)
+
+    db_mood_pic.mood_message_id = db_mood_msg.id
+    db_picture.reference_type   = 'mood_pic'
+    db_picture.reference_id     = db_mood_pic.id
+    db_spot_img.reference_id    = db_picture.id
+    db_spot.spot_image          = db_spot_img
+
+    seeded = [db_mood_msg, db_mood_pic, db_picture, db_spot_img, db_spot]
+    for db_row in seeded:
+        db.add(db_row)
+        db.flush()
+    db.commit()
+
+    return seeded
+
+
+def _cases(seeded: list) -> list[tuple]:
+
+    """(method, path, request body, expected statement count)"""
+
+    db_mood_msg, _, db_picture, _, _ = seeded
+
+    return [
+        ('GET',  f"/v1/mood/{db_mood_msg.id}", None, 1),
+        ('POST', f"/v1/mood/{db_mood_msg.id}/picture", {"used_mood_pic_ids": []}, 2),
+        ('POST', "/v1/mood/generate", {"from_cache": "true"}, 0),
+        ('GET',  f"/v1/pictures/{db_picture.id}", None, 1),
+        ('GET',  f"/v1/spots/search?s3_pic_id={db_picture.id}", None, 2),
+        ('GET',  f"/v1/spots/alternatives?s3_pic_id={db_picture.id}", None, 1),
+    ]
+
+
+async def _check_cases(app, auth_token: str, cases: list[tuple]) -> list[dict]:
+
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_main.async_engine.sync_engine, 'before_cursor_execute', _count)
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+
+        for method, path, body, expected_n in cases:
+
+            statements.clear()
+            resp = await client.request(
+                method,
+                path,
+                json=body,
+                headers={'Authorization': f"Basic {auth_token}"}
+            )
+
+            results.append({
+                'request':     f"{method} {path}",
+                'status':      resp.status_code,
+                'statement_n': len(statements),
+                'expected_n':  expected_n,
+                'passed':      (resp.status_code == 200) and (len(statements) <= expected_n),
+                'statements':  list(statements),
+            })
+
+    event.remove(db_main.async_engine.sync_engine, 'before_cursor_execute', _count)
+    await db_main.async_engine.dispose()
+
+    return results
+
+
+if __name__ == '__main__':
+
+    # init
+    script_logger = _init_logging()
+    script_params = _init_script_params()
+    script_db = db_main.SessionLocal()
+
+    # seed before app import, so the cached mood message is loaded by the server
+    seeded = _seed(script_db)
+
+    try:
+
+        from servers.server import app
+
+        results = asyncio.run(_check_cases(app, script_params['app_auth_token'], _cases(seeded)))
+
+        for result in results:
+            script_logger.info(json.dumps(result, indent=4))
+
+    finally:
+
+        # clean up seeded rows
+        for db_row in reversed(seeded):
+            script_db.delete(db_row)
+            script_db.flush()
+        script_db.commit()
+        script_db.close()
+
+    failed_list = [result['request'] for result in results if not result['passed']]
+    script_logger.info("passed: %d, failed: %d", len(results) - len(failed_list), len(failed_list))
+
+    if len(failed_list) > 0:
+        script_logger.error("requests over expected statement count: %s", json.dumps(failed_list, indent=4))
+        sys.exit(1)
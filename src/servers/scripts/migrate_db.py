@@ -0,0 +1,82 @@
+"""
+Apply versioned db migrations in resources/migrations for odyssey
+"""
+
+import os
+import sys
+
+import argparse
+
+import logging
+import json
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from init import params as params_init
+
+from databases import database as db_main
+from databases import migration as db_migration
+
+
+def _parse_script_arguments() -> dict:
+
+    # parse args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dry-run', action='store_true', help="only list pending migrations")
+    raw_args = parser.parse_args()
+
+    args = {
+        'dry_run': raw_args.dry_run,
+    }
+
+    return args
+
+
+def _init_script_params() -> dict:
+
+    args = _parse_script_arguments()
+    envs = params_init.load_environment_variables()
+
+    # db
+    if envs['db_dsn'] is None:
+        raise Exception("Missing env DB_DSN")
+
+    params = {
+        'dry_run': args['dry_run'],
+    }
+
+    return params
+
+
+def _init_logging() -> logging.Logger:
+
+    logging.basicConfig(encoding='utf-8', level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    return logger
+
+
+if __name__ == '__main__':
+
+    # init
+    script_logger = _init_logging()
+    script_params = _init_script_params()
+
+    script_logger.info(
+        json.dumps(
+            script_params,
+            indent=4,
+        )
+    )
+
+    migration_list = db_migration.apply_migrations(
+        db_main.engine,
+        dry_run=script_params['dry_run']
+    )
+
+    script_logger.info(
+        "%s migration(s): %s",
+        "pending" if script_params['dry_run'] else "applied",
+        json.dumps(migration_list, indent=4)
+    )
@@ -0,0 +1,144 @@
+"""
+Re-score stored google lens matches of odyssey offline
+
+reads the raw lens visual matches kept in lens_searches and runs them through the current source filter,
+so filter changes are measured without calling serpapi again, e.g.
+python src/servers/scripts/rescore_lens_matches.py --limit 5000
+"""
+
+import os
+import sys
+
+import argparse
+
+import logging
+import json
+
+import collections
+
+from sqlalchemy import select, desc
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from init import params as params_init
+
+from utils import json as js_utils
+
+from servers.logics import spot as spot_logics
+
+from databases import database as db_main
+from databases.models.spot import LensSearch as DBLensSearch
+
+
+_TOP_SOURCE_N = 20
+
+
+def _parse_script_arguments() -> dict:
+
+    # parse args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--limit', type=int, default=None, help="number of latest lens searches to re-score")
+    raw_args = parser.parse_args()
+
+    args = {
+        'limit': raw_args.limit,
+    }
+
+    return args
+
+
+def _init_script_params() -> dict:
+
+    args = _parse_script_arguments()
+    envs = params_init.load_environment_variables()
+
+    # db
+    if envs['db_dsn'] is None:
+        raise Exception("Missing env DB_DSN")
+
+    params = {
+        'limit': args['limit'],
+    }
+
+    return params
+
+
+def _init_logging() -> logging.Logger:
+
+    logging.basicConfig(encoding='utf-8', level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    return logger
+
+
+def _rescore(db, limit: int) -> dict:
+
+    lens_query = select(
+        DBLensSearch.picture_id,
+        DBLensSearch.raw_matches
+    ).order_by(
+        desc(DBLensSearch.fetched_at)
+    ).limit(limit)
+
+    picture_n, match_n, kept_n, empty_n = 0, 0, 0, 0
+    stored_bytes, raw_bytes = 0, 0
+    source_counter, kept_source_counter = collections.Counter(), collections.Counter()
+
+    for picture_id, raw_matches in db.execute(lens_query.execution_options(yield_per=500)):
+
+        glen_visual_matches = js_utils.loads_compressed(raw_matches)
+        spot_img_list = spot_logics.glen_visual_matches_to_spot_images(glen_visual_matches)
+
+        picture_n += 1
+        match_n += len(glen_visual_matches)
+        kept_n += len(spot_img_list)
+        empty_n += 1 if len(spot_img_list) == 0 else 0
+
+        stored_bytes += len(raw_matches)
+        raw_bytes += len(json.dumps(glen_visual_matches, separators=(',', ':')))
+
+        source_counter.update(v_match.get('source', '').lower() for v_match in glen_visual_matches)
+        kept_source_counter.update(spot_img.meta_data['src_domain'].lower() for spot_img in spot_img_list)
+
+    return {
+        'pictures':              picture_n,
+        'matches':               match_n,
+        'kept_matches':          kept_n,
+        'kept_rate':             round(kept_n / match_n, 3) if match_n > 0 else None,
+        'pictures_without_kept': empty_n,
+        'stored_bytes':          stored_bytes,
+        'compression_ratio':     round(raw_bytes / stored_bytes, 2) if stored_bytes > 0 else None,
+        'top_sources':           source_counter.most_common(_TOP_SOURCE_N),
+        'top_kept_sources':      kept_source_counter.most_common(_TOP_SOURCE_N),
+    }
+
+
+if __name__ == '__main__':
+
+    # init
+    script_logger = _init_logging()
+    script_params = _init_script_params()
+    script_db = db_main.SessionLocal()
+
+    script_logger.info(
+        json.dumps(
+            script_params,
+            indent=4,
+        )
+    )
+
+    try:
+
+        result = _rescore(script_db, script_params['limit'])
+
+        script_logger.info(
+            json.dumps(
+                result,
+                indent=4,
+            )
+        )
+
+    finally:
+
+        script_db.close()
@@ -9,6 +9,7 @@ import logging
 
 import json
 
+from contextlib import asynccontextmanager
 
 import uvicorn
 
@@ -20,22 +21,57 @@ from fastapi.responses import JSONResponse
 _root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, _root_dir)
 
-from servers.dependencies import app_params, app_resources, app_logger, verify_token
+from servers.dependencies import app_params, app_resources, app_logger, verify_token, init_request_deadline
 
+from servers.routers.admin import router as admin_router
+from servers.routers.job import router as job_router
 from servers.routers.mood import router as mood_router
 from servers.routers.picture import router as picture_router
 from servers.routers.spot import router as spot_router
+from servers.routers.stats import router as stats_router
 
 from servers.models.error import ErrorInfo
 from servers.models.gunicorn import StandaloneApplication
 from servers.utils import init as server_init
+from servers.utils import job as job_utils
+from servers.utils import mood_pool as mood_pool_utils
+from servers.utils import mood_refresh as mood_refresh_utils
 
+from utils import http as http_utils
 
-app = FastAPI(dependencies=[Depends(verify_token)])
+from databases import database as db_main
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+
+    # run background jobs of this worker
+    await job_utils.job_runner.start()
+    await mood_pool_utils.mood_pool.start(
+        models=[app_params['mood_message_model']],
+        size=app_params['mood_pool_size']
+    )
+    await mood_refresh_utils.mood_refresher.start(app_resources['cached_mood_messages'])
+
+    yield
+
+    await mood_refresh_utils.mood_refresher.stop()
+    await mood_pool_utils.mood_pool.stop()
+    await job_utils.job_runner.stop()
+
+    # release worker shared upstream and db connections
+    await http_utils.close_clients()
+    await db_main.async_engine.dispose()
+
+
+app = FastAPI(dependencies=[Depends(verify_token), Depends(init_request_deadline)], lifespan=lifespan)
+
+app.include_router(admin_router)
+app.include_router(job_router)
 app.include_router(mood_router)
 app.include_router(picture_router)
 app.include_router(spot_router)
+app.include_router(stats_router)
 
 
 @app.get("/healthz")
@@ -0,0 +1,49 @@
+import uuid
+
+
+BATCH_GET_MAX = 500
+
+
+def parse_batch_ids(req_body: dict) -> list[tuple[str, uuid.UUID]]:
+
+    """
+    parse "ids" of a batch get request body into (requested id, parsed uuid) in request order,
+    duplicated ids are dropped and ids that are not uuids are kept with None so they are reported missing
+    """
+
+    if (req_body is None) or (not isinstance(req_body.get('ids'), list)):
+        raise ValueError("request body missing ids")
+
+    req_id_list = req_body['ids']
+    if (len(req_id_list) == 0) or (len(req_id_list) > BATCH_GET_MAX):
+        raise ValueError(f"request body ids should have 1 to {BATCH_GET_MAX} ids")
+
+    id_list, seen = [], set()
+    for req_id in req_id_list:
+
+        req_id = str(req_id)
+        if req_id in seen:
+            continue
+        seen.add(req_id)
+
+        try:
+            id_list.append((req_id, uuid.UUID(req_id)))
+        except ValueError:
+            id_list.append((req_id, None))
+
+    return id_list
+
+
+def split_found(id_list: list[tuple[str, uuid.UUID]], found: dict) -> tuple[list, list[str]]:
+
+    """found items in request order and requested ids not found, found is keyed by uuid"""
+
+    found_list, missing_list = [], []
+    for req_id, parsed_id in id_list:
+
+        if (parsed_id is not None) and (parsed_id in found):
+            found_list.append(found[parsed_id])
+        else:
+            missing_list.append(req_id)
+
+    return found_list, missing_list
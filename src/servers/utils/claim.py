@@ -0,0 +1,64 @@
+import os
+import sys
+
+import asyncio
+import datetime
+import uuid
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from utils import deadline as deadline_utils
+
+from databases import database as db_main
+from databases import queries as db_queries
+
+
+# seconds between lookups of a worker waiting on the claim of another, doubled up to max
+_POLL_MIN = 0.05
+_POLL_MAX = 1.0
+
+
+async def claim_or_wait(key: str, ttl: datetime.timedelta, _find) -> tuple:
+
+    """
+    claim key across gunicorn workers, or wait for the worker holding it: (owner, None) once claimed,
+    the caller then searches with no transaction open and releases the claim in the transaction saving
+    its result, or (None, found) once _find(db) finds that result, every attempt is one short
+    transaction and waiting ends with the request deadline, a claim expires after ttl
+    """
+
+    owner = uuid.uuid4()
+    delay = _POLL_MIN
+    while True:
+
+        async with db_main.AsyncSessionLocal() as db:
+
+            # claim before lookup, a released claim had its result committed with the release
+            claimed = await db.scalar(db_queries.claim_search(key, owner, ttl))
+            found = await _find(db)
+
+            if (claimed is not None) and (found is None):
+                await db.commit()
+                return owner, None
+
+            await db.rollback()
+
+        if found is not None:
+            return None, found
+
+        left = deadline_utils.remaining()
+        if (left is not None) and (left <= delay):
+            raise deadline_utils.DeadlineExceeded(f"request time budget exhausted waiting on {key}")
+
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, _POLL_MAX)
+
+
+async def release(key: str, owner: uuid.UUID):
+
+    """release a claim with no result saved, e.g. the search failed, a waiting worker claims it next"""
+
+    async with db_main.AsyncSessionLocal() as db:
+        await db.execute(db_queries.release_search_claim(key, owner))
+        await db.commit()
@@ -1,6 +1,5 @@
 import os
 import sys
-import multiprocessing
 import logging
 
 import argparse
@@ -10,12 +9,16 @@ _root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__fi
 sys.path.insert(0, _root_dir)
 
 from utils import json as js_utils
+from utils import shared_cache as shared_cache_utils
 
 from init import params as params_init
 from init import sentry as init_sentry
 
+from servers.utils import mood_store as mood_store_utils
+from servers.logics import spot as spot_logics
+
 from databases import database as db_main
-from databases.models.mood import MoodMessage as DBMoodMessage
+from databases import queries as db_queries
 
 
 def _parse_server_arguments() -> dict:
@@ -61,6 +64,8 @@ def _init_server_params() -> dict:
     # google
     if envs['google_api_key'] is None:
         raise Exception("Missing env GOOGLE_API_KEY")
+    if envs['nearby_speculation'] not in ('off', 'on', 'auto'):
+        raise Exception("Invalid env NEARBY_SPECULATION, should be off, on or auto")
 
     # openai
     if envs['mood_message_model'] is None:
@@ -85,19 +90,26 @@ def _init_server_params() -> dict:
         'app_host':           envs['app_host'],
         'app_port':           envs['app_port'],
         'app_auth_token':     envs['app_auth_token'],
+        'app_workers':        envs['app_workers'],
         'aws_access_id':      envs['aws_access_id'],
         'aws_access_key':     envs['aws_access_key'],
         'aws_access_region':  envs['aws_access_region'],
         'aws_s3_bucket_name': envs['aws_s3_bucket_name'],
         'aws_s3_file_path':   envs['aws_s3_file_path'],
+        'aws_s3_endpoint':    envs['aws_s3_endpoint'],
         'db_dsn':             envs['db_dsn'],
         'google_api_key':     envs['google_api_key'],
+        'nearby_speculation': envs['nearby_speculation'],
         'mood_message_model': envs['mood_message_model'],
         'mood_image_size':    envs['mood_image_size'],
+        'mood_pool_size':     int(envs['mood_pool_size']),
         'openai_api_key':     envs['openai_api_key'],
         'openai_api_org':     envs['openai_api_org'],
         'sentry_dsn':         envs['sentry_dsn'],
         'serpapi_api_key':    envs['serpapi_api_key'],
+        'spot_source_config': envs['spot_source_config'],
+        'shared_cache_path':  envs['shared_cache_path'],
+        'shared_cache_mb':    int(envs['shared_cache_mb']),
     }
 
     return params
@@ -105,8 +117,8 @@ def _init_server_params() -> dict:
 
 def _build_server_resources(app_params: dict) -> dict:
 
-    # get number of workers by heuristic
-    worker_n = (multiprocessing.cpu_count() * 2) + 1
+    # number of workers, by heuristic unless APP_WORKERS is set, db pools are sized by it
+    worker_n = int(app_params['app_workers'])
 
     # start UvicornWorkers with gunicorn
     server_options = {
@@ -116,25 +128,36 @@ def _build_server_resources(app_params: dict) -> dict:
         "timeout":      300,
     }
 
+    # total time budget of each request, leave gunicorn some room to respond
+    request_budget = server_options['timeout'] - 30.0
+
+    # upstream results shared by workers, each worker opens the file on first use
+    shared_cache_utils.configure(
+        path=app_params['shared_cache_path'],
+        max_mb=app_params['shared_cache_mb']
+    )
+
+    # lens match sites, the config file is checked for changes by each worker
+    spot_logics.spot_source_matcher.configure(path=app_params['spot_source_config'])
+
     # start db session
     db = db_main.SessionLocal()
 
-    # mood message
-    cached_msg_list = db.query(DBMoodMessage).filter_by(cached=True).all()
+    # mood message, only id and content are kept in memory
+    cached_msg_rows = db.execute(db_queries.cached_mood_messages().execution_options(yield_per=1000))
 
-    cached_msg_id_list = []
-    for msg in cached_msg_list:
-        if (msg.content is None) or (len(msg.content.strip()) == 0):
-            continue
-        cached_msg_id_list.append(str(msg.id))
+    cached_msg_store = mood_store_utils.CachedMoodMessageStore()
+    for msg_id, msg_content, msg_created_at in cached_msg_rows:
+        cached_msg_store.add(msg_id, msg_content, msg_created_at)
 
     # close db session
     db.close()
 
     # result
     resources = {
-        "server_options": server_options,
-        'cached_mood_message_id_list': list(set(cached_msg_id_list))
+        "server_options":       server_options,
+        "request_budget":       request_budget,
+        "cached_mood_messages": cached_msg_store,
     }
 
     return resources
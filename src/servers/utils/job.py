@@ -0,0 +1,197 @@
+import os
+import sys
+
+import asyncio
+import datetime
+import logging
+
+from sqlalchemy import select, update, and_, or_, func
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from utils import deadline as deadline_utils
+
+from databases import database as db_main
+from databases.models.job import Job as DBJob
+
+
+_JOB_CONCURRENCY = 4
+_JOB_BUDGET = 120.0
+_JOB_MAX_ATTEMPTS = 2
+
+_POLL_INTERVAL = 5.0
+
+# a running job not updated for this long belongs to a dead worker and is claimed again
+_STALE_AFTER = datetime.timedelta(seconds=_JOB_BUDGET * 2)
+
+
+class JobRunner:
+
+    """
+    bounded in-process worker pool for jobs stored in postgres
+    jobs are claimed with skip locked, so every gunicorn worker can run one
+    and jobs left by a restarted worker are picked up again once stale
+    """
+
+    def __init__(self, concurrency: int = _JOB_CONCURRENCY):
+        self.concurrency = concurrency
+        self.handlers    = {}
+        self.tasks       = set()
+        self.wakeup      = None
+        self.poll_task   = None
+
+    def register(self, job_type: str, handler):
+
+        """handler is a coroutine function taking job params and returning job result dict"""
+
+        self.handlers[job_type] = handler
+
+    async def start(self):
+
+        self.wakeup = asyncio.Event()
+        self.poll_task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+
+        if self.poll_task is not None:
+            self.poll_task.cancel()
+
+        # hand unfinished jobs back to other workers
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+
+        return {
+            'concurrency': self.concurrency,
+            'running':     len(self.tasks),
+        }
+
+    async def submit(self, db, job_type: str, params: dict) -> DBJob:
+
+        if job_type not in self.handlers:
+            raise Exception(f"unknown job type {job_type}")
+
+        db_job = DBJob(type=job_type, params=params)
+        db.add(db_job)
+        await db.commit()
+
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+        return db_job
+
+    async def _poll(self):
+
+        while True:
+
+            try:
+
+                free_n = self.concurrency - len(self.tasks)
+                if free_n > 0:
+                    for job_id, job_type, job_params in await self._claim(free_n):
+                        task = asyncio.create_task(self._run(job_id, job_type, job_params))
+                        self.tasks.add(task)
+                        task.add_done_callback(self._done)
+
+            except asyncio.CancelledError:
+                raise
+
+            except Exception as e:
+                logging.error("failed to claim jobs, error: %s", repr(e))
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    def _done(self, task: asyncio.Task):
+
+        self.tasks.discard(task)
+        self.wakeup.set()
+
+    async def _claim(self, n: int) -> list[tuple]:
+
+        stale_before = func.now() - _STALE_AFTER
+
+        claimable_ids = select(DBJob.id).where(
+            DBJob.type.in_(list(self.handlers.keys()))
+        ).where(
+            DBJob.attempts < _JOB_MAX_ATTEMPTS
+        ).where(
+            or_(
+                DBJob.status == 'pending',
+                and_(DBJob.status == 'running', DBJob.updated_at < stale_before)
+            )
+        ).order_by(
+            DBJob.created_at
+        ).limit(n).with_for_update(skip_locked=True)
+
+        async with db_main.AsyncSessionLocal() as db:
+
+            # give up on jobs that keep dying with their worker
+            await db.execute(
+                update(DBJob).where(
+                    DBJob.status == 'running'
+                ).where(
+                    DBJob.updated_at < stale_before
+                ).where(
+                    DBJob.attempts >= _JOB_MAX_ATTEMPTS
+                ).values(
+                    status='failed',
+                    error='job abandoned by worker',
+                    updated_at=func.now()
+                )
+            )
+
+            result = await db.execute(
+                update(DBJob).where(
+                    DBJob.id.in_(claimable_ids.scalar_subquery())
+                ).values(
+                    status='running',
+                    attempts=DBJob.attempts + 1,
+                    updated_at=func.now()
+                ).returning(
+                    DBJob.id, DBJob.type, DBJob.params
+                )
+            )
+            claimed = result.all()
+            await db.commit()
+
+        return claimed
+
+    async def _finish(self, job_id, values: dict):
+
+        async with db_main.AsyncSessionLocal() as db:
+            await db.execute(
+                update(DBJob).where(DBJob.id == job_id).values(updated_at=func.now(), **values)
+            )
+            await db.commit()
+
+    async def _run(self, job_id, job_type: str, job_params: dict):
+
+        logging.info("running %s job %s", job_type, job_id)
+
+        try:
+
+            with deadline_utils.budget(_JOB_BUDGET):
+                result = await self.handlers[job_type](job_params)
+
+        except asyncio.CancelledError:
+            # handed back by a stopping runner, the attempt does not count against the job
+            await asyncio.shield(self._finish(job_id, {'status': 'pending', 'attempts': DBJob.attempts - 1}))
+            raise
+
+        except Exception as e:
+            logging.error("failed %s job %s, error: %s", job_type, job_id, repr(e))
+            await self._finish(job_id, {'status': 'failed', 'error': repr(e)})
+            return
+
+        await self._finish(job_id, {'status': 'succeeded', 'result': result, 'error': None})
+        logging.info("done %s job %s", job_type, job_id)
+
+
+job_runner = JobRunner()
@@ -76,6 +76,8 @@ def db_spot_img_to_server_spot_img(db_spot_img: DBSpotImage) -> SvrSpotImage:
 
 def db_spot_to_server_spot(db_spot: DBSpot) -> SvrSpot:
 
+    """spot image has to be loaded along with spot, e.g. by databases.queries.spot_with_image"""
+
     svr_spot = SvrSpot(
         uuid_str=db_spot.id,
         created_at=db_spot.created_at,
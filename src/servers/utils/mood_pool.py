@@ -0,0 +1,133 @@
+import os
+import sys
+
+import asyncio
+import collections
+import logging
+import time
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from utils import deadline as deadline_utils
+
+from servers.logics import mood as mood_logics
+
+
+_REFILL_BUDGET = 60.0
+_REFILL_BACKOFF = 10.0
+
+# window of refill rate metric
+_RATE_WINDOW = 60.0
+
+
+class MoodMessagePool:
+
+    """
+    per worker pool of pre-generated mood messages for each model,
+    requests pop a ready message and a background task tops the pool up again
+    messages are validated by the generating logic before they enter the pool
+    """
+
+    def __init__(self):
+        self.size         = 0
+        self.pools        = {}
+        self.wakeup       = None
+        self.refill_task  = None
+        self.refilled_at  = collections.deque()
+        self.refilled_n   = 0
+        self.refill_err_n = 0
+        self.refill_s     = 0.0
+        self.hit_n        = 0
+        self.miss_n       = 0
+
+    async def start(self, models: list[str], size: int):
+
+        """size 0 disables the pool, every request then generates inline"""
+
+        self.size = size
+        self.pools = {model: collections.deque() for model in models}
+
+        if self.size > 0:
+            self.wakeup = asyncio.Event()
+            self.refill_task = asyncio.create_task(self._refill())
+
+    async def stop(self):
+
+        if self.refill_task is not None:
+            self.refill_task.cancel()
+            await asyncio.gather(self.refill_task, return_exceptions=True)
+
+    def pop(self, model: str) -> str:
+
+        """ready mood message of model, or None when pool is drained"""
+
+        pool = self.pools.get(model)
+        if not pool:
+            self.miss_n += 1
+            return None
+
+        self.hit_n += 1
+        self.wakeup.set()
+
+        return pool.popleft()
+
+    def _prune_refilled_at(self):
+
+        """keep refill times of the rate window only, on every refill so it stays bounded without stats calls"""
+
+        now = time.monotonic()
+        while (len(self.refilled_at) > 0) and (self.refilled_at[0] < now - _RATE_WINDOW):
+            self.refilled_at.popleft()
+
+    def stats(self) -> dict:
+
+        self._prune_refilled_at()
+
+        return {
+            'size':           self.size,
+            'depth':          {model: len(pool) for model, pool in self.pools.items()},
+            'hit_n':          self.hit_n,
+            'miss_n':         self.miss_n,
+            'refilled_n':     self.refilled_n,
+            'refill_err_n':   self.refill_err_n,
+            'refill_per_min': len(self.refilled_at) * 60.0 / _RATE_WINDOW,
+            'avg_refill_s':   round(self.refill_s / self.refilled_n, 3) if self.refilled_n > 0 else None,
+        }
+
+    async def _refill(self):
+
+        while True:
+
+            # one message at a time, shallowest pool first
+            model, pool = min(self.pools.items(), key=lambda item: len(item[1]))
+
+            if len(pool) >= self.size:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+
+            start = time.monotonic()
+            try:
+
+                with deadline_utils.budget(_REFILL_BUDGET):
+                    mood_msg = await mood_logics.generate_random_mood_message_async(model=model)
+
+            except asyncio.CancelledError:
+                raise
+
+            except Exception as e:
+                self.refill_err_n += 1
+                logging.error("failed to refill mood message pool of %s, error: %s", model, repr(e))
+                await asyncio.sleep(_REFILL_BACKOFF)
+                continue
+
+            pool.append(mood_msg)
+
+            self.refilled_n += 1
+            self.refill_s += time.monotonic() - start
+            self.refilled_at.append(time.monotonic())
+            self._prune_refilled_at()
+
+
+mood_pool = MoodMessagePool()
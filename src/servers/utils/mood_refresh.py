@@ -0,0 +1,121 @@
+import os
+import sys
+
+import asyncio
+import datetime
+import logging
+import time
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from servers.utils.mood_store import CachedMoodMessageStore
+
+from databases import database as db_main
+from databases import queries as db_queries
+
+
+_REFRESH_INTERVAL = 30.0
+
+# one refresh reads at most _REFRESH_BATCH * _REFRESH_MAX_BATCHES rows, the rest waits for next poll
+_REFRESH_BATCH = 1000
+_REFRESH_MAX_BATCHES = 5
+
+# created_at is the start of the inserting transaction, look back for ones committed late
+_REFRESH_OVERLAP = datetime.timedelta(seconds=60)
+
+_FORCE_MIN_INTERVAL = 5.0
+
+
+class CachedMoodMessageRefresher:
+
+    """
+    merge newly cached mood messages into the in-memory store of this worker,
+    polling with the created_at watermark of the store since LISTEN/NOTIFY does
+    not pass through pgbouncer transaction pooling
+    """
+
+    def __init__(self):
+        self.store       = None
+        self.lock        = None
+        self.poll_task   = None
+        self.added_n     = 0
+        self.refreshed_n = 0
+        self.forced_at   = None
+
+    async def start(self, store: CachedMoodMessageStore):
+
+        self.store = store
+        self.lock = asyncio.Lock()
+        self.poll_task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+
+        if self.poll_task is not None:
+            self.poll_task.cancel()
+            await asyncio.gather(self.poll_task, return_exceptions=True)
+
+    def stats(self) -> dict:
+
+        return {
+            'interval_s':  _REFRESH_INTERVAL,
+            'refreshed_n': self.refreshed_n,
+            'added_n':     self.added_n,
+        }
+
+    async def force_refresh(self) -> int:
+
+        """refresh now, returns number of added messages, or None when forced too often"""
+
+        now = time.monotonic()
+        if (self.forced_at is not None) and (now - self.forced_at < _FORCE_MIN_INTERVAL):
+            return None
+        self.forced_at = now
+
+        return await self.refresh()
+
+    async def refresh(self) -> int:
+
+        async with self.lock:
+
+            cursor = None
+            if self.store.watermark is not None:
+                cursor = (self.store.watermark - _REFRESH_OVERLAP, None)
+
+            added_n = 0
+            for _ in range(_REFRESH_MAX_BATCHES):
+
+                async with db_main.AsyncSessionLocal() as db:
+                    msg_rows = (await db.execute(db_queries.cached_mood_messages_after(cursor, _REFRESH_BATCH))).all()
+
+                for msg_id, msg_content, msg_created_at in msg_rows:
+                    if self.store.add(msg_id, msg_content, msg_created_at):
+                        added_n += 1
+
+                if len(msg_rows) < _REFRESH_BATCH:
+                    break
+                cursor = (msg_rows[-1][2], msg_rows[-1][0])
+
+            self.added_n += added_n
+            self.refreshed_n += 1
+
+        if added_n > 0:
+            logging.info("merged %d new cached mood message(s), total: %d", added_n, len(self.store))
+
+        return added_n
+
+    async def _poll(self):
+
+        while True:
+
+            await asyncio.sleep(_REFRESH_INTERVAL)
+
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error("failed to refresh cached mood messages, error: %s", repr(e))
+
+
+mood_refresher = CachedMoodMessageRefresher()
@@ -0,0 +1,79 @@
+import sys
+import array
+import datetime
+import random
+import uuid
+
+
+class CachedMoodMessageStore:
+
+    """
+    compact in-memory store of cached mood messages of a worker:
+    ids are packed as 16 bytes each, contents as one utf-8 buffer with offsets,
+    so picking a random message needs no db round trip
+    watermark is the latest created_at added, new messages are merged from there
+    """
+
+    __slots__ = ('ids', 'texts', 'offsets', 'id_set', 'watermark')
+
+    def __init__(self):
+        self.ids       = bytearray()
+        self.texts     = bytearray()
+        self.offsets   = array.array('Q', [0])
+        self.id_set    = set()
+        self.watermark = None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def add(self, msg_id, content: str, created_at: datetime.datetime = None) -> bool:
+
+        """add message, skip empty and already stored ones"""
+
+        if (created_at is not None) and ((self.watermark is None) or (created_at > self.watermark)):
+            self.watermark = created_at
+
+        if (content is None) or (len(content.strip()) == 0):
+            return False
+
+        id_bytes = uuid.UUID(str(msg_id)).bytes
+        if id_bytes in self.id_set:
+            return False
+
+        self.id_set.add(id_bytes)
+        self.ids += id_bytes
+        self.texts += content.encode('utf-8')
+        self.offsets.append(len(self.texts))
+
+        return True
+
+    def get(self, i: int) -> tuple[str, str]:
+
+        msg_id  = str(uuid.UUID(bytes=bytes(self.ids[i * 16:(i + 1) * 16])))
+        content = self.texts[self.offsets[i]:self.offsets[i + 1]].decode('utf-8')
+
+        return msg_id, content
+
+    def random(self) -> tuple[str, str]:
+
+        """random (id, content), or (None, None) when empty"""
+
+        if len(self) == 0:
+            return None, None
+
+        return self.get(random.randrange(len(self)))
+
+    def memory_bytes(self) -> int:
+
+        size = sys.getsizeof(self.ids) + sys.getsizeof(self.texts) + sys.getsizeof(self.offsets)
+        size += sys.getsizeof(self.id_set) + sum(sys.getsizeof(id_bytes) for id_bytes in self.id_set)
+
+        return size
+
+    def stats(self) -> dict:
+
+        return {
+            'count':        len(self),
+            'memory_bytes': self.memory_bytes(),
+            'watermark':    self.watermark,
+        }
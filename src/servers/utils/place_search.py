@@ -0,0 +1,202 @@
+import os
+import sys
+
+import collections
+import datetime
+import logging
+
+_root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, _root_dir)
+
+from utils import cache as cache_utils
+from utils import fanout as fanout_utils
+
+from servers.logics import spot as spot_logics
+from servers.models import spot as spot_models
+
+from databases import database as db_main
+from databases import queries as db_queries
+
+
+# places barely change, a query google found nothing for is asked again sooner
+_POSITIVE_TTL = datetime.timedelta(days=30)
+_NEGATIVE_TTL = datetime.timedelta(days=1)
+
+# per key lookup counters are kept for the most recent keys only
+_KEY_STATS_N = 1000
+_TOP_KEY_N = 20
+
+SOURCE_WORKER = 'worker'
+SOURCE_DB = 'db'
+SOURCE_GOOGLE = 'google'
+
+
+class PlaceTextSearchCache:
+
+    """
+    places text search results by normalized lens title: worker memory, then the db table shared
+    by all workers, then google, results of failed google requests are never kept,
+    the db is read once before google is asked and written once after, so no connection
+    is held while waiting on google
+    """
+
+    def __init__(self):
+        self.results        = cache_utils.get_cache('place_text_search', max_size=10000, ttl=3600.0)
+        self.key_stats      = collections.OrderedDict()
+        self.source_n       = collections.Counter()
+        self.negative_hit_n = 0
+        self.fanout_stats   = fanout_utils.FanOutStats()
+
+    def _count(self, query: str, source: str):
+
+        self.source_n[source] += 1
+
+        key_stats = self.key_stats.get(query)
+        if key_stats is None:
+            key_stats = self.key_stats[query] = {'hit_n': 0, 'miss_n': 0}
+        self.key_stats.move_to_end(query)
+
+        if source == SOURCE_GOOGLE:
+            key_stats['miss_n'] += 1
+        else:
+            key_stats['hit_n'] += 1
+
+        while len(self.key_stats) > _KEY_STATS_N:
+            self.key_stats.popitem(last=False)
+
+    async def _load(self, query_list: list[str]) -> dict:
+
+        """(raw results, source) of known queries, from worker memory, then the rest in one db select"""
+
+        known = {}
+        for query in query_list:
+            raw_result_list = self.results.get(query)
+            if raw_result_list is not None:
+                known[query] = (raw_result_list, SOURCE_WORKER)
+
+        db_query_list = [query for query in query_list if query not in known]
+        if len(db_query_list) == 0:
+            return known
+
+        async with db_main.AsyncSessionLocal() as db:
+            db_row_list = (await db.execute(db_queries.place_text_searches(db_query_list))).all()
+
+        for db_row in db_row_list:
+            self.results.set(db_row.query, db_row.results)
+            known[db_row.query] = (db_row.results, SOURCE_DB)
+
+        return known
+
+    async def _save(self, fetched: dict):
+
+        """results google found for queries, in one upsert, a failed save only loses them for other workers"""
+
+        for query, raw_result_list in fetched.items():
+            self.results.set(query, raw_result_list)
+
+        search_list = [
+            (query, raw_result_list, _POSITIVE_TTL if len(raw_result_list) > 0 else _NEGATIVE_TTL)
+            for query, raw_result_list in fetched.items()
+        ]
+
+        try:
+            async with db_main.AsyncSessionLocal() as db:
+                await db.execute(db_queries.upsert_place_text_searches(search_list))
+                await db.commit()
+        except Exception as e:
+            logging.warning("failed to save %d places text search(es), error: %s", len(search_list), repr(e))
+
+    async def search_all(
+            self,
+            api_key: str,
+            images: list[spot_models.SpotImage],
+            concurrency: int,
+            _on_result=None
+    ) -> list:
+
+        """
+        spots of every image in order, a failed google request has its exception in place of the spots,
+        like gather with return_exceptions, google is asked once per distinct unknown query with at most
+        concurrency requests in flight, _on_result(i, result) is called once the result of image i is known
+        """
+
+        query_list = [spot_logics.normalize_place_query(image.title) for image in images]
+        distinct_query_list = list(dict.fromkeys(query for query in query_list if len(query) > 0))
+
+        known = await self._load(distinct_query_list)
+
+        results = [None] * len(images)
+
+        def _resolve(query: str, source: str, result):
+
+            # images sharing a query after the first are served from this worker
+            for i in range(len(images)):
+                if query_list[i] != query:
+                    continue
+                if len(query) > 0:
+                    self._count(query, source)
+                    source = SOURCE_WORKER
+                results[i] = result
+                if _on_result is not None:
+                    _on_result(i, result)
+
+        for query in dict.fromkeys(query_list):
+            if len(query) == 0:
+                _resolve(query, None, [])
+            elif query in known:
+                raw_result_list, source = known[query]
+                if len(raw_result_list) == 0:
+                    self.negative_hit_n += sum(1 for q in query_list if q == query)
+                _resolve(query, source, spot_logics.gmap_text_search_results_to_spots(raw_result_list))
+
+        async def _fetch(query: str) -> list[dict]:
+            try:
+                raw_result_list = await spot_logics.search_places_by_text_async(api_key=api_key, query=query)
+            except Exception as e:
+                _resolve(query, SOURCE_GOOGLE, e)
+                raise
+            _resolve(query, SOURCE_GOOGLE, spot_logics.gmap_text_search_results_to_spots(raw_result_list))
+            return raw_result_list
+
+        missing_list = [query for query in distinct_query_list if query not in known]
+        fetched_list = await fanout_utils.gather_bounded(missing_list, _fetch, concurrency, stats=self.fanout_stats)
+
+        fetched = {
+            query: raw_result_list
+            for query, raw_result_list in zip(missing_list, fetched_list)
+            if isinstance(raw_result_list, list)
+        }
+        if len(fetched) > 0:
+            await self._save(fetched)
+
+        return results
+
+    def stats(self) -> dict:
+
+        lookup_n = sum(self.source_n.values())
+
+        top_keys = sorted(
+            self.key_stats.items(),
+            key=lambda item: item[1]['hit_n'] + item[1]['miss_n'],
+            reverse=True
+        )[:_TOP_KEY_N]
+
+        return {
+            'lookup_n':       lookup_n,
+            'hit_rate':       round(1 - self.source_n[SOURCE_GOOGLE] / lookup_n, 3) if lookup_n > 0 else None,
+            'sources':        dict(self.source_n),
+            'negative_hit_n': self.negative_hit_n,
+            'fanout':         self.fanout_stats.stats(),
+            'top_keys': [
+                {
+                    'query':    query,
+                    'hit_n':    key_stats['hit_n'],
+                    'miss_n':   key_stats['miss_n'],
+                    'hit_rate': round(key_stats['hit_n'] / (key_stats['hit_n'] + key_stats['miss_n']), 3),
+                }
+                for query, key_stats in top_keys
+            ],
+        }
+
+
+place_text_search = PlaceTextSearchCache()
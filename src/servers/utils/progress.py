@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+
+# comment line sent when no event for a while, so proxies keep idle streams open
+SSE_KEEPALIVE = ": keepalive\n\n"
+
+
+def sse_event(event: str, data: dict) -> str:
+
+    """one server-sent event, data as a single json line"""
+
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+
+class ProgressBroker:
+
+    """
+    stage events of running searches by key within a worker, a subscriber first gets the events
+    published so far by the running search, so a request joining a shared search sees all stages,
+    and then new ones as they are published
+    """
+
+    def __init__(self):
+        self.histories   = {}
+        self.subscribers = {}
+        self.published_n = 0
+
+    def publish(self, key, event: str, data: dict):
+
+        self.published_n += 1
+        self.histories.setdefault(key, []).append((event, data))
+        for queue in self.subscribers.get(key, []):
+            queue.put_nowait((event, data))
+
+    def close(self, key):
+
+        """search of key is done, later searches of key start with no history"""
+
+        self.histories.pop(key, None)
+
+    def subscribe(self, key) -> asyncio.Queue:
+
+        queue = asyncio.Queue()
+        for item in self.histories.get(key, []):
+            queue.put_nowait(item)
+
+        self.subscribers.setdefault(key, []).append(queue)
+
+        return queue
+
+    def unsubscribe(self, key, queue: asyncio.Queue):
+
+        queue_list = self.subscribers.get(key, [])
+        if queue in queue_list:
+            queue_list.remove(queue)
+        if len(queue_list) == 0:
+            self.subscribers.pop(key, None)
+
+    def stats(self) -> dict:
+
+        return {
+            'running':     len(self.histories),
+            'subscribers': sum(len(queue_list) for queue_list in self.subscribers.values()),
+            'published_n': self.published_n,
+        }
+
+
+# stages of spot searches by picture id (routers/spot.py)
+spot_search_progress = ProgressBroker()
@@ -0,0 +1,154 @@
+import time
+import json
+import hashlib
+import uuid
+
+from collections import OrderedDict
+
+
+# bump when the json of cached resources changes, so clients do not keep stale representations
+_ETAG_VERSION = 1
+
+# responses need the auth token, so only the client may keep them
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+_CACHES = {}
+
+
+class LRUCache:
+
+    """
+    bounded in-process cache of a worker, least recently used entries are evicted first
+    and entries expire after ttl seconds
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size    = max_size
+        self.ttl         = ttl
+        self.entries     = OrderedDict()
+        self.hit_n       = 0
+        self.miss_n      = 0
+        self.evicted_n   = 0
+        self.expired_n   = 0
+
+    def get(self, key):
+
+        entry = self.entries.get(key)
+        if entry is None:
+            self.miss_n += 1
+            return None
+
+        expire_at, value = entry
+        if expire_at < time.monotonic():
+            del self.entries[key]
+            self.expired_n += 1
+            self.miss_n += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hit_n += 1
+
+        return value
+
+    def set(self, key, value):
+
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evicted_n += 1
+
+    async def get_or_load(self, key, _loader):
+
+        """read through: on miss await _loader(), results of None are not cached"""
+
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        value = await _loader()
+        if value is not None:
+            self.set(key, value)
+
+        return value
+
+    def stats(self) -> dict:
+
+        lookup_n = self.hit_n + self.miss_n
+
+        return {
+            'size':      len(self.entries),
+            'max_size':  self.max_size,
+            'ttl_s':     self.ttl,
+            'hit_n':     self.hit_n,
+            'miss_n':    self.miss_n,
+            'hit_rate':  round(self.hit_n / lookup_n, 3) if lookup_n > 0 else None,
+            'evicted_n': self.evicted_n,
+            'expired_n': self.expired_n,
+        }
+
+
+def get_cache(name: str, max_size: int, ttl: float) -> LRUCache:
+
+    cache = _CACHES.get(name)
+    if cache is None:
+        cache = LRUCache(max_size=max_size, ttl=ttl)
+        _CACHES[name] = cache
+
+    return cache
+
+
+def get_cache_stats() -> dict:
+
+    return {name: cache.stats() for name, cache in _CACHES.items()}
+
+
+def canonical_id(_id: str) -> str:
+
+    """canonical form of an uuid id for cache keys and etags, None when it is not an uuid"""
+
+    try:
+        return str(uuid.UUID(_id))
+    except (ValueError, TypeError):
+        return None
+
+
+def resource_etag(kind: str, canonical_resource_id: str) -> str:
+
+    """strong etag of an immutable resource, known from its id alone"""
+
+    return f'"v{_ETAG_VERSION}-{kind}-{canonical_resource_id}"'
+
+
+def content_etag(content: dict) -> str:
+
+    """strong etag of a json ready response body"""
+
+    digest = hashlib.sha1(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
+    return f'"v{_ETAG_VERSION}-{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str, found: bool = True) -> bool:
+
+    """
+    If-None-Match uses weak comparison, so W/ prefixes are ignored,
+    * matches only a resource known to exist, pass found=False when checking before the lookup
+    """
+
+    if (if_none_match is None) or (etag is None):
+        return False
+
+    if if_none_match.strip() == '*':
+        return found
+
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+
+    return False
@@ -0,0 +1,86 @@
+import time
+import asyncio
+import contextvars
+
+from contextlib import contextmanager
+
+
+# absolute monotonic deadline of the current request, None outside of requests (e.g. scripts)
+_DEADLINE = contextvars.ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def set_deadline(budget: float):
+
+    """start time budget of current request, nested budgets never extend the outer one"""
+
+    deadline = time.monotonic() + budget
+
+    current = _DEADLINE.get()
+    if (current is not None) and (current < deadline):
+        deadline = current
+
+    return _DEADLINE.set(deadline)
+
+
+@contextmanager
+def budget(seconds: float):
+
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def remaining() -> float:
+
+    """seconds left in current budget, None when there is no budget"""
+
+    deadline = _DEADLINE.get()
+    if deadline is None:
+        return None
+
+    return deadline - time.monotonic()
+
+
+def check():
+
+    left = remaining()
+    if (left is not None) and (left <= 0):
+        raise DeadlineExceeded("request time budget exhausted")
+
+
+def timeout(cap: float) -> float:
+
+    """timeout for next upstream call: the call cap or what is left of budget, whichever is smaller"""
+
+    left = remaining()
+    if left is None:
+        return cap
+
+    if left <= 0:
+        raise DeadlineExceeded("request time budget exhausted")
+
+    return min(cap, left)
+
+
+async def wait_for(aw, cap: float):
+
+    """await with the call cap bounded by budget, the awaitable is cancelled once either runs out"""
+
+    try:
+        left = timeout(cap)
+    except DeadlineExceeded:
+        aw.close()
+        raise
+
+    try:
+        return await asyncio.wait_for(aw, timeout=left)
+    except asyncio.TimeoutError as e:
+        if (remaining() is not None) and (remaining() <= 0):
+            raise DeadlineExceeded("request time budget exhausted") from e
+        raise
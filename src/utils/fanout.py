@@ -0,0 +1,46 @@
+import asyncio
+
+
+class FanOutStats:
+
+    """counters of fan-outs within the current worker"""
+
+    def __init__(self):
+        self.fanout_n  = 0
+        self.started_n = 0
+        self.failed_n  = 0
+
+    def stats(self) -> dict:
+
+        return {
+            'fanout_n':    self.fanout_n,
+            'started_n':   self.started_n,
+            'failed_n':    self.failed_n,
+            'avg_started': round(self.started_n / self.fanout_n, 2) if self.fanout_n > 0 else None,
+        }
+
+
+async def gather_bounded(items: list, _func, concurrency: int, stats: FanOutStats = None) -> list:
+
+    """
+    await _func(item) for all items with at most concurrency calls in flight and return results in
+    list order, an item that raised has its exception in place of the result, like gather with
+    return_exceptions, calls still running are cancelled when the caller is cancelled
+    """
+
+    if stats is not None:
+        stats.fanout_n += 1
+        stats.started_n += len(items)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _bounded(item):
+        async with semaphore:
+            return await _func(item)
+
+    results = await asyncio.gather(*[_bounded(item) for item in items], return_exceptions=True)
+
+    if stats is not None:
+        stats.failed_n += sum(1 for result in results if isinstance(result, BaseException))
+
+    return results
@@ -0,0 +1,169 @@
+import os
+import time
+
+import httpx
+
+
+# one pooled client per upstream host, so the limits below are per host
+_CLIENT_CONFIGS = {
+    'serpapi': {
+        'max_connections':           20,
+        'max_keepalive_connections': 10,
+    },
+    'gmap': {
+        'max_connections':           50,
+        'max_keepalive_connections': 20,
+    },
+    'openai': {
+        'max_connections':           20,
+        'max_keepalive_connections': 10,
+    },
+    'download': {
+        'max_connections':           20,
+        'max_keepalive_connections': 5,
+    },
+}
+
+_KEEPALIVE_EXPIRY = 60.0
+_DEFAULT_TIMEOUT = 10.0
+
+_ASYNC_CLIENTS = {}
+_CLIENT_STATS = {}
+_CLIENTS_PID = None
+
+
+class _ClientStats:
+
+    """request counters of one named client"""
+
+    __slots__ = ('requests', 'errors', 'in_flight', 'max_in_flight', 'latency_s')
+
+    def __init__(self):
+        self.requests      = 0
+        self.errors        = 0
+        self.in_flight     = 0
+        self.max_in_flight = 0
+        self.latency_s     = 0.0
+
+    def start(self) -> float:
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return time.perf_counter()
+
+    def done(self, start: float, failed: bool):
+        self.in_flight -= 1
+        self.latency_s += time.perf_counter() - start
+        if failed:
+            self.errors += 1
+
+
+class _AsyncMeteredTransport(httpx.AsyncHTTPTransport):
+
+    def __init__(self, stats: _ClientStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+
+        start, failed = self.stats.start(), True
+        try:
+            resp = await super().handle_async_request(request)
+            failed = False
+            return resp
+        finally:
+            self.stats.done(start, failed)
+
+
+def _check_process():
+
+    """clients must not cross gunicorn fork, drop the ones inherited from parent"""
+
+    global _CLIENTS_PID
+
+    if _CLIENTS_PID != os.getpid():
+        _ASYNC_CLIENTS.clear()
+        _CLIENT_STATS.clear()
+        _CLIENTS_PID = os.getpid()
+
+
+def _client_kwargs(name: str) -> dict:
+
+    if name not in _CLIENT_CONFIGS:
+        raise Exception(f"unknown http client {name}")
+
+    config = _CLIENT_CONFIGS[name]
+    limits = httpx.Limits(
+        max_connections=config['max_connections'],
+        max_keepalive_connections=config['max_keepalive_connections'],
+        keepalive_expiry=_KEEPALIVE_EXPIRY,
+    )
+
+    stats = _CLIENT_STATS.setdefault(name, _ClientStats())
+
+    return {'limits': limits, 'stats': stats}
+
+
+def get_async_client(name: str) -> httpx.AsyncClient:
+
+    """get pooled keep-alive non-blocking http client of an upstream within the current worker"""
+
+    _check_process()
+
+    client = _ASYNC_CLIENTS.get(name)
+    if (client is None) or client.is_closed:
+        kwargs = _client_kwargs(name)
+        client = httpx.AsyncClient(
+            transport=_AsyncMeteredTransport(stats=kwargs['stats'], limits=kwargs['limits'], retries=1),
+            timeout=_DEFAULT_TIMEOUT,
+            follow_redirects=True,
+        )
+        _ASYNC_CLIENTS[name] = client
+
+    return client
+
+
+def _pool_stats(client) -> dict:
+
+    # httpcore pool backing the transport, only inspected for metrics
+    pool = getattr(client._transport, '_pool', None)
+    connections = list(getattr(pool, 'connections', []))
+
+    return {
+        'open_connections': len(connections),
+        'idle_connections': sum(1 for conn in connections if conn.is_idle()),
+    }
+
+
+def get_client_stats() -> dict:
+
+    """pool usage metrics of all clients in the current worker"""
+
+    _check_process()
+
+    result = {}
+    for name, stats in _CLIENT_STATS.items():
+
+        client_stats = {
+            'max_connections': _CLIENT_CONFIGS[name]['max_connections'],
+            'requests':        stats.requests,
+            'errors':          stats.errors,
+            'in_flight':       stats.in_flight,
+            'max_in_flight':   stats.max_in_flight,
+            'avg_latency_ms':  round(stats.latency_s * 1000 / stats.requests, 2) if stats.requests > 0 else None,
+        }
+
+        if name in _ASYNC_CLIENTS:
+            client_stats['async_pool'] = _pool_stats(_ASYNC_CLIENTS[name])
+
+        result[name] = client_stats
+
+    return result
+
+
+async def close_clients():
+
+    for client in _ASYNC_CLIENTS.values():
+        await client.aclose()
+
+    _ASYNC_CLIENTS.clear()
@@ -1,5 +1,7 @@
 import uuid
 import datetime
+import json
+import zlib
 
 
 def json_serializer(obj):
@@ -14,3 +16,14 @@ def json_serializer(obj):
         return obj.__dict__
 
     raise TypeError("Type not serializable")
+
+
+def dumps_compressed(obj, level: int = 6) -> bytes:
+
+    """compact json compressed with zlib, for raw upstream responses kept in db"""
+
+    return zlib.compress(json.dumps(obj, separators=(',', ':'), default=json_serializer).encode('utf-8'), level)
+
+
+def loads_compressed(blob: bytes):
+    return json.loads(zlib.decompress(blob))
@@ -1,10 +1,17 @@
+import asyncio
 import logging
 
+from utils import deadline as deadline_utils
+
 
 def retry(retry_n: int, _func, *args, **kwargs):
 
+    """retry function while there is time left in request budget"""
+
     for i in range(retry_n+1):
 
+        deadline_utils.check()
+
         try:
 
             return _func(*args, **kwargs)
@@ -13,9 +20,34 @@ def retry(retry_n: int, _func, *args, **kwargs):
 
             if i > 0:
                 logging.info("retry %d / %d", i, retry_n)
-            if i < retry_n:
+            if (i < retry_n) and not isinstance(e, deadline_utils.DeadlineExceeded):
                 continue
             else:
                 raise e
 
         break
+
+
+async def retry_async(retry_n: int, timeout: float, _func, *args, **kwargs):
+
+    """
+    retry coroutine function, each attempt is cancelled after timeout seconds
+    or when request budget runs out, whichever comes first
+    """
+
+    for i in range(retry_n+1):
+
+        attempt_timeout = deadline_utils.timeout(timeout)
+
+        try:
+
+            return await asyncio.wait_for(_func(*args, **kwargs), timeout=attempt_timeout)
+
+        except Exception as e:
+
+            if i > 0:
+                logging.info("retry %d / %d", i, retry_n)
+            if (i < retry_n) and not isinstance(e, deadline_utils.DeadlineExceeded):
+                continue
+            else:
+                raise e
@@ -1,26 +1,212 @@
-import requests
+import os
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+
 import boto3
+from botocore.config import Config
+
+from utils import http as http_utils
+
+
+# parts are buffered in memory one at a time, s3 requires >= 5 MiB except the last part
+_PART_SIZE = 8 * 1024 * 1024
+_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+_S3_CLIENT_CONFIG = Config(
+    max_pool_connections=20,
+    retries={'max_attempts': 3, 'mode': 'standard'},
+    tcp_keepalive=True,
+)
+
+_S3_CLIENTS = {}
+_S3_CLIENTS_LOCK = threading.Lock()
+
+_UPLOAD_STATS = {
+    'uploads':   0,
+    'failures':  0,
+    'bytes':     0,
+    'elapsed_s': 0.0,
+}
+
+
+def get_s3_client(s3_region: str, s3_endpoint_url: str = None):
+
+    """
+    get process wide s3 client, credentials and endpoint are resolved once
+    s3_endpoint_url points to a s3 compatible stand-in (minio, moto server) for local testing
+    """
+
+    key = (os.getpid(), s3_region, s3_endpoint_url)
+
+    client = _S3_CLIENTS.get(key)
+    if client is None:
+        with _S3_CLIENTS_LOCK:
+            client = _S3_CLIENTS.get(key)
+            if client is None:
+                client = boto3.session.Session().client(
+                    's3',
+                    region_name=s3_region,
+                    endpoint_url=s3_endpoint_url,
+                    config=_S3_CLIENT_CONFIG,
+                )
+                _S3_CLIENTS[key] = client
+
+    return client
+
+
+def get_upload_stats() -> dict:
+
+    stats = dict(_UPLOAD_STATS)
+    stats['avg_bytes_per_s'] = round(stats['bytes'] / stats['elapsed_s'], 1) if stats['elapsed_s'] > 0 else None
+
+    return stats
+
+
+def _s3_http_url(s3_region: str, s3_endpoint_url: str, s3_bucket_name: str, s3_key: str) -> str:
+
+    if s3_endpoint_url is not None:
+        return f"{s3_endpoint_url.rstrip('/')}/{s3_bucket_name}/{s3_key}"
+
+    return f"https://s3.{s3_region}.amazonaws.com/{s3_bucket_name}/{s3_key}"
+
+
+def _record_upload(s3_key: str, size: int, start: float, failed: bool):
+
+    elapsed = time.perf_counter() - start
+
+    if failed:
+        _UPLOAD_STATS['failures'] += 1
+        logging.warning("failed to upload %s after %.3f s", s3_key, elapsed)
+        return
+
+    _UPLOAD_STATS['uploads'] += 1
+    _UPLOAD_STATS['bytes'] += size
+    _UPLOAD_STATS['elapsed_s'] += elapsed
+
+    logging.info(
+        "uploaded %s, size: %d bytes, latency: %.3f s, throughput: %.1f bytes/s",
+        s3_key,
+        size,
+        elapsed,
+        size / elapsed if elapsed > 0 else 0.0,
+    )
 
 
-def s3_upload_fileobj_by_url(
+class _MultipartUpload:
+
+    """
+    buffer streamed chunks into s3 parts, holding at most one part in memory
+    objects smaller than one part are sent with a single put_object
+    """
+
+    def __init__(self, client, s3_bucket_name: str, s3_key: str):
+        self.client      = client
+        self.bucket      = s3_bucket_name
+        self.key         = s3_key
+        self.buffer      = bytearray()
+        self.size        = 0
+        self.digest      = hashlib.sha256()
+        self.upload_id   = None
+        self.parts       = []
+
+    def add(self, chunk: bytes):
+
+        self.buffer += chunk
+        self.size += len(chunk)
+        self.digest.update(chunk)
+
+    def feed(self) -> bytes:
+
+        """pop a full part from buffer, or None if buffer is below part size"""
+
+        if len(self.buffer) < _PART_SIZE:
+            return None
+
+        part = bytes(self.buffer[:_PART_SIZE])
+        del self.buffer[:_PART_SIZE]
+
+        return part
+
+    def upload_part(self, part: bytes):
+
+        if self.upload_id is None:
+            self.upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key)['UploadId']
+
+        part_n = len(self.parts) + 1
+        resp = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_n,
+            Body=part,
+        )
+        self.parts.append({'ETag': resp['ETag'], 'PartNumber': part_n})
+
+    def complete(self):
+
+        last_part = bytes(self.buffer)
+        self.buffer.clear()
+
+        if self.upload_id is None:
+            self.client.put_object(Bucket=self.bucket, Key=self.key, Body=last_part)
+            return
+
+        if len(last_part) > 0:
+            self.upload_part(last_part)
+
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={'Parts': self.parts},
+        )
+
+    def abort(self):
+
+        if self.upload_id is not None:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+async def s3_upload_fileobj_by_url_async(
         source_url: str,
         s3_region: str,
         s3_bucket_name: str,
         s3_file_path: str,
         filename: str,
+        s3_endpoint_url: str = None,
 ):
-    # get raw object
-    req = requests.get(source_url, stream=True)
 
-    # init s3
-    s3_session = boto3.Session()
-    s3 = s3_session.resource('s3')
-    s3_session_bucket = s3.Bucket(s3_bucket_name)
+    s3_key = f"{s3_file_path}/{filename}"
+    s3_http_url = _s3_http_url(s3_region, s3_endpoint_url, s3_bucket_name, s3_key)
+
+    upload = _MultipartUpload(get_s3_client(s3_region, s3_endpoint_url), s3_bucket_name, s3_key)
+
+    start, failed = time.perf_counter(), True
+    try:
+
+        # stream raw object without blocking event loop, boto3 calls run in a worker thread
+        async with http_utils.get_async_client('download').stream('GET', source_url) as resp:
+            resp.raise_for_status()
+
+            async for chunk in resp.aiter_bytes(_DOWNLOAD_CHUNK_SIZE):
+                upload.add(chunk)
+
+                part = upload.feed()
+                if part is not None:
+                    await asyncio.to_thread(upload.upload_part, part)
+
+        await asyncio.to_thread(upload.complete)
+        failed = False
 
-    # upload
-    s3_url = f"{s3_file_path}/{filename}"
-    s3_http_url = f"https://s3.{s3_region}.amazonaws.com/{s3_bucket_name}/{s3_file_path}/{filename}"
+    except BaseException:
+        await asyncio.shield(asyncio.to_thread(upload.abort))
+        raise
 
-    s3_session_bucket.upload_fileobj(req.raw, s3_url)
+    finally:
+        _record_upload(s3_key, upload.size, start, failed)
 
-    return s3_http_url
+    # content hash lets results computed from the picture be found again by content
+    return s3_http_url, upload.digest.hexdigest()
@@ -0,0 +1,287 @@
+import os
+import time
+import json
+import hashlib
+import logging
+import sqlite3
+import zlib
+
+
+# upstream results shared by all workers of a machine, ttl in seconds
+_CACHE_CONFIGS = {
+    'glen': {
+        'ttl': 24 * 3600.0,
+    },
+    'gmap_nearby': {
+        'ttl': 24 * 3600.0,
+    },
+}
+
+# a cache must never stall the event loop, a busy write is dropped instead of waited on,
+# reads in wal mode do not wait on writers
+_BUSY_TIMEOUT_MS = 0
+_TRIM_EVERY = 100
+_TRIM_TO = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    name      TEXT NOT NULL,
+    key       TEXT NOT NULL,
+    value     BLOB NOT NULL,
+    size      INTEGER NOT NULL,
+    expire_at REAL NOT NULL,
+    PRIMARY KEY (name, key)
+);
+CREATE INDEX IF NOT EXISTS entries_expire_at_idx ON entries (expire_at);
+"""
+
+_CONFIG = {
+    'path':      None,
+    'max_bytes': 0,
+}
+
+_CONN = None
+_CONN_PID = None
+_CACHE_STATS = {}
+_SET_N = 0
+
+
+class _SharedCacheStats:
+
+    """lookup counters and time spent of one named cache within the current worker"""
+
+    __slots__ = ('hit_n', 'miss_n', 'set_n', 'busy_n', 'err_n', 'get_s', 'set_s', 'encode_s', 'decode_s', 'bytes_n')
+
+    def __init__(self):
+        self.hit_n    = 0
+        self.miss_n   = 0
+        self.set_n    = 0
+        self.busy_n   = 0
+        self.err_n    = 0
+        self.get_s    = 0.0
+        self.set_s    = 0.0
+        self.encode_s = 0.0
+        self.decode_s = 0.0
+        self.bytes_n  = 0
+
+
+def configure(path: str, max_mb: int):
+
+    """set the file shared by workers, a size of 0 disables the cache"""
+
+    _CONFIG['path'] = path
+    _CONFIG['max_bytes'] = int(max_mb) * 1024 * 1024
+
+
+def is_enabled() -> bool:
+    return (_CONFIG['path'] is not None) and (_CONFIG['max_bytes'] > 0)
+
+
+def _check_process():
+
+    """connections must not cross gunicorn fork, drop the one inherited from parent"""
+
+    global _CONN, _CONN_PID
+
+    if _CONN_PID != os.getpid():
+        _CONN = None
+        _CACHE_STATS.clear()
+        _CONN_PID = os.getpid()
+
+
+def _get_conn() -> sqlite3.Connection:
+
+    """one autocommit connection per worker, readers are not blocked by writers in wal mode"""
+
+    global _CONN
+
+    if _CONN is None:
+        conn = sqlite3.connect(
+            _CONFIG['path'],
+            timeout=_BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _CONN = conn
+
+    return _CONN
+
+
+def _stats(name: str) -> _SharedCacheStats:
+
+    if name not in _CACHE_CONFIGS:
+        raise Exception(f"unknown shared cache {name}")
+
+    _check_process()
+
+    return _CACHE_STATS.setdefault(name, _SharedCacheStats())
+
+
+def cache_key(params: dict) -> str:
+
+    """stable key of upstream request params, secrets such as api keys must be left out"""
+
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def encode(value) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'), 1)
+
+
+def decode(blob: bytes):
+    return json.loads(zlib.decompress(blob))
+
+
+def get(name: str, params: dict):
+
+    """cached json value of upstream request params, None on miss or any cache failure"""
+
+    if not is_enabled():
+        return None
+
+    stats = _stats(name)
+    start = time.perf_counter()
+    try:
+        row = _get_conn().execute(
+            "SELECT value FROM entries WHERE name = ? AND key = ? AND expire_at > ?",
+            (name, cache_key(params), time.time())
+        ).fetchone()
+    except sqlite3.Error as e:
+        stats.err_n += 1
+        logging.warning("failed to read shared cache %s: %s", name, repr(e))
+        return None
+    finally:
+        stats.get_s += time.perf_counter() - start
+
+    if row is None:
+        stats.miss_n += 1
+        return None
+
+    start = time.perf_counter()
+    try:
+        value = decode(row[0])
+    except (zlib.error, ValueError) as e:
+        stats.err_n += 1
+        stats.miss_n += 1
+        logging.warning("dropping corrupt shared cache entry of %s: %s", name, repr(e))
+        _delete(name, params)
+        return None
+    finally:
+        stats.decode_s += time.perf_counter() - start
+
+    stats.hit_n += 1
+
+    return value
+
+
+def _delete(name: str, params: dict):
+
+    try:
+        _get_conn().execute("DELETE FROM entries WHERE name = ? AND key = ?", (name, cache_key(params)))
+    except sqlite3.Error:
+        pass
+
+
+def put(name: str, params: dict, value, ttl: float = None):
+
+    """store a json value of upstream request params, dropped when the file is busy"""
+
+    global _SET_N
+
+    if not is_enabled():
+        return
+
+    stats = _stats(name)
+
+    start = time.perf_counter()
+    blob = encode(value)
+    stats.encode_s += time.perf_counter() - start
+
+    ttl = ttl if ttl is not None else _CACHE_CONFIGS[name]['ttl']
+
+    start = time.perf_counter()
+    try:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (name, key, value, size, expire_at) VALUES (?, ?, ?, ?, ?)",
+            (name, cache_key(params), blob, len(blob), time.time() + ttl)
+        )
+
+        _SET_N += 1
+        if _SET_N % _TRIM_EVERY == 0:
+            _trim(conn)
+
+    except sqlite3.Error as e:
+        if isinstance(e, sqlite3.OperationalError) and ('locked' in str(e)):
+            stats.busy_n += 1
+        else:
+            stats.err_n += 1
+            logging.warning("failed to write shared cache %s: %s", name, repr(e))
+        return
+    finally:
+        stats.set_s += time.perf_counter() - start
+
+    stats.set_n += 1
+    stats.bytes_n += len(blob)
+
+
+def _trim(conn: sqlite3.Connection):
+
+    """drop expired entries, then the ones expiring first until the file is below its size bound"""
+
+    conn.execute("DELETE FROM entries WHERE expire_at <= ?", (time.time(), ))
+
+    total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+    if total_bytes <= _CONFIG['max_bytes']:
+        return
+
+    conn.execute(
+        """
+        DELETE FROM entries WHERE rowid IN (
+            SELECT rowid FROM (
+                SELECT rowid, SUM(size) OVER (ORDER BY expire_at DESC, rowid) AS kept_bytes FROM entries
+            ) WHERE kept_bytes > ?
+        )
+        """,
+        (int(_CONFIG['max_bytes'] * _TRIM_TO), )
+    )
+
+
+def get_shared_cache_stats() -> dict:
+
+    """lookup metrics of all shared caches in the current worker"""
+
+    if not is_enabled():
+        return {'enabled': False}
+
+    _check_process()
+
+    result = {
+        'enabled':   True,
+        'path':      _CONFIG['path'],
+        'max_bytes': _CONFIG['max_bytes'],
+        'caches':    {},
+    }
+
+    for name, stats in _CACHE_STATS.items():
+
+        lookup_n = stats.hit_n + stats.miss_n
+        result['caches'][name] = {
+            'ttl_s':         _CACHE_CONFIGS[name]['ttl'],
+            'hit_n':         stats.hit_n,
+            'miss_n':        stats.miss_n,
+            'hit_rate':      round(stats.hit_n / lookup_n, 3) if lookup_n > 0 else None,
+            'set_n':         stats.set_n,
+            'busy_n':        stats.busy_n,
+            'err_n':         stats.err_n,
+            'avg_get_ms':    round(stats.get_s * 1000 / lookup_n, 3) if lookup_n > 0 else None,
+            'avg_set_ms':    round(stats.set_s * 1000 / stats.set_n, 3) if stats.set_n > 0 else None,
+            'avg_encode_ms': round(stats.encode_s * 1000 / stats.set_n, 3) if stats.set_n > 0 else None,
+            'avg_decode_ms': round(stats.decode_s * 1000 / stats.hit_n, 3) if stats.hit_n > 0 else None,
+            'written_bytes': stats.bytes_n,
+        }
+
+    return result
@@ -0,0 +1,45 @@
+import asyncio
+
+
+class SingleFlight:
+
+    """
+    coalesce concurrent calls with the same key into one execution within a worker
+    the call runs in its own task, so a cancelled caller does not cancel the others
+    """
+
+    def __init__(self):
+        self.calls  = {}
+        self.leader_n = 0
+        self.shared_n = 0
+
+    async def do(self, key, _func, *args, **kwargs):
+
+        task = self.calls.get(key)
+
+        if task is None:
+            self.leader_n += 1
+            task = asyncio.create_task(_func(*args, **kwargs))
+            task.add_done_callback(lambda _task: self._forget(key, _task))
+            self.calls[key] = task
+        else:
+            self.shared_n += 1
+
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task: asyncio.Task):
+
+        if self.calls.get(key) is task:
+            del self.calls[key]
+
+        # consume exception when every caller is gone
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+
+        return {
+            'in_flight': len(self.calls),
+            'leader_n':  self.leader_n,
+            'shared_n':  self.shared_n,
+        }
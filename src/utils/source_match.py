@@ -0,0 +1,187 @@
+import os
+import re
+import time
+import json
+import logging
+
+
+MATCH_ALLOW = 'allow'
+MATCH_DENY = 'deny'
+MATCH_UNKNOWN = 'unknown'
+
+_NAME_STRIP_RE = re.compile(r'[^a-z0-9.]')
+
+# source names and hosts memoized per matcher, cleared when full
+_MEMO_SIZE = 10000
+
+
+def _host_keys(host: str) -> list[str]:
+
+    """labels and dotted suffixes of a host, e.g. www.tripadvisor.com.tw gives tripadvisor and tripadvisor.com.tw"""
+
+    labels = host.strip('.').split('.')
+
+    keys = labels + ['.'.join(labels[i:]) for i in range(len(labels) - 1)]
+
+    return keys
+
+
+def _name_keys(source: str) -> list[str]:
+
+    """lookup keys of a source name, e.g. Kiwi Collection gives kiwicollection"""
+
+    name = _NAME_STRIP_RE.sub('', source.lower())
+    if len(name) == 0:
+        return []
+
+    return _host_keys(name) if '.' in name else [name]
+
+
+def _link_host(link: str) -> str:
+
+    """host of an http link without parsing the whole url"""
+
+    parts = link.split('/', 3)
+    if len(parts) < 3:
+        return None
+
+    host = parts[2].lower()
+    if ('@' in host) or (':' in host):
+        host = host.rpartition('@')[2].partition(':')[0]
+
+    return host
+
+
+class SourceMatcher:
+
+    """
+    weighted allow list and deny list of lens match sites compiled into one dict, an entry
+    is a site name matched against domain labels, e.g. tripadvisor, or a dotted domain matched
+    against host suffixes, e.g. skyscrapercity.com, a denied key wins over allowed ones,
+    verdicts are memoized by source name and host, which repeat across matches
+    """
+
+    def __init__(self, allow: dict[str, float], deny: list[str], memo_size: int = _MEMO_SIZE):
+
+        self.entries = {key.lower(): float(weight) for key, weight in allow.items()}
+        self.entries.update({key.lower(): None for key in deny})
+
+        self.memo_size = memo_size
+        self.memo      = {}
+
+    def _lookup(self, keys: list[str]) -> tuple[str, float]:
+
+        verdict, best_weight = MATCH_UNKNOWN, None
+        for key in keys:
+
+            if key not in self.entries:
+                continue
+
+            weight = self.entries[key]
+            if weight is None:
+                return MATCH_DENY, None
+
+            if (best_weight is None) or (weight > best_weight):
+                verdict, best_weight = MATCH_ALLOW, weight
+
+        return verdict, best_weight
+
+    def _match(self, source: str, host: str) -> tuple[str, float]:
+
+        host_verdict, host_weight = self._lookup(_host_keys(host) if host else [])
+        name_verdict, name_weight = self._lookup(_name_keys(source) if source else [])
+
+        if MATCH_DENY in (host_verdict, name_verdict):
+            return MATCH_DENY, None
+
+        if host_verdict == MATCH_UNKNOWN:
+            return name_verdict, name_weight
+        if name_verdict == MATCH_UNKNOWN:
+            return host_verdict, host_weight
+
+        return MATCH_ALLOW, max(host_weight, name_weight)
+
+    def match(self, source: str, link: str) -> tuple[str, float]:
+
+        """(verdict, weight) of a lens match by the host of its link and its source name"""
+
+        key = (source, _link_host(link) if link else None)
+
+        result = self.memo.get(key)
+        if result is None:
+
+            if len(self.memo) >= self.memo_size:
+                self.memo.clear()
+            result = self.memo[key] = self._match(*key)
+
+        return result
+
+
+class ReloadableSourceMatcher:
+
+    """
+    source matcher of a json config file {"allow": {site: weight}, "deny": [site]}, reloaded when
+    the file changes, checked at most once every check_interval seconds, defaults without a file,
+    a config that fails to load is logged and the matcher built last is kept
+    """
+
+    def __init__(self, default_allow: dict[str, float], default_deny: list[str], check_interval: float = 10.0):
+        self.default_allow  = default_allow
+        self.default_deny   = default_deny
+        self.check_interval = check_interval
+        self.path           = None
+        self.mtime          = None
+        self.checked_at     = 0.0
+        self.reload_n       = 0
+        self.error_n        = 0
+        self.matcher        = SourceMatcher(default_allow, default_deny)
+
+    def configure(self, path: str = None):
+
+        self.path = path
+        self.mtime = None
+        self.checked_at = 0.0
+
+        if path is None:
+            self.matcher = SourceMatcher(self.default_allow, self.default_deny)
+        else:
+            self._reload()
+
+    def _reload(self):
+
+        self.checked_at = time.monotonic()
+        try:
+
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self.mtime:
+                return
+
+            # a broken file is reported once, until it changes again
+            self.mtime = mtime
+
+            with open(self.path, encoding='utf-8') as f:
+                config = json.load(f)
+
+            self.matcher = SourceMatcher(config.get('allow', {}), config.get('deny', []))
+            self.reload_n += 1
+            logging.info("loaded lens source config %s, %d entries", self.path, len(self.matcher.entries))
+
+        except Exception as e:
+            self.error_n += 1
+            logging.warning("failed to load lens source config %s: %s", self.path, repr(e))
+
+    def get(self) -> SourceMatcher:
+
+        if (self.path is not None) and (time.monotonic() - self.checked_at >= self.check_interval):
+            self._reload()
+
+        return self.matcher
+
+    def stats(self) -> dict:
+
+        return {
+            'path':     self.path,
+            'entries':  len(self.matcher.entries),
+            'reload_n': self.reload_n,
+            'error_n':  self.error_n,
+        }